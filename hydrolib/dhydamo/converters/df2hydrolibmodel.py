@@ -1,7 +1,18 @@
+import copy
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
 import pandas as pd
 import numpy as np
-from pathlib import Path
+from pydantic.v1 import BaseModel, ValidationError
+from pydantic.v1.error_wrappers import ErrorWrapper
+from pydantic.v1.utils import ROOT_KEY
+from hydrolib.core.basemodel import ModelSaveSettings
+from hydrolib.core.dflowfm.ini.serializer import SectionSerializer
 from hydrolib.core.dflowfm.structure.models import (
     Weir,
     UniversalWeir,
@@ -10,6 +21,7 @@ from hydrolib.core.dflowfm.structure.models import (
     Pump,
     Culvert,
     Compound,
+    StructureModel,
 )
 from hydrolib.core.dflowfm.crosssection.models import (
     CircleCrsDef,
@@ -17,6 +29,8 @@ from hydrolib.core.dflowfm.crosssection.models import (
     YZCrsDef,
     CrossSection,
     ZWCrsDef,
+    CrossDefModel,
+    CrossLocModel,
 )
 from hydrolib.core.dflowfm.ext.models import Boundary, Lateral
 from hydrolib.core.dflowfm.bc.models import (
@@ -26,16 +40,48 @@ from hydrolib.core.dflowfm.bc.models import (
     QuantityUnitPair,
 )
 from hydrolib.core.dflowfm.friction.models import FrictGlobal
-from hydrolib.core.dflowfm.obs.models import ObservationPoint
-from hydrolib.core.dflowfm.storagenode.models import StorageNode
+from hydrolib.core.dflowfm.obs.models import ObservationPoint, ObservationPointModel
+from hydrolib.core.dflowfm.storagenode.models import StorageNode, StorageNodeModel
 from hydrolib.core.dflowfm.inifield.models import InitialField
 from hydrolib.core.dflowfm.onedfield.models import OneDFieldGlobal
+from hydrolib import dhydamo
+from hydrolib.dhydamo.core.profiling import profiled
+from hydrolib.dhydamo.io.bcwriter import BCWriter, StreamingForcingModel
 
 logger = logging.getLogger(__name__)
 
 
 class Df2HydrolibModel:
-    def __init__(self, hydamo, assign_default_profiles=False):
+    # Section name: (hydrolib-core file model, generator method)
+    sections = {
+        "structures": (StructureModel, "iter_structures"),
+        "crosslocs": (CrossLocModel, "iter_crosssection_locations"),
+        "crossdefs": (CrossDefModel, "iter_crosssection_definitions"),
+        "obspoints": (ObservationPointModel, "iter_observation_points"),
+        "storagenodes": (StorageNodeModel, "iter_storagenodes"),
+    }
+
+    def __init__(
+        self,
+        hydamo,
+        assign_default_profiles=False,
+        stream_forcings=False,
+        lazy=False,
+        trusted=False,
+    ):
+        """Convert the HyDAMO intermediate dataframes to hydrolib-core objects
+
+        Args:
+            hydamo (HyDAMO): HyDAMO object with the converted data
+            assign_default_profiles (bool, optional): Add the default cross section to branches without one. Defaults to False.
+            stream_forcings (bool, optional): Do not build TimeSeries/Constant objects for boundaries and laterals,
+                but write boundaryconditions.bc directly from arrays with a BCWriter when the model is saved. Defaults to False.
+            lazy (bool, optional): Do not convert all objects on initialization. The sections can then be generated
+                on demand with the iter_* methods, or be written directly to file with write_section. Defaults to False.
+            trusted (bool, optional): Only validate the first record of every object type (and set of keys). The
+                other records are copied from this validated object, without validation. Only use this when the
+                records already contain valid values. Defaults to False.
+        """
         self.hydamo = hydamo
         self.structures = []
         self.crossdefs = []
@@ -52,31 +98,180 @@ class Df2HydrolibModel:
         self.onedfields = []
 
         self.assign_default_profiles = assign_default_profiles
-        self.forcingmodel = ForcingModel()
+        if stream_forcings:
+            self.bcwriter = BCWriter()
+            self.forcingmodel = StreamingForcingModel()
+            self.forcingmodel.set_writer(self.bcwriter)
+        else:
+            self.bcwriter = None
+            self.forcingmodel = ForcingModel()
         self.forcingmodel.filepath = "boundaryconditions.bc"
         self.forcingmodel.forcing = []
 
         self.onedfieldmodels = []
 
-        self.write_all()
-
-    def write_all(self):
-        """Wrapper function to convert all seperate objects"""
-        self.regular_weirs_to_dhydro()
-        self.orifices_to_dhydro()
-        self.universal_weirs_to_dhydro()
-        self.bridges_to_dhydro()
-        self.culverts_to_dhydro()
-        self.pumps_to_dhydro()
-        self.compounds_to_dhydro()
-        self.crosssection_locations_to_dhydro()
-        self.crosssection_definitions_to_dhydro()
-        self.friction_definitions_to_dhydro()
-        self.boundaries_to_dhydro()
-        self.laterals_to_dhydro()
-        self.observation_points_to_dhydro()
-        self.storagenodes_to_dhydro()
-        self.inifields_to_dhydro()
+        self.trusted = trusted
+        self._factory = _ModelFactory(trusted)
+        self._default_locations_added = False
+        self.timings = {}
+
+        if not lazy:
+            self.write_all()
+
+    @profiled(items=lambda result, arguments: arguments["self"].count_objects())
+    def write_all(self, max_workers: int = None):
+        """Wrapper function to convert all seperate objects. The elapsed time per stage
+        is stored in the timings attribute.
+
+        Args:
+            max_workers (int, optional): Number of worker processes used to convert the
+                structures, cross sections, friction definitions, observation points and
+                storage nodes in parallel. The results are merged in the same order as the
+                sequential conversion. On Windows, call this from within an
+                'if __name__ == "__main__":' block. Defaults to None (sequential).
+        """
+        self.timings = {}
+        if max_workers is not None and max_workers > 1:
+            self._write_all_parallel(max_workers)
+        else:
+            for stage, method in [
+                ("regular_weirs", self.regular_weirs_to_dhydro),
+                ("orifices", self.orifices_to_dhydro),
+                ("universal_weirs", self.universal_weirs_to_dhydro),
+                ("bridges", self.bridges_to_dhydro),
+                ("culverts", self.culverts_to_dhydro),
+                ("pumps", self.pumps_to_dhydro),
+                ("compounds", self.compounds_to_dhydro),
+                ("crosssection_locations", self.crosssection_locations_to_dhydro),
+                ("crosssection_definitions", self.crosssection_definitions_to_dhydro),
+                ("friction_definitions", self.friction_definitions_to_dhydro),
+                ("boundaries", self.boundaries_to_dhydro),
+                ("laterals", self.laterals_to_dhydro),
+                ("observation_points", self.observation_points_to_dhydro),
+                ("storagenodes", self.storagenodes_to_dhydro),
+                ("inifields", self.inifields_to_dhydro),
+            ]:
+                start = time.perf_counter()
+                method()
+                self.timings[stage] = time.perf_counter() - start
+
+        logger.info(
+            "Converted sections in "
+            + ", ".join(f"{stage}: {t:.2f} s" for stage, t in self.timings.items())
+        )
+
+    def _record_stages(self) -> list:
+        """List the conversions that only depend on their own records, as
+        (stage, attribute to extend, hydrolib-core class, records)."""
+        structures = self.hydamo.structures
+        stages = [
+            ("regular_weirs", "structures", Weir, structures.rweirs_df),
+            ("orifices", "structures", Orifice, structures.orifices_df),
+            ("universal_weirs", "structures", UniversalWeir, structures.uweirs_df),
+            ("bridges", "structures", Bridge, structures.bridges_df),
+            ("culverts", "structures", Culvert, structures.culverts_df),
+            ("pumps", "structures", Pump, structures.pumps_df),
+            ("compounds", "structures", Compound, structures.compounds_df),
+            (
+                "crosssection_locations",
+                "crosslocs",
+                CrossSection,
+                list(self.hydamo.crosssections.crosssection_loc.values()),
+            ),
+        ]
+        crosssection_def = self.hydamo.crosssections.crosssection_def.values()
+        for cstype, cls in [
+            ("circle", CircleCrsDef),
+            ("yz", YZCrsDef),
+            ("rectangle", RectangleCrsDef),
+            ("zw", ZWCrsDef),
+        ]:
+            records = [dct for dct in crosssection_def if dct["type"] == cstype]
+            stages.append(("crosssection_definitions", "crossdefs", cls, records))
+        stages.append(
+            (
+                "friction_definitions",
+                "friction_defs",
+                FrictGlobal,
+                list(self.hydamo.roughness_definitions.values()),
+            )
+        )
+        if hasattr(self.hydamo.observationpoints, "observation_points"):
+            stages.append(
+                (
+                    "observation_points",
+                    "obspoints",
+                    ObservationPoint,
+                    self.hydamo.observationpoints.observation_points,
+                )
+            )
+        stages.append(
+            (
+                "storagenodes",
+                "storagenodes",
+                StorageNode,
+                list(self.hydamo.storagenodes.storagenodes.values()),
+            )
+        )
+        return [
+            (
+                stage,
+                attr,
+                cls,
+                records.to_dict("records")
+                if isinstance(records, pd.DataFrame)
+                else records,
+            )
+            for stage, attr, cls, records in stages
+        ]
+
+    def _write_all_parallel(self, max_workers: int):
+        """Convert the independent sections in worker processes, while the forcings and
+        initial fields are converted in this process."""
+        # Adding the default locations changes the HyDAMO object, so do this first
+        start = time.perf_counter()
+        self._add_default_crosssection_locations()
+        self.timings["crosssection_locations"] = time.perf_counter() - start
+
+        stages = [stage for stage in self._record_stages() if len(stage[3]) > 0]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_convert_records, cls, records, self.trusted)
+                for _, _, cls, records in stages
+            ]
+
+            # Boundaries and laterals share the forcing model, keep them sequential
+            for stage, method in [
+                ("boundaries", self.boundaries_to_dhydro),
+                ("laterals", self.laterals_to_dhydro),
+                ("inifields", self.inifields_to_dhydro),
+            ]:
+                start = time.perf_counter()
+                method()
+                self.timings[stage] = time.perf_counter() - start
+
+            # Merge in order of submission, so the result equals the sequential conversion
+            for (stage, attr, _, _), future in zip(stages, futures):
+                objects, elapsed = future.result()
+                getattr(self, attr).extend(objects)
+                self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+
+    def count_objects(self) -> int:
+        """Total number of converted hydrolib-core objects"""
+        return sum(
+            len(objects)
+            for objects in [
+                self.structures,
+                self.crosslocs,
+                self.crossdefs,
+                self.friction_defs,
+                self.boundaries_ext,
+                self.laterals_ext,
+                self.obspoints,
+                self.storagenodes,
+                self.inifields,
+            ]
+        )
 
     @staticmethod
     def _clear_comments(lst):
@@ -87,71 +282,154 @@ class Df2HydrolibModel:
         else:
             [setattr(lst.comments, field[0], "") for field in lst.comments]
 
+    def _to_model(self, cls, record: dict):
+        """Create a hydrolib-core object from a record, and clear the comments"""
+        return self._factory(cls, record)
+
+    def _iter_records(self, cls, df: pd.DataFrame) -> Iterator:
+        """Convert the rows of a DataFrame to hydrolib-core objects, one at a time"""
+        columns = df.columns.tolist()
+        for row in df.itertuples(index=False, name=None):
+            yield self._to_model(cls, dict(zip(columns, row)))
+
+    def iter_structures(self) -> Iterator:
+        """Generate the structures, in the same order as write_all"""
+        structures = self.hydamo.structures
+        return chain(
+            self._iter_records(Weir, structures.rweirs_df),
+            self._iter_records(Orifice, structures.orifices_df),
+            self._iter_records(UniversalWeir, structures.uweirs_df),
+            self._iter_records(Bridge, structures.bridges_df),
+            self._iter_records(Culvert, structures.culverts_df),
+            self._iter_records(Pump, structures.pumps_df),
+            self._iter_records(Compound, structures.compounds_df),
+        )
+
+    def iter_crosssection_locations(self) -> Iterator:
+        """Generate the cross section locations, including default locations"""
+        self._add_default_crosssection_locations()
+        for cloc in self.hydamo.crosssections.crosssection_loc.values():
+            yield self._to_model(CrossSection, cloc)
+
+    def iter_crosssection_definitions(self) -> Iterator:
+        """Generate the cross section definitions, ordered by type"""
+        crosssection_def = self.hydamo.crosssections.crosssection_def
+        for cstype, cls in [
+            ("circle", CircleCrsDef),
+            ("yz", YZCrsDef),
+            ("rectangle", RectangleCrsDef),
+            ("zw", ZWCrsDef),
+        ]:
+            for dct in crosssection_def.values():
+                if dct["type"] == cstype:
+                    yield self._to_model(cls, dct)
+
+    def iter_friction_definitions(self) -> Iterator:
+        """Generate the friction definitions"""
+        for frictdef in self.hydamo.roughness_definitions.values():
+            yield self._to_model(FrictGlobal, frictdef)
+
+    def iter_observation_points(self) -> Iterator:
+        """Generate the observation points"""
+        if hasattr(self.hydamo.observationpoints, "observation_points"):
+            yield from self._iter_records(
+                ObservationPoint, self.hydamo.observationpoints.observation_points
+            )
+
+    def iter_storagenodes(self) -> Iterator:
+        """Generate the storage nodes"""
+        for stornode in self.hydamo.storagenodes.storagenodes.values():
+            yield self._to_model(StorageNode, stornode)
+
+    @profiled()
+    def write_section(self, section: str, filepath: Union[str, Path]) -> Path:
+        """Write a section directly to an ini-file, without holding all objects in memory.
+        The objects are generated, serialized and written one at a time.
+
+        Args:
+            section (str): One of 'structures', 'crosslocs', 'crossdefs', 'obspoints' or 'storagenodes'
+            filepath (Union[str, Path]): Path of the ini-file to write
+
+        Returns:
+            Path: path of the written file
+        """
+        if section not in self.sections:
+            raise KeyError(
+                f'Section "{section}" cannot be written. Choose from: {", ".join(self.sections)}'
+            )
+        model_cls, generator = self.sections[section]
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        # The model is only used for the general section and the serializer settings
+        model = model_cls()
+        config = model.serializer_config
+        save_settings = ModelSaveSettings()
+
+        with open(filepath, "w", encoding="utf8") as f:
+            f.write(f"# written by HYDROLIB-dhydamo {dhydamo.__version__}\n")
+            for obj in chain([model.general], getattr(self, generator)()):
+                f.write("\n")
+                for line in SectionSerializer.serialize(
+                    obj._to_section(config, save_settings), config
+                ):
+                    f.write(line + "\n")
+            f.write("\n")
+
+        return filepath
+
     def compounds_to_dhydro(self):
         """Convert compound structures to Compound-model"""
-        structs = [
-            Compound(**struc)
-            for struc in self.hydamo.structures.compounds_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Compound, self.hydamo.structures.compounds_df)
+        )
 
     def regular_weirs_to_dhydro(self):
         """Convert regular weirs to Weir-model"""
-        structs = [
-            Weir(**struc)
-            for struc in self.hydamo.structures.rweirs_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Weir, self.hydamo.structures.rweirs_df)
+        )
 
     def orifices_to_dhydro(self):
         """Convert orifices to Orfice-models"""
-        structs = [
-            Orifice(**struc)
-            for struc in self.hydamo.structures.orifices_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Orifice, self.hydamo.structures.orifices_df)
+        )
 
     def universal_weirs_to_dhydro(self):
         """Convert universal weirs to UniversalWeir-models"""
-        structs = [
-            UniversalWeir(**struc)
-            for struc in self.hydamo.structures.uweirs_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(UniversalWeir, self.hydamo.structures.uweirs_df)
+        )
 
     def bridges_to_dhydro(self):
         """Convert bridges to Bridge-models"""
-        structs = [
-            Bridge(**struc)
-            for struc in self.hydamo.structures.bridges_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Bridge, self.hydamo.structures.bridges_df)
+        )
 
     def culverts_to_dhydro(self):
         """Convert culverts to Culvert-models"""
-        structs = [
-            Culvert(**struc)
-            for struc in self.hydamo.structures.culverts_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Culvert, self.hydamo.structures.culverts_df)
+        )
 
     def pumps_to_dhydro(self):
         """Convert pumps to Pump-models"""
-        structs = [
-            Pump(**struc)
-            for struc in self.hydamo.structures.pumps_df.to_dict("records")
-        ]
-        self._clear_comments(structs)
-        self.structures += structs
+        self.structures += list(
+            self._iter_records(Pump, self.hydamo.structures.pumps_df)
+        )
 
     def crosssection_locations_to_dhydro(self):
         """Convert crosssection locations to CrossLoc models"""
+        self.crosslocs += list(self.iter_crosssection_locations())
+
+    def _add_default_crosssection_locations(self):
+        """Add the default cross section to branches without one (only once)"""
+        if self._default_locations_added:
+            return
+        self._default_locations_added = True
+
         # Check which of the branches do not have a cross section. Add the default one to those
         branchids = set(
             [
@@ -186,53 +464,33 @@ class Df2HydrolibModel:
                     shift=self.hydamo.crosssections.default_definition_shift,
                 )
 
-        # Add cross sections to dhydro format
-        css = [
-            CrossSection(**cloc)
-            for cloc in self.hydamo.crosssections.crosssection_loc.values()
-        ]
-
-        self._clear_comments(css)
-        self.crosslocs += css
 
     def crosssection_definitions_to_dhydro(self) -> None:
         """Convert crosssection definitions to Crossdef models"""
-
-        def _get_cstype_part_of_dict(cstype: str) -> dict:
-            """Reorganize the csdef dict"""
-            return {
-                key: dct
-                for key, dct in self.hydamo.crosssections.crosssection_def.items()
-                if dct["type"] == cstype
-            }
-
-        # Circles
-        cs_circle = _get_cstype_part_of_dict("circle")
-        cs = [CircleCrsDef(**cs) for cs in cs_circle.values()]
-        self._clear_comments(cs)
-        self.crossdefs += cs
-
-        # YZ
-        cs_yz = _get_cstype_part_of_dict("yz")
-        cs = [YZCrsDef(**cs) for cs in cs_yz.values()]
-        self._clear_comments(cs)
-        self.crossdefs += cs
-
-        # Rectangle
-        cs_rect = _get_cstype_part_of_dict("rectangle")
-        cs = [RectangleCrsDef(**cs) for cs in cs_rect.values()]
-        self._clear_comments(cs)
-        self.crossdefs += cs
-
-        # Trapezium
-        cs_zw = _get_cstype_part_of_dict("zw")
-        cs = [ZWCrsDef(**cs) for cs in cs_zw.values()]
-        self._clear_comments(cs)
-        self.crossdefs += cs
+        self.crossdefs += list(self.iter_crosssection_definitions())
 
     def boundaries_to_dhydro(self) -> None:
         """Convert dataframe of boundaries to ext and bc models"""
         for bound in self.hydamo.external_forcings.boundary_nodes.values():
+            if self.bcwriter is not None:
+                if bound["time"] is None:
+                    self.bcwriter.add_constant(
+                        name=bound["nodeid"],
+                        quantity=bound["quantity"],
+                        unit=bound["value_unit"],
+                        value=bound["value"],
+                    )
+                else:
+                    self.bcwriter.add_timeseries(
+                        name=bound["nodeid"],
+                        quantity=bound["quantity"],
+                        unit=bound["value_unit"],
+                        times=bound["time"],
+                        values=bound["value"],
+                        time_unit=bound["time_unit"],
+                    )
+                continue
+
             if bound["time"] is None:
                 bnd_bc = Constant(
                     name=bound["nodeid"],
@@ -266,7 +524,9 @@ class Df2HydrolibModel:
 
     def laterals_to_dhydro(self) -> None:
         """Convert dataframe of laterals to ext and bc models"""
-                
+        if self.bcwriter is not None:
+            self._laterals_to_bcwriter()
+
         for key, lateral in self.hydamo.external_forcings.lateral_nodes.items():                    
             if isinstance(lateral["discharge"], str):
                 # realtime boundary                
@@ -280,30 +540,31 @@ class Df2HydrolibModel:
                     discharge=lateral["discharge"],
                 )
             else:
-                # time series or constant value
-                if isinstance(lateral["discharge"], pd.Series):                    
-                    lat_bc = TimeSeries(
-                        name=key,
-                        function="timeseries",
-                        timeinterpolation="linear",
-                        quantityunitpair=[
-                            QuantityUnitPair(quantity="time", unit=lateral["time_unit"]),
-                            QuantityUnitPair(
-                                quantity="lateral_discharge", unit="m3/s"
-                            ),
-                        ],
-                        datablock=list(map(list, zip(lateral["time"], lateral["value"]))),
-                    )
-                    self.laterals_bc.append(lat_bc)
-                elif isinstance(lateral["discharge"], float):                    
-                    lat_bc = Constant(
-                        name=key,
-                        function="constant",
-                        quantity="lateral_discharge",
-                        unit="m3/s",
-                        datablock=[[lateral["discharge"]]],
-                    )
-                self.forcingmodel.forcing.append(lat_bc)                
+                # time series or constant value, registered with the bc writer above
+                if self.bcwriter is None:
+                    if lateral["time"] is not None:
+                        lat_bc = TimeSeries(
+                            name=key,
+                            function="timeseries",
+                            timeinterpolation="linear",
+                            quantityunitpair=[
+                                QuantityUnitPair(quantity="time", unit=lateral["time_unit"]),
+                                QuantityUnitPair(
+                                    quantity="lateral_discharge", unit="m3/s"
+                                ),
+                            ],
+                            datablock=list(map(list, zip(lateral["time"], lateral["value"]))),
+                        )
+                        self.laterals_bc.append(lat_bc)
+                    elif isinstance(lateral["discharge"], float):
+                        lat_bc = Constant(
+                            name=key,
+                            function="constant",
+                            quantity="lateral_discharge",
+                            unit="m3/s",
+                            datablock=[[lateral["discharge"]]],
+                        )
+                    self.forcingmodel.forcing.append(lat_bc)
                 lat_ext = Lateral(
                     id=key,
                     name=key,
@@ -315,35 +576,65 @@ class Df2HydrolibModel:
                 )            
             self.laterals_ext.append(lat_ext)
 
+    def _laterals_to_bcwriter(self) -> None:
+        """Register the forcings of all laterals with the streaming bc writer. The time
+        series of laterals added together (ExternalForcings.add_laterals) share one table,
+        which is registered as a whole with add_timeseries_table, without copying."""
+        tables = {}
+        for key, lateral in self.hydamo.external_forcings.lateral_nodes.items():
+            if isinstance(lateral["discharge"], str):
+                continue
+            table = lateral.get("table")
+            if lateral["time"] is None or table is None:
+                self._lateral_to_bcwriter(key, lateral)
+                continue
+            _, _, names, columns = tables.setdefault(id(table), (table, lateral, [], []))
+            names.append(key)
+            columns.append(lateral["column"])
+
+        for table, lateral, names, columns in tables.values():
+            # only a subset or another order of the columns is selected (and copied)
+            if columns != list(range(table.shape[1])):
+                table = table[:, columns]
+            self.bcwriter.add_timeseries_table(
+                names=names,
+                quantity="lateral_discharge",
+                unit="m3/s",
+                times=lateral["time"],
+                values=table,
+                time_unit=lateral["time_unit"],
+            )
+
+    def _lateral_to_bcwriter(self, key: str, lateral: dict) -> None:
+        """Register the forcing of a single lateral with the streaming bc writer"""
+        if lateral["time"] is not None:
+            self.bcwriter.add_timeseries(
+                name=key,
+                quantity="lateral_discharge",
+                unit="m3/s",
+                times=lateral["time"],
+                values=lateral["value"],
+                time_unit=lateral["time_unit"],
+            )
+        elif isinstance(lateral["discharge"], float):
+            self.bcwriter.add_constant(
+                name=key,
+                quantity="lateral_discharge",
+                unit="m3/s",
+                value=lateral["discharge"],
+            )
+
     def friction_definitions_to_dhydro(self):
         """Convert friction definitions to FrictGlobal-objects"""
-        frictdefs = [
-            FrictGlobal(**frictdef)
-            for frictdef in self.hydamo.roughness_definitions.values()
-        ]
-        self._clear_comments(frictdefs)
-        self.friction_defs += frictdefs
+        self.friction_defs += list(self.iter_friction_definitions())
 
     def storagenodes_to_dhydro(self):
         """Convert dataframe of storagenodes to StorageNode-objects"""
-        stornodes = [
-            StorageNode(**stornode)
-            for stornode in self.hydamo.storagenodes.storagenodes.values()
-        ]
-        self._clear_comments(stornodes)
-        self.storagenodes += stornodes
+        self.storagenodes += list(self.iter_storagenodes())
 
     def observation_points_to_dhydro(self):
         """Convert dataframe of observationpoints to ObserationPoint-objects"""
-        if hasattr(self.hydamo.observationpoints, 'observation_points'):
-            obspoints = [
-                ObservationPoint(**obs)
-                for obs in self.hydamo.observationpoints.observation_points.to_dict(
-                    "records"
-                )
-            ]
-            self._clear_comments(obspoints)
-            self.obspoints += obspoints
+        self.obspoints += list(self.iter_observation_points())
 
     def inifields_to_dhydro(self):
         """Convert initial conditions to InitialField objects"""
@@ -393,3 +684,82 @@ class Df2HydrolibModel:
             # onedfieldmodel.filepath = Path("initialwaterdepth.ini")
             # fm.geometry.inifieldfile = onedfieldmodel
             # self.onedfields.append(onedfield)
+
+
+class _ModelFactory:
+    """Create hydrolib-core objects from records, and clear the comments.
+
+    If the factory is trusted, only the first record for a combination of object
+    type and keys is fully validated. This object is used as a template from which
+    the other objects are copied with their record values. Of the copies, only the
+    fields with a value of another type than in the template or with validators of
+    their own are validated, and the root validators (e.g. list length checks) are
+    run. Mutable fields of the template (like the comments) are deep copied.
+    """
+
+    def __init__(self, trusted: bool = False) -> None:
+        self.trusted = trusted
+        self._templates = {}
+
+    def __call__(self, cls, record: dict):
+        if not self.trusted:
+            obj = cls(**record)
+            Df2HydrolibModel._clear_comments(obj)
+            return obj
+
+        # None values are dropped by hydrolib-core on validation, so do so as well
+        record = {key: value for key, value in record.items() if value is not None}
+        templatekey = (cls, frozenset(record))
+        if templatekey not in self._templates:
+            template = cls(**record)
+            Df2HydrolibModel._clear_comments(template)
+            fields = {}
+            for name, field in cls.__fields__.items():
+                fields[name] = field
+                fields[field.alias] = field
+            mutable = [
+                name
+                for name, value in template.__dict__.items()
+                if isinstance(value, (list, dict, set, BaseModel))
+            ]
+            self._templates[templatekey] = (template, fields, mutable)
+            return template.copy(deep=True)
+
+        template, fields, mutable = self._templates[templatekey]
+        update = {}
+        for key, value in record.items():
+            if key not in fields:
+                continue
+            field = fields[key]
+            if (
+                type(value) is not type(getattr(template, field.name))
+                or field.class_validators
+            ):
+                value, errors = field.validate(value, update, loc=field.name, cls=cls)
+                if errors:
+                    raise ValidationError([errors], cls)
+            update[field.name] = value
+        for name in mutable:
+            if name not in update:
+                update[name] = copy.deepcopy(template.__dict__[name])
+
+        values = {**template.__dict__, **update}
+        errors = []
+        for skip_on_failure, validator in cls.__post_root_validators__:
+            if skip_on_failure and errors:
+                continue
+            try:
+                values = validator(cls, values)
+            except (ValueError, TypeError, AssertionError) as exc:
+                errors.append(ErrorWrapper(exc, loc=ROOT_KEY))
+        if errors:
+            raise ValidationError(errors, cls)
+        return template.copy(update=values)
+
+
+def _convert_records(cls, records: list, trusted: bool) -> Tuple[list, float]:
+    """Convert a list of records in a worker process. Returns the objects and the elapsed time."""
+    start = time.perf_counter()
+    factory = _ModelFactory(trusted)
+    objects = [factory(cls, record) for record in records]
+    return objects, time.perf_counter() - start
@@ -1,12 +1,13 @@
 import logging
 from enum import Enum
 from typing import Union
+import geopandas as gpd
 import numpy as np
 import pandas as pd
 from pydantic.v1 import validate_arguments
 from typing import Union, Optional
-from shapely.geometry import Point
 
+from hydrolib.dhydamo.core.profiling import profiled
 from hydrolib.dhydamo.geometry.mesh import Network
 from hydrolib.dhydamo.io.common import ExtendedDataFrame, ExtendedGeoDataFrame
 
@@ -96,6 +97,7 @@ class CrossSectionsIO:
                 else:
                     raise NotImplementedError
 
+    @profiled(items="branches")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def profiles(
         self,
@@ -355,78 +357,65 @@ class ExternalForcingsIO:
             rr_boundaries = []
 
         # in case of 3d points, remove the 3rd dimension
-        locations["geometry2"] = [
-            Point([point.geometry.x, point.geometry.y])
-            for _, point in locations.iterrows()
-        ]
-        locations.drop("geometry", inplace=True, axis=1)
-        locations.rename(columns={"geometry2": "geometry"}, inplace=True)
+        locations["geometry"] = gpd.points_from_xy(
+            locations.geometry.x.to_numpy(),
+            locations.geometry.y.to_numpy(),
+            crs=locations.crs,
+        )
 
-        latdct = {}
         if overflows is not None:
             locations = pd.concat([locations, overflows], ignore_index=True)
 
+        codes = locations["code"].to_numpy()
+        branchids = locations["branch_id"].to_numpy()
+        chainages = locations["branch_offset"].astype(str).to_numpy()
+        nodes = self.external_forcings.lateral_nodes
+        existing = set(nodes)
+
+        # Laterals coupled to RR get a realtime discharge
+        is_rr = locations["code"].isin(list(rr_boundaries)).to_numpy()
+        if is_rr.any():
+            self.external_forcings.add_laterals(
+                ids=codes[is_rr].tolist(),
+                branchids=branchids[is_rr].tolist(),
+                chainages=chainages[is_rr].tolist(),
+                discharges="realtime",
+            )
 
-        # Get time series and add to dictionary
-        # for nidx, lateral in zip(nearest_idx, locations.itertuples()):
-        for lateral in locations.itertuples():
-            # Check if a time is provided for the lateral
-            if lateral.code in rr_boundaries:
-                # Add to dictionary
-                latdct[lateral.code] = {
-                    "branchid": lateral.branch_id,
-                    "chainage": str(lateral.branch_offset),
-                    "discharge": "realtime",
-                }
-
-            else:
-                if lateral_discharges is None:
-                    logger.warning(
-                        f"No lateral_discharges provided. {lateral.code} expects them. Skipping."
-                    )
-                    continue
-                else:
-                    if isinstance(lateral_discharges, pd.Series):
-                        series = lateral_discharges.loc[lateral.code]
-
-                        # Add to dictionary
-                        latdct[lateral.code] = {
-                            "branchid": lateral.branch_id,
-                            "chainage": str(lateral.branch_offset),
-                            "discharge": series,
-                        }
-
-                    else:
-                        if lateral.code not in lateral_discharges.columns:
-                            logger.warning(
-                                f"No data found for {lateral.code}. Skipping."
-                            )
-                            continue
-
-                        # Get timeseries
-                        series = lateral_discharges.loc[:, lateral.code]
-
-                        # Add to dictionary
-                        latdct[lateral.code] = {
-                            "branchid": lateral.branch_id,
-                            "chainage": str(lateral.branch_offset),
-                            "discharge": series,
-                        }
-
-        # Add all items
-        for key, item in latdct.items():
-            self.external_forcings.add_lateral(
-                id=key,
-                branchid=item["branchid"],
-                chainage=item["chainage"],
-                discharge=item["discharge"],
+        # The others get a (time series of) discharge(s)
+        other = ~is_rr
+        if other.any() and lateral_discharges is None:
+            logger.warning(
+                f"No lateral_discharges provided. {', '.join(map(str, codes[other]))} expect them. Skipping."
             )
+            other[:] = False
+
+        if other.any() and isinstance(lateral_discharges, pd.DataFrame):
+            has_data = locations["code"].isin(lateral_discharges.columns).to_numpy()
+            for code in codes[other & ~has_data]:
+                logger.warning(f"No data found for {code}. Skipping.")
+            other &= has_data
+
+        if other.any():
+            # Add all items in one go, the series are selected as one block
+            self.external_forcings.add_laterals(
+                ids=codes[other].tolist(),
+                branchids=branchids[other].tolist(),
+                chainages=chainages[other].tolist(),
+                discharges=lateral_discharges,
+            )
+
+        # Keep the order of the locations, as if the laterals were added one by one
+        for code in pd.unique(codes[is_rr | other]):
+            if code not in existing:
+                nodes[code] = nodes.pop(code)
 
 
 class StructuresIO:
     def __init__(self, structures):
         self.structures = structures
 
+    @profiled(items="generalstructures")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def generalstructures_from_datamodel(self, generalstructures: pd.DataFrame) -> None:
         """From parsed data model of orifices
@@ -527,6 +516,7 @@ class StructuresIO:
                 else np.nan,
             )
 
+    @profiled(items="weirs")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def weirs(
         self,
@@ -663,6 +653,7 @@ class StructuresIO:
                 zvalues=" ".join([f"{yz[1]:7.3f}" for yz in yzvalues]),
             )
 
+    @profiled(items="weirs")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def weirs_from_datamodel(self, weirs: pd.DataFrame) -> None:
         """ "From parsed data model of weirs"""
@@ -677,6 +668,7 @@ class StructuresIO:
                 corrcoeff=weir.corrcoeff,
             )
 
+    @profiled(items="orifices")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def orifices_from_datamodel(self, orifices: pd.DataFrame) -> None:
         """ "From parsed data model of orifices"""
@@ -697,6 +689,7 @@ class StructuresIO:
                 limitflowneg=orifice.limitflowneg,
             )
 
+    @profiled(items="uweirs")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def uweirs_from_datamodel(self, uweirs: pd.DataFrame) -> None:
         """ "From parsed data model of universal weirs"""
@@ -713,6 +706,7 @@ class StructuresIO:
                 dischargecoeff=uweir.dischargecoeff,
             )
 
+    @profiled(items="bridges")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def bridges(
         self,
@@ -758,6 +752,7 @@ class StructuresIO:
                 friction=bridge.ruwheid,
             )
 
+    @profiled(items="bridges")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def bridges_from_datamodel(self, bridges: pd.DataFrame) -> None:
         """ "From parsed data model of bridges"""
@@ -777,6 +772,7 @@ class StructuresIO:
                 friction=bridge.ruwheid,
             )
 
+    @profiled(items="culverts")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def culverts(
         self,
@@ -881,6 +877,7 @@ class StructuresIO:
                 bedfriction=culvert.ruwheid,
             )
 
+    @profiled(items="culverts")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def culverts_from_datamodel(self, culverts: pd.DataFrame) -> None:
         """
@@ -912,6 +909,7 @@ class StructuresIO:
                 frictionvalue=culvert.frictionvalue,
             )
 
+    @profiled(items="pumps")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def pumps(
         self,
@@ -993,6 +991,7 @@ class StructuresIO:
                 stopleveldeliveryside=stoplevelsuctionside,
             )
 
+    @profiled(items="pumps")
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def pumps_from_datamodel(self, pumps: pd.DataFrame) -> None:
         """From parsed data model of pumps"""
@@ -1042,6 +1041,7 @@ class StructuresIO:
         struc_dict[struc]["chainage"] = offset
         return struc_dict
 
+    @profiled(items="idlist")
     def compound_structures(self, idlist, structurelist):
         # probably the coordinates should all be set to those of the first structure (still to do)
         # self.compounds_df = ExtendedDataFrame(
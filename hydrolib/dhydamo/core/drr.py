@@ -1,13 +1,25 @@
+import hashlib
 import logging
 import os
+from collections import OrderedDict
 from pathlib import Path
+from types import MappingProxyType
 from typing import Union
 
+import numpy as np
 import pandas as pd
 import rasterio
+import shapely
 from pydantic.v1 import validate_arguments
 from rasterio.transform import from_origin
 
+from hydrolib.dhydamo.geometry.zonal import (
+    ZoneIndex,
+    geometry_key,
+    majority_of_counts,
+    select_counts,
+    zone_key,
+)
 from hydrolib.dhydamo.io import drrreader
 
 logger = logging.getLogger(__name__)
@@ -18,8 +30,17 @@ class DRRModel:
     for unpaved, paved,greehouse and open water nodes and external forcings (seepage, precipitation, evaporation)
     """
 
-    def __init__(self):
-        """Initialize RR instances and arrays"""
+    def __init__(self, raster_cache_size: int = 2**30, raster_cache_dir=None):
+        """Initialize RR instances and arrays
+
+        Parameters
+        ----------
+        raster_cache_size : int, optional
+            Memory limit (bytes) of the cache of rasters read with read_raster. The default is 1 GiB.
+        raster_cache_dir : str, optional
+            Folder for uncompressed copies of the rasters, which are memory-mapped instead of
+            decoded again. The default is None (no memory-mapping).
+        """
         self.d3b_parameters = {}
 
         self.unpaved = Unpaved(self)
@@ -34,8 +55,227 @@ class DRRModel:
 
         self.dimr_path = ""
 
+        self._zone_indices = {}
+        self._meteo_area_codes = {}
+        self._category_counts = {}
+        self.raster_cache = RasterCache(raster_cache_size, raster_cache_dir)
+
+    def zone_index(
+        self, zones, affine, shape: tuple, all_touched: bool = False
+    ) -> ZoneIndex:
+        """
+        Zone index (sparse zone x pixel matrix) for the zones on a raster grid. The index is
+        built once per combination of zones, grid and all_touched, and reused for all rasters
+        on the same grid (land use, soil, surface level and each meteo time step).
+
+        Parameters
+        ----------
+        zones : GeoDataFrame, GeoSeries or list of geometries
+        affine : Affine
+            Transform of the raster grid
+        shape : tuple
+            Shape of the raster grid
+        all_touched : BOOL, optional
+            Include all pixels touched by a zone
+
+        Returns
+        -------
+        ZoneIndex
+
+        """
+        key = zone_key(zones, affine, shape, all_touched=all_touched)
+        if key not in self._zone_indices:
+            self._zone_indices[key] = ZoneIndex(
+                zones, affine, shape, all_touched=all_touched
+            )
+        return self._zone_indices[key]
+
+    def meteo_area_codes(self, zones, meteo_areas) -> np.ndarray:
+        """
+        Code of the meteo area that contains the centroid of each zone, found with a single
+        spatial join. If several meteo areas contain the centroid, the first is taken; if
+        none does, the code of the first meteo area. The result is cached, so all
+        node types of the same catchments reuse it.
+
+        Parameters
+        ----------
+        zones : GeoDataFrame
+            Catchments (or sewer areas)
+        meteo_areas : GeoDataFrame
+            Meteo areas with a column "code"
+
+        Returns
+        -------
+        Array with a meteo area code per zone.
+
+        """
+        key = geometry_key(zones.geometry, meteo_areas.geometry, codes=tuple(meteo_areas.code))
+        if key not in self._meteo_area_codes:
+            centroids = shapely.centroid(np.asarray(zones.geometry.values, dtype=object))
+            tree = shapely.STRtree(np.asarray(meteo_areas.geometry.values, dtype=object))
+            izone, iarea = tree.query(centroids, predicate="within")
+            # lowest index of the containing meteo areas per zone
+            first = np.full(len(zones), len(meteo_areas))
+            np.minimum.at(first, izone, iarea)
+            codes = np.append(meteo_areas.code.values.astype(object), meteo_areas.code.iloc[0])
+            self._meteo_area_codes[key] = codes[first]
+        return self._meteo_area_codes[key]
+
+    def zonal_stats(
+        self,
+        zones,
+        raster,
+        affine,
+        stats=None,
+        categorical: bool = False,
+        all_touched: bool = False,
+        nodata=-999,
+    ) -> list:
+        """
+        Zonal statistics with the same arguments and output as rasterstats.zonal_stats for an
+        array, using the (cached) zone index of the zones on the raster grid.
+
+        Returns
+        -------
+        List with a dictionary of statistics per zone.
+
+        """
+        index = self.zone_index(zones, affine, raster.shape, all_touched=all_touched)
+        return index.zonal_stats(
+            raster, stats=stats, categorical=categorical, nodata=nodata
+        )
+
+    def zonal_array(
+        self,
+        zones,
+        raster,
+        affine,
+        stat: str,
+        all_touched: bool = False,
+        nodata=-999,
+    ) -> np.ndarray:
+        """
+        Single zonal statistic (count, sum, mean, min, max, median or majority) per zone as
+        an array, with NaN for zones without valid pixels.
+
+        Returns
+        -------
+        Array with the statistic per zone.
+
+        """
+        index = self.zone_index(zones, affine, raster.shape, all_touched=all_touched)
+        return getattr(index, stat)(raster, nodata=nodata)
+
+    def zonal_counts(
+        self,
+        zones,
+        raster,
+        affine,
+        categories,
+        all_touched: bool = False,
+        nodata=-999,
+    ) -> np.ndarray:
+        """
+        Number of pixels per zone for the given categories of a categorical raster
+        (for example land use classes).
+
+        Returns
+        -------
+        Array (zones x categories) with the pixel counts.
+
+        """
+        index = self.zone_index(zones, affine, raster.shape, all_touched=all_touched)
+        return index.counts(raster, categories, nodata=nodata)
+
+    def raster_category_counts(
+        self,
+        zones,
+        file: Union[str, Path],
+        all_touched: bool = False,
+        nodata=None,
+    ) -> tuple:
+        """
+        Number of pixels per zone and category of a categorical raster file (for example
+        land use or soil type). Only the raster windows covering the zones are read, and
+        all categories are counted in one pass. The result is cached per zones and file,
+        so the unpaved, paved, greenhouse and openwater nodes of the same catchments
+        share it.
+
+        Parameters
+        ----------
+        zones : GeoDataFrame, GeoSeries or list of geometries
+        file : raster
+        all_touched : BOOL, optional
+            Include all pixels touched by a zone
+        nodata : optional
+            Value of the pixels that are ignored. Defaults to the nodata value of the
+            raster file, or -999 if the file has none.
+
+        Returns
+        -------
+        Array with the categories and a matrix (zones x categories) with the pixel counts.
+
+        """
+        with rasterio.open(file) as dataset:
+            if nodata is None:
+                nodata = -999 if dataset.nodata is None else dataset.nodata
+            key = (
+                zone_key(zones, dataset.transform, dataset.shape, all_touched=all_touched),
+                os.path.abspath(file),
+                os.path.getmtime(file),
+                nodata,
+            )
+            if key not in self._category_counts:
+                index = self.zone_index(
+                    zones, dataset.transform, dataset.shape, all_touched=all_touched
+                )
+                self._category_counts[key] = index.category_counts(
+                    index.read_pixels(dataset), nodata=nodata
+                )
+        return self._category_counts[key]
+
+    def raster_counts(
+        self,
+        zones,
+        file: Union[str, Path],
+        categories,
+        all_touched: bool = False,
+        nodata=None,
+    ) -> np.ndarray:
+        """
+        Number of pixels per zone for the given categories of a categorical raster file,
+        from the (cached) counts of raster_category_counts.
+
+        Returns
+        -------
+        Array (zones x categories) with the pixel counts.
+
+        """
+        return select_counts(
+            *self.raster_category_counts(zones, file, all_touched, nodata), categories
+        )
+
+    def raster_majority(
+        self, zones, file: Union[str, Path], all_touched: bool = False, nodata=None
+    ) -> np.ndarray:
+        """
+        Most occurring category per zone of a categorical raster file (lowest category for
+        ties, NaN for zones without valid pixels), from the (cached) counts of
+        raster_category_counts.
+
+        Returns
+        -------
+        Array with the majority per zone.
+
+        """
+        return majority_of_counts(
+            *self.raster_category_counts(zones, file, all_touched, nodata)
+        )
+
     @validate_arguments
-    def read_raster(self, file: Union[str, Path], static: bool = False) -> tuple:
+    def read_raster(
+        self, file: Union[str, Path], static: bool = False, cache: bool = True
+    ) -> tuple:
         """
         Method to read a raster. All rasterio types are accepted, plus IDF: in that case the iMod-package is used to read the IDF raster (IDF is cusomary for MODFLOW/SIMGRO models.)
 
@@ -45,6 +285,10 @@ class DRRModel:
 
         static : BOOL, optional
             If static than no time information needs to be deduced.
+        cache : BOOL, optional
+            Take the raster from the raster cache, so rasters used by several node types are
+            decoded once. Cached grids are read-only. Rasters that are read once, like meteo
+            time steps, can bypass the cache.
 
         Returns
         -------
@@ -57,11 +301,14 @@ class DRRModel:
             filename = file
 
         if not static:
-            time = pd.Timestamp(os.path.split(file)[1].split("_")[1].split(".")[0])
+            time = drrreader.raster_time(filename)
 
-        dataset = rasterio.open(filename)
-        affine = dataset.transform
-        grid = dataset.read(1)
+        if cache:
+            grid, affine = self.raster_cache.get(filename)
+        else:
+            with rasterio.open(filename) as dataset:
+                affine = dataset.transform
+                grid = dataset.read(1)
 
         if static:
             return grid, affine
@@ -69,6 +316,72 @@ class DRRModel:
             return grid, affine, time
 
 
+class RasterCache:
+    """
+    Least recently used cache of decoded rasters, keyed by path and modification time, with
+    a memory limit. The grids are handed out read-only, with their affine. Optionally, the
+    rasters are stored uncompressed in a folder and memory-mapped, so they are decoded once
+    over several sessions and do not count towards the memory limit.
+    """
+
+    def __init__(self, max_bytes: int = 2**30, mmap_dir=None):
+        self.max_bytes = max_bytes
+        self.mmap_dir = mmap_dir
+        self.nbytes = 0
+        self._rasters = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rasters)
+
+    def clear(self) -> None:
+        self._rasters.clear()
+        self.nbytes = 0
+
+    def get(self, file: Union[str, Path]) -> tuple:
+        """
+        Grid and affine of a raster, from the cache if the file has not changed
+
+        Returns
+        -------
+        Read-only grid and an affine object.
+
+        """
+        path = os.path.abspath(file)
+        key = (path, os.path.getmtime(path))
+        if key in self._rasters:
+            self._rasters.move_to_end(key)
+            return self._rasters[key][:2]
+
+        grid, affine = self._read(path, key)
+        # memory-mapped grids are paged in and out by the OS
+        nbytes = 0 if isinstance(grid, np.memmap) else grid.nbytes
+        if nbytes <= self.max_bytes:
+            self._rasters[key] = (grid, affine, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, _, evicted) = self._rasters.popitem(last=False)
+                self.nbytes -= evicted
+        return grid, affine
+
+    def _read(self, path: str, key: tuple) -> tuple:
+        with rasterio.open(path) as dataset:
+            affine = dataset.transform
+            if self.mmap_dir is None:
+                grid = dataset.read(1)
+                grid.flags.writeable = False
+                return grid, affine
+
+            name = hashlib.sha1(repr(key).encode()).hexdigest() + ".npy"
+            mmap_path = os.path.join(self.mmap_dir, name)
+            if not os.path.exists(mmap_path):
+                os.makedirs(self.mmap_dir, exist_ok=True)
+                # write to a temporary file first, so an interrupted write is not reused
+                with open(mmap_path + ".tmp", "wb") as f:
+                    np.save(f, dataset.read(1))
+                os.replace(mmap_path + ".tmp", mmap_path)
+        return np.load(mmap_path, mmap_mode="r"), affine
+
+
 class ExternalForcings:
     """
     Class for external forcings, which contains the boundary
@@ -102,21 +415,116 @@ class ExternalForcings:
         self.boundary_nodes[id] = {"id": id, "px": px, "py": py}
 
 
+def _empty_table(columns: dict) -> pd.DataFrame:
+    """Empty node table with typed columns (name: dtype), indexed by catchment id"""
+    table = pd.DataFrame(
+        {name: pd.Series(dtype=dtype) for name, dtype in columns.items()}
+    )
+    table.index = pd.Index([], dtype=object, name="id")
+    return table
+
+
+class _TableBuffer:
+    """Node table to which rows are added. The added rows are buffered and concatenated
+    to the table once, when the table is read, so adding nodes one by one does not copy
+    the table for every node. Rows with an existing id replace the old row."""
+
+    def __init__(self, columns: dict):
+        self._table = _empty_table(columns)
+        self._pending = []
+
+    def add(self, rows: pd.DataFrame) -> None:
+        rows = rows[list(self._table.columns)].astype(self._table.dtypes.to_dict())
+        rows.index = rows.index.astype(str)
+        rows.index.name = "id"
+        self._pending.append(rows)
+
+    @property
+    def table(self) -> pd.DataFrame:
+        if self._pending:
+            table = pd.concat([self._table] + self._pending)
+            self._table = table[~table.index.duplicated(keep="last")]
+            self._pending = []
+        return self._table
+
+
+def _read_only(nodes: dict) -> MappingProxyType:
+    """Read only view of node dictionaries, so changes to it raise a TypeError instead
+    of being lost"""
+    return MappingProxyType({id: MappingProxyType(node) for id, node in nodes.items()})
+
+
 class Unpaved:
     """
     Class for unpaved nodes
     """
 
+    # land use classes (in the SOBEK order) of the areas in the land use area matrix
+    lu_columns = [f"lu_area_{i}" for i in range(1, 17)]
+
+    columns = {
+        "total_area": float,
+        **{column: float for column in lu_columns},
+        "surface_level": float,
+        "soiltype": float,
+        "surface_storage": float,
+        "infiltration_capacity": float,
+        "initial_gwd": float,
+        "meteo_area": object,
+        "px": float,
+        "py": float,
+        "boundary_node": object,
+    }
+
+    ernst_columns = {"cvo": object, "lv": object, "cvi": float, "cvs": float}
+
     def __init__(self, drrmodel):
         # Point to relevant attributes from parent
         self.drrmodel = drrmodel
 
-        # initialize a dataframe for every type of nodes related to 'unpaved'
-        self.unp_nodes = {}
-        self.ernst_defs = {}
+        # initialize a table for every type of nodes related to 'unpaved'
+        self._nodes = _TableBuffer(self.columns)
+        self._ernst = _TableBuffer(self.ernst_columns)
         # couple input class
         self.io = drrreader.UnpavedIO(self)
 
+    @property
+    def lu_areas(self) -> np.ndarray:
+        """Land use area matrix (nodes x 16 SOBEK land use classes, m2)"""
+        return self.nodes[self.lu_columns].to_numpy()
+
+    @property
+    def nodes(self) -> pd.DataFrame:
+        """Node table, indexed by catchment id, with the columns of Unpaved.columns"""
+        return self._nodes.table
+
+    @property
+    def ernst(self) -> pd.DataFrame:
+        """Ernst definitions, indexed by catchment id, with the columns of Unpaved.ernst_columns"""
+        return self._ernst.table
+
+    def add_nodes(self, nodes: pd.DataFrame) -> None:
+        """Add a table of unpaved nodes, indexed by catchment id, with the columns of
+        Unpaved.columns
+
+        Args:
+            nodes (pd.DataFrame): unpaved nodes
+        """
+        self._nodes.add(nodes)
+
+    def add_ernst_defs(self, ernst: pd.DataFrame) -> None:
+        """Add a table of Ernst definitions, indexed by catchment id, with the columns of
+        Unpaved.ernst_columns
+
+        Args:
+            ernst (pd.DataFrame): Ernst definitions
+        """
+        self._ernst.add(ernst)
+
+    def active_nodes(self) -> pd.DataFrame:
+        """Unpaved nodes with an area > 0, which are written to the model"""
+        return self.nodes[self.lu_areas.sum(axis=1) > 0.0]
+
     @validate_arguments
     def add_unpaved(
         self,
@@ -133,7 +541,7 @@ class Unpaved:
         py: str,
         boundary_node: str,
     ) -> None:
-        """Add elements of an unpaved node definition to a dataframe
+        """Add elements of an unpaved node definition to the node table
 
         Args:
             id (str): catchment id
@@ -149,32 +557,24 @@ class Unpaved:
             py (str): y-coordinante
             boundary_node (str): associated boundary node
         """
-        self.unp_nodes[id] = {
-            "id": "unp_" + id,
-            "na": "16",
-            "ar": lu_areas,
-            "ga": total_area,
-            "lv": surface_level,
-            "co": "3",
-            "su": "0",
-            "sd": surface_storage,
-            "sp": "sep_" + id,
-            "ic": infiltration_capacity,
-            "ed": "ernst_" + id,
-            "bt": soiltype,
-            "ig": initial_gwd,
-            "mg": surface_level,
-            "gl": "1.5",
-            "is": "0",
-            "ms": "ms_" + meteo_area,
+        row = {
+            "total_area": total_area,
+            **dict(zip(self.lu_columns, lu_areas.split())),
+            "surface_level": surface_level,
+            "soiltype": soiltype,
+            "surface_storage": surface_storage,
+            "infiltration_capacity": infiltration_capacity,
+            "initial_gwd": initial_gwd,
+            "meteo_area": meteo_area,
             "px": px,
             "py": py,
             "boundary_node": boundary_node,
         }
+        self.add_nodes(pd.DataFrame([row], index=[id]))
 
     @validate_arguments
     def add_ernst_def(self, id: str, cvo: str, lv: str, cvi: str, cvs: str) -> None:
-        """Add properties to a datafframe containing an Ernst definition.
+        """Add properties to the table with Ernst definitions.
 
         Args:
             id (str): catchment id
@@ -183,13 +583,53 @@ class Unpaved:
             cvi (str): Infiltration resistance [d-1]
             cvs (str): Surface runoff resistance [d-1]
         """
-        self.ernst_defs[id] = {
-            "id": "ernst_" + id,
-            "cvi": cvi,
-            "cvs": cvs,
-            "cvo": cvo,
-            "lv": lv,
+        row = {"cvo": tuple(cvo.split()), "lv": tuple(lv.split()), "cvi": cvi, "cvs": cvs}
+        self.add_ernst_defs(pd.DataFrame([row], index=[id]))
+
+    @property
+    def unp_nodes(self) -> MappingProxyType:
+        """Unpaved nodes as dictionaries of formatted strings (read only)"""
+        nodes = {
+            id: {
+                "id": "unp_" + id,
+                "na": "16",
+                "ar": " ".join(f"{area:.0f}" for area in np.trunc(areas)),
+                "ga": f"{node.total_area:.0f}",
+                "lv": f"{node.surface_level:.2f}",
+                "co": "3",
+                "su": "0",
+                "sd": f"{node.surface_storage:.3f}",
+                "sp": "sep_" + id,
+                "ic": f"{node.infiltration_capacity:.3f}",
+                "ed": "ernst_" + id,
+                "bt": f"{node.soiltype:.0f}",
+                "ig": f"{node.initial_gwd:.2f}",
+                "mg": f"{node.surface_level:.2f}",
+                "gl": "1.5",
+                "is": "0",
+                "ms": "ms_" + node.meteo_area,
+                "px": f"{node.px:.0f}",
+                "py": f"{node.py:.0f}",
+                "boundary_node": node.boundary_node,
+            }
+            for (id, node), areas in zip(self.nodes.iterrows(), self.lu_areas)
+        }
+        return _read_only(nodes)
+
+    @property
+    def ernst_defs(self) -> MappingProxyType:
+        """Ernst definitions as dictionaries of formatted strings (read only)"""
+        defs = {
+            id: {
+                "id": "ernst_" + id,
+                "cvi": f"{ernst.cvi:.2f}",
+                "cvs": f"{ernst.cvs:.2f}",
+                "cvo": " ".join(map(str, ernst.cvo)),
+                "lv": " ".join(map(str, ernst.lv)),
+            }
+            for id, ernst in self.ernst.iterrows()
         }
+        return _read_only(defs)
 
 
 class Paved:
@@ -197,10 +637,22 @@ class Paved:
     Class for paved nodes.
     """
 
+    columns = {
+        "area": float,
+        "surface_level": float,
+        "street_storage": float,
+        "sewer_storage": float,
+        "pump_capacity": float,
+        "meteo_area": object,
+        "px": float,
+        "py": float,
+        "boundary_node": object,
+    }
+
     def __init__(self, drrmodel):
         # Point to relevant attributes from parent
         self.drrmodel = drrmodel
-        self.pav_nodes = {}
+        self._nodes = _TableBuffer(self.columns)
 
         # Create the io class
         self.io = drrreader.PavedIO(self)
@@ -208,6 +660,24 @@ class Paved:
         self.node_geom = {}
         self.link_geom = {}
 
+    @property
+    def nodes(self) -> pd.DataFrame:
+        """Node table, indexed by catchment or overflow id, with the columns of Paved.columns"""
+        return self._nodes.table
+
+    def add_nodes(self, nodes: pd.DataFrame) -> None:
+        """Add a table of paved nodes, indexed by catchment or overflow id, with the columns
+        of Paved.columns
+
+        Args:
+            nodes (pd.DataFrame): paved nodes
+        """
+        self._nodes.add(nodes)
+
+    def active_nodes(self) -> pd.DataFrame:
+        """Paved nodes with an area > 0, which are written to the model"""
+        return self.nodes[self.nodes["area"] > 0.0]
+
     # PAVE id 'pav_Nde_n003' ar 16200 lv 1 sd '1' ss 0 qc 0 1.94E-05 0 qo 2 2 ms 'Station1' aaf 1 is 0 np 0 dw '1' ro 0 ru 0 qh '' pave#
     @validate_arguments
     def add_paved(
@@ -223,7 +693,7 @@ class Paved:
         py: str,
         boundary_node: str,
     ) -> None:
-        """Add elements of a paved node definition to a dataframe
+        """Add elements of a paved node definition to the node table
 
         Args:
             id (str): catchment id
@@ -231,29 +701,48 @@ class Paved:
             surface_level (str): surface level (m)
             street_storage (str): surface storage (mm)
             sewer_storage (str): sewer storage (mm)
-            pump_capacity (str): pump capacity (mm/d)
+            pump_capacity (str): pump capacity (m3/s)
             meteo_area (str): id of meteo area to which a station in the meteo-file is assigned
             px (str): x-coordinate
             py (str): y-coordinante
             boundary_node (str): associated boundary node
         """
-
-        self.pav_nodes[id] = {
-            "id": "pav_" + id,
-            "ar": area,
-            "lv": surface_level,
-            "qc": pump_capacity,
-            "strs": street_storage,
-            "sews": sewer_storage,
-            "ms": "ms_" + meteo_area,
-            "is": "0",
-            "np": "0",
-            "ro": "0",
-            "ru": "0",
+        row = {
+            "area": area,
+            "surface_level": surface_level,
+            "street_storage": street_storage,
+            "sewer_storage": sewer_storage,
+            "pump_capacity": pump_capacity,
+            "meteo_area": meteo_area,
             "px": px,
             "py": py,
             "boundary_node": boundary_node,
         }
+        self.add_nodes(pd.DataFrame([row], index=[id]))
+
+    @property
+    def pav_nodes(self) -> MappingProxyType:
+        """Paved nodes as dictionaries of formatted strings (read only)"""
+        nodes = {
+            id: {
+                "id": "pav_" + id,
+                "ar": str(node.area),
+                "lv": f"{node.surface_level:.2f}",
+                "qc": f"{node.pump_capacity:.8f}",
+                "strs": f"{node.street_storage:.2f}",
+                "sews": f"{node.sewer_storage:.2f}",
+                "ms": "ms_" + node.meteo_area,
+                "is": "0",
+                "np": "0",
+                "ro": "0",
+                "ru": "0",
+                "px": f"{node.px:.0f}",
+                "py": f"{node.py:.0f}",
+                "boundary_node": node.boundary_node,
+            }
+            for id, node in self.nodes.iterrows()
+        }
+        return _read_only(nodes)
 
 
 class Greenhouse:
@@ -261,13 +750,41 @@ class Greenhouse:
     Class for greenhouse nodes
     """
 
+    columns = {
+        "area": float,
+        "surface_level": float,
+        "roof_storage": float,
+        "meteo_area": object,
+        "px": float,
+        "py": float,
+        "boundary_node": object,
+    }
+
     def __init__(self, drrmodel):
         self.drrmodel = drrmodel
-        self.gh_nodes = {}
+        self._nodes = _TableBuffer(self.columns)
 
         # Create the io class
         self.io = drrreader.GreenhouseIO(self)
 
+    @property
+    def nodes(self) -> pd.DataFrame:
+        """Node table, indexed by catchment id, with the columns of Greenhouse.columns"""
+        return self._nodes.table
+
+    def add_nodes(self, nodes: pd.DataFrame) -> None:
+        """Add a table of greenhouse nodes, indexed by catchment id, with the columns of
+        Greenhouse.columns
+
+        Args:
+            nodes (pd.DataFrame): greenhouse nodes
+        """
+        self._nodes.add(nodes)
+
+    def active_nodes(self) -> pd.DataFrame:
+        """Greenhouse nodes with an area > 0, which are written to the model"""
+        return self.nodes[self.nodes["area"] > 0.0]
+
     #    GRHS id ’1’ na 10 ar 1000. 0. 0. 3000. 0. 0. 0. 0. 0. 0. sl 1.0 as 0. sd ’roofstor 1mm’ si
     #    ’silo typ1’ ms ’meteostat1’ is 50.0 grhs
     @validate_arguments
@@ -282,7 +799,7 @@ class Greenhouse:
         py: str,
         boundary_node: str,
     ) -> None:
-        """Add elements of a greenhouse node definition to a dataframe
+        """Add elements of a greenhouse node definition to the node table
 
         Args:
             id (str): catchment id
@@ -294,17 +811,35 @@ class Greenhouse:
             py (str): y-coordinante
             boundary_node (str): associated boundary node
         """
-        self.gh_nodes[id] = {
-            "id": "gh_" + id,
-            "ar": area,
-            "sl": surface_level,
-            "sd": roof_storage,
-            "ms": "ms_" + meteo_area,
-            "is": "0",
+        row = {
+            "area": area,
+            "surface_level": surface_level,
+            "roof_storage": roof_storage,
+            "meteo_area": meteo_area,
             "px": px,
             "py": py,
             "boundary_node": boundary_node,
         }
+        self.add_nodes(pd.DataFrame([row], index=[id]))
+
+    @property
+    def gh_nodes(self) -> MappingProxyType:
+        """Greenhouse nodes as dictionaries of formatted strings (read only)"""
+        nodes = {
+            id: {
+                "id": "gh_" + id,
+                "ar": str(node.area),
+                "sl": f"{node.surface_level:.2f}",
+                "sd": f"{node.roof_storage:.2f}",
+                "ms": "ms_" + node.meteo_area,
+                "is": "0",
+                "px": f"{node.px:.0f}",
+                "py": f"{node.py:.0f}",
+                "boundary_node": node.boundary_node,
+            }
+            for id, node in self.nodes.iterrows()
+        }
+        return _read_only(nodes)
 
 
 class Openwater:
@@ -312,18 +847,44 @@ class Openwater:
     Class for open water nodes
     """
 
+    columns = {
+        "area": float,
+        "meteo_area": object,
+        "px": float,
+        "py": float,
+        "boundary_node": object,
+    }
+
     def __init__(self, drrmodel):
         self.drrmodel = drrmodel
-        self.ow_nodes = {}
+        self._nodes = _TableBuffer(self.columns)
 
         # Create the io class
         self.io = drrreader.OpenwaterIO(self)
 
+    @property
+    def nodes(self) -> pd.DataFrame:
+        """Node table, indexed by catchment id, with the columns of Openwater.columns"""
+        return self._nodes.table
+
+    def add_nodes(self, nodes: pd.DataFrame) -> None:
+        """Add a table of open water nodes, indexed by catchment id, with the columns of
+        Openwater.columns
+
+        Args:
+            nodes (pd.DataFrame): open water nodes
+        """
+        self._nodes.add(nodes)
+
+    def active_nodes(self) -> pd.DataFrame:
+        """Open water nodes with an area > 0, which are written to the model"""
+        return self.nodes[self.nodes["area"] > 0.0]
+
     @validate_arguments
     def add_openwater(
         self, id: str, area: str, meteo_area: str, px: str, py: str, boundary_node: str
     ) -> None:
-        """Add elements of an open water node definition to a dataframe
+        """Add elements of an open water node definition to the node table
 
         Args:
             id (str): catchment id
@@ -333,11 +894,27 @@ class Openwater:
             py (str): y-coordinante
             boundary_node (str): associated boundary node
         """
-        self.ow_nodes[id] = {
-            "id": "ow_" + id,
-            "ar": area,
-            "ms": "ms_" + meteo_area,
+        row = {
+            "area": area,
+            "meteo_area": meteo_area,
             "px": px,
             "py": py,
             "boundary_node": boundary_node,
         }
+        self.add_nodes(pd.DataFrame([row], index=[id]))
+
+    @property
+    def ow_nodes(self) -> MappingProxyType:
+        """Open water nodes as dictionaries of formatted strings (read only)"""
+        nodes = {
+            id: {
+                "id": "ow_" + id,
+                "ar": str(node.area),
+                "ms": "ms_" + node.meteo_area,
+                "px": f"{node.px:.0f}",
+                "py": f"{node.py:.0f}",
+                "boundary_node": node.boundary_node,
+            }
+            for id, node in self.nodes.iterrows()
+        }
+        return _read_only(nodes)
@@ -10,6 +10,7 @@ import xml.etree.ElementTree as ET
 
 from hydrolib.core.dflowfm.mdu.models import FMModel
 from hydrolib.dhydamo.core.hydamo import HyDAMO
+from hydrolib.dhydamo.core.profiling import profiled
 
 logger = logging.getLogger(__name__)
 
@@ -468,6 +469,7 @@ class DRTCModel:
         with open(filename, "w+") as f:
             f.write(xml)
 
+    @profiled()
     def write_xml_v1(self) -> None:
         """Wrapper function to write individual XML files."""
         self.write_runtimeconfig()
@@ -479,6 +481,7 @@ class DRTCModel:
     # def write_runtimeconfig_2(self):
     #     timing = RtcUserDefinedRuntimeComplexType(tartDate = '2016-01-01 00:00:00', rtc:endDate='2016-01-03 00:00:00', rtc:timeStep='3600')
 
+    @profiled()
     def write_runtimeconfig(self) -> None:
         """Function to write RtcRunTimeConfig.xml from the created dictionaries. They are built from empty files in the template directory using the Etree-package."""
 
@@ -514,6 +517,7 @@ class DRTCModel:
         # write new xml file
         self.finish_file(myroot, configfile, self.output_path / "rtcRuntimeConfig.xml")
 
+    @profiled()
     def write_toolsconfig(self) -> None:
         """Function to write RtcToolsConfig.xml from the created dictionaries. They are built from empty files in the template directory using the Etree-package."""
         generalname = "http://www.wldelft.nl/fews"
@@ -727,6 +731,7 @@ class DRTCModel:
                 
         self.finish_file(myroot, configfile, self.output_path / "rtcToolsConfig.xml")
 
+    @profiled()
     def write_dataconfig(self) -> None:
         """Function to write RtcDataConfig.xml from the created dictionaries. They are built from empty files in the template directory using the Etree-package."""
         generalname = "http://www.wldelft.nl/fews"
@@ -992,6 +997,7 @@ class DRTCModel:
                 myroot[1].append(ET.fromstring(ctl))
         self.finish_file(myroot, configfile, self.output_path / "rtcDataConfig.xml")
 
+    @profiled()
     def write_timeseries_import(self) -> None:
         """Function to write timeseries_import.xml from the created dictionaries. They are built from empty files in the template directory using the Etree-package."""
         generalname = "http://www.wldelft.nl/fews/PI"
@@ -1179,6 +1185,7 @@ class DRTCModel:
 
         self.finish_file(myroot, configfile, self.output_path / "timeseries_import.xml")
 
+    @profiled()
     def write_state_import(self) -> None:
         """Function to write state_import.xml from the created dictionaries. They are built from empty files in the template directory using the Etree-package."""
         generalname = "http://www.openda.org"
@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Union, Optional
+from typing import List, Union, Optional
 
 import geopandas as gpd
 import numpy as np
@@ -1653,8 +1653,70 @@ class ExternalForcings:
             "value_unit": "m3/s",
             "value": values,
             "discharge": discharge,
+            "table": None,
+            "column": None,
         }
 
+    @validate_arguments(config=dict(arbitrary_types_allowed=True))
+    def add_laterals(
+        self,
+        ids: List[str],
+        branchids: List[str],
+        chainages: List[str],
+        discharges: Union[pd.DataFrame, pd.Series, float, str],
+    ) -> None:
+        """Add a set of laterals to an FM model at once. The result is the same as calling
+        add_lateral for every lateral, but the time conversion is done once and the
+        discharge series of all laterals are stored as views on a single array.
+
+        Args:
+            ids (List[str]): Ids of the lateral nodes
+            branchids (List[str]): branchid each lateral is snapped to
+            chainages (List[str]): chainage of each lateral on the branch
+            discharges (pd.DataFrame, pd.Series, float or str): a DataFrame with time index and a column per lateral id,
+                a Series with a constant discharge per lateral id, a float (constant for all laterals), or REALTIME when linked to RR
+        """
+        if not len(ids) == len(branchids) == len(chainages):
+            raise ValueError("ids, branchids and chainages should have the same length.")
+
+        times = None
+        values = None
+        startdate = "0000-00-00 00:00:00"
+        if isinstance(discharges, pd.DataFrame):
+            # Convert time to minutes, once for all laterals
+            times = (
+                (discharges.index - discharges.index[0]).total_seconds() / 60.0
+            ).to_numpy()
+            startdate = discharges.index[0].strftime("%Y-%m-%d %H:%M:%S")
+            values = discharges.loc[:, ids].to_numpy(dtype=float)
+            # a Series per lateral, as with add_lateral, as a view on the table
+            discharge = [
+                pd.Series(values[:, column], index=discharges.index, name=id, copy=False)
+                for column, id in enumerate(ids)
+            ]
+        elif isinstance(discharges, pd.Series):
+            discharge = discharges.loc[ids].astype(float).tolist()
+        else:
+            discharge = [discharges] * len(ids)
+
+        for column, (id, branchid, chainage) in enumerate(zip(ids, branchids, chainages)):
+            self.lateral_nodes[id] = {
+                "id": id,
+                "name": id,
+                "type": "discharge",
+                "locationtype": "1d",
+                "branchid": branchid,
+                "chainage": chainage,
+                "time": times,
+                "time_unit": f"minutes since {startdate}",
+                "value_unit": "m3/s",
+                "value": None if values is None else values[:, column],
+                "discharge": discharge[column],
+                # the shared discharge table, so it can be written without copying
+                "table": values,
+                "column": None if values is None else column,
+            }
+
 
 class Structures:
     def __init__(self, hydamo):
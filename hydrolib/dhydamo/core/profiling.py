@@ -0,0 +1,293 @@
+import functools
+import inspect
+import json
+import logging
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Union
+
+import pandas as pd
+
+from hydrolib import dhydamo
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc.reset_peak is available from Python 3.9. Without it, the peak memory of a
+# stage is the peak since the start of tracing, so it is not split per stage.
+_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+# The profiler that records the stages. None if no profiler is active, in which case
+# the instrumented functions only pay for a single attribute lookup.
+_active = None
+
+
+class Profiler:
+    """Record wall time, peak memory and item counts of the stages of a model build.
+
+    The main entry points of the D-HyDAMO workflow (reading the GeoPackage, snapping,
+    converting profiles and structures, building the mesh and 1D2D links, converting
+    to hydrolib-core objects and writing the RR and RTC models) are instrumented with
+    the `profiled` decorator. These are recorded when they are called within an
+    active profiler:
+
+        with Profiler() as profiler:
+            hydamo = HyDAMO(extent_file=...)
+            ...
+        print(profiler.summary())
+        profiler.to_json("build_profile.json")
+
+    Custom stages can be added with `profiler.stage(name)` or the module level
+    `stage(name)` context manager.
+    """
+
+    def __init__(self, name: str = "build", trace_memory: bool = True) -> None:
+        """
+        Args:
+            name (str, optional): Name of the build, stored in the report. Defaults to "build".
+            trace_memory (bool, optional): Record the peak memory per stage with tracemalloc. This
+                slows down the build considerably. On Python 3.8 the peaks are not split per
+                stage: the peak of a stage includes the earlier peaks. Defaults to True.
+        """
+        self.name = name
+        self.trace_memory = trace_memory
+        self.records = []
+
+        self._stack = []
+        self._started_tracing = False
+        self._previous = None
+        self._start = None
+        self._wall_time = None
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Activate the profiler"""
+        global _active
+        self._previous = _active
+        _active = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start = time.perf_counter()
+
+    def stop(self) -> None:
+        """Deactivate the profiler"""
+        global _active
+        self._wall_time = time.perf_counter() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        _active = self._previous
+
+    @contextmanager
+    def stage(self, name: str, items: int = None):
+        """Record a stage. The yielded record is a dictionary, of which the item count
+        can be set while the stage is running (record["items"] = ...)."""
+        record = {
+            "stage": name,
+            "parent": self._stack[-1]["stage"] if self._stack else None,
+            "depth": len(self._stack),
+            "start": None,
+            "wall_time": None,
+            "peak_memory": None,
+            "items": items,
+        }
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # Store the peak of the parent before the peak is reset for this stage
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            if _RESET_PEAK:
+                tracemalloc.reset_peak()
+            record["_start_memory"] = current
+            record["_peak"] = current
+
+        self._stack.append(record)
+        start = time.perf_counter()
+        record["start"] = start - self._start
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - start
+            self._stack.pop()
+            if tracing and tracemalloc.is_tracing():
+                peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+                record["peak_memory"] = (peak - record.pop("_start_memory")) / 1e6
+                # Pass the peak on to the parent stage
+                if self._stack:
+                    self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            else:
+                record.pop("_peak", None)
+                record.pop("_start_memory", None)
+            self.records.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Aggregate the records per stage, in order of first call.
+
+        Returns:
+            pd.DataFrame: calls, total and maximum wall time (s), peak memory (MB) and number of items per stage
+        """
+        columns = ["calls", "wall_time", "max_wall_time", "peak_memory", "items"]
+        if not self.records:
+            return pd.DataFrame(columns=columns, index=pd.Index([], name="stage"))
+        # Records are added when a stage ends, sort them in the order the stages started
+        records = pd.DataFrame(self.records).sort_values("start", kind="stable")
+        grouped = records.groupby("stage", sort=False)
+        summary = pd.DataFrame(
+            {
+                "calls": grouped.size(),
+                "wall_time": grouped["wall_time"].sum(),
+                "max_wall_time": grouped["wall_time"].max(),
+                "peak_memory": grouped["peak_memory"].max(),
+                "items": pd.to_numeric(grouped["items"].sum(min_count=1)).astype("Int64"),
+            }
+        )
+        return summary[columns]
+
+    def report(self) -> dict:
+        """Structured report of the build, which can be stored as JSON and compared between builds"""
+        frame = self.to_frame()
+        return {
+            "name": self.name,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "hydrolib_dhydamo": dhydamo.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "wall_time": self._wall_time,
+            "stages": [
+                {"stage": stage, **{key: _to_builtin(value) for key, value in row.items()}}
+                for stage, row in frame.iterrows()
+            ],
+            "records": [
+                {key: _to_builtin(value) for key, value in record.items()}
+                for record in self.records
+            ],
+        }
+
+    def to_json(self, filepath: Union[str, Path]) -> None:
+        """Write the report to a JSON file
+
+        Args:
+            filepath (Union[str, Path]): Path of the JSON file
+        """
+        with open(filepath, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self) -> str:
+        """Summary table of the stages, as text"""
+        frame = self.to_frame()
+        frame["items"] = frame["items"].astype(object).where(frame["items"].notna(), "-")
+        lines = [f"Profile of {self.name}"]
+        if self._wall_time is not None:
+            lines[0] += f" ({self._wall_time:.2f} s)"
+        lines.append(
+            frame.to_string(
+                float_format=lambda v: f"{v:.3f}",
+                na_rep="-",
+                header=["calls", "time [s]", "max [s]", "peak [MB]", "items"],
+            )
+        )
+        return "\n".join(lines)
+
+
+def _to_builtin(value):
+    """Convert NumPy scalars and NaN to JSON serializable values"""
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+    return value
+
+
+def active_profiler() -> Union[Profiler, None]:
+    """Return the active profiler, or None"""
+    return _active
+
+
+@contextmanager
+def stage(name: str, items: int = None):
+    """Record a stage in the active profiler. Does nothing if no profiler is active."""
+    if _active is None:
+        yield {}
+        return
+    with _active.stage(name, items=items) as record:
+        yield record
+
+
+def profiled(name: str = None, items: Union[str, Callable] = None) -> Callable:
+    """Decorator that records a function as stage in the active profiler
+
+    Args:
+        name (str, optional): Name of the stage. Defaults to the qualified name of the function.
+        items (Union[str, Callable], optional): Number of items processed. Either the name of an
+            argument of which the length is counted, or a function that is called with the return
+            value and a dictionary of the bound arguments. Defaults to None.
+    """
+
+    def decorator(func):
+        stagename = name if name is not None else func.__qualname__
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(stagename) as record:
+                result = func(*args, **kwargs)
+                if items is not None:
+                    try:
+                        arguments = signature.bind(*args, **kwargs).arguments
+                        if isinstance(items, str):
+                            record["items"] = len(arguments[items])
+                        else:
+                            record["items"] = items(result, arguments)
+                    except Exception:
+                        logger.debug(f"Could not count the items of stage {stagename}.")
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def compare_reports(
+    reference: Union[dict, str, Path], other: Union[dict, str, Path]
+) -> pd.DataFrame:
+    """Compare the stages of two reports, e.g. from two builds or versions.
+
+    Args:
+        reference (Union[dict, str, Path]): Reference report, or path of its JSON file
+        other (Union[dict, str, Path]): Report to compare, or path of its JSON file
+
+    Returns:
+        pd.DataFrame: wall time, peak memory and items of both reports per stage, and the ratio of the wall times
+    """
+    frames = []
+    for report in [reference, other]:
+        if not isinstance(report, dict):
+            with open(report, "r") as f:
+                report = json.load(f)
+        frames.append(
+            pd.DataFrame(report["stages"])
+            .set_index("stage")[["wall_time", "peak_memory", "items"]]
+            .astype(float)
+        )
+    comparison = frames[0].join(
+        frames[1], how="outer", lsuffix="_reference", rsuffix="_other", sort=False
+    )
+    comparison["wall_time_ratio"] = (
+        comparison["wall_time_other"] / comparison["wall_time_reference"]
+    )
+    return comparison
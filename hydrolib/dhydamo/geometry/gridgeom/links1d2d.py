@@ -4,7 +4,6 @@ from shapely.geometry import LineString, Point, Polygon
 from scipy.spatial import KDTree
 import logging
 import geopandas as gpd
-from tqdm.auto import tqdm
 from hydrolib.dhydamo.geometry.gridgeom import geometry
 
 logger = logging.getLogger(__name__)
@@ -115,17 +114,14 @@ class Links1d2d:
             distance, _ = get_nearest.query(centers2d)
             idx = idx[distance < max_distance]
 
-        # Create GeoDataFrame
+        # Create GeoDataFrame, selecting the cells by index
         logger.info(f"Creating GeoDataFrame of ({len(idx)}) 2D cells.")
+        faces = self.mesh2d.get_faces()
         cells = gpd.GeoDataFrame(
             data=centers2d[idx],
             columns=["x", "y"],
             index=idx + 1,
-            geometry=[
-                Polygon(cell)
-                for i, cell in enumerate(self.mesh2d.get_faces())
-                if i in idx
-            ],
+            geometry=[Polygon(faces[i]) for i in idx],
         )
 
         # Find intersecting cells with branches
@@ -161,21 +157,12 @@ class Links1d2d:
             logger.info("Remove links that cross another 2D cell.")
             # Make sure only the nearest cells are accounted by removing all links that also cross another cell
             links = self.get_1d2dlinks(as_gdf=True)
-            todrop = []
-
-            # Remove links that intersect multiple cells
-            cellbounds = cells.bounds.values.T
-            for link in tqdm(
-                links.itertuples(),
-                total=len(links),
-                desc="Removing links crossing mult. cells",
-            ):
-                selectie = cells.loc[
-                    geometry.possibly_intersecting(cellbounds, link.geometry)
-                ].copy()
-                if selectie.intersects(link.geometry).sum() > 1:
-                    todrop.append(link.Index)
-            links.drop(todrop, inplace=True)
+
+            # Remove links that intersect multiple cells. The intersecting cells of all
+            # links are found at once with the spatial index of the cells.
+            ilink, _ = cells.sindex.query(links.geometry, predicate="intersects")
+            ncells = np.bincount(ilink, minlength=len(links))
+            links = links.loc[ncells <= 1]
 
             # Re-assign
             del self.nodes1d[:]
@@ -4,23 +4,23 @@ from enum import Enum
 from pathlib import Path
 import numpy as np
 import meshkernel as mk
+import shapely
+from shapely import STRtree
 from shapely.geometry import (
     LineString,
     MultiLineString,
-    MultiPoint,
     MultiPolygon,
-    Point,
     Polygon,
     box,
 )
-from shapely.prepared import prep
 
 from hydrolib.core.dflowfm.net.models import Branch, Network
 from hydrolib.core.dflowfm.net.reader import UgridReader
+from hydrolib.dhydamo.core.profiling import profiled
 from hydrolib.dhydamo.geometry import common, rasterstats, spatial
 from hydrolib.dhydamo.geometry.models import GeometryList
 
-from scipy.spatial import KDTree
+from scipy.spatial import KDTree, QhullError
 from scipy.interpolate import LinearNDInterpolator
 
 import geopandas as gpd
@@ -39,6 +39,18 @@ class RasterStatPosition(Enum):
     FACE = "face"
 
 
+def _count_links(result, arguments) -> int:
+    """Number of 1d2d links in the network, for the profiler"""
+    return len(arguments["network"]._link1d2d.link1d2d)
+
+
+def _count_mesh2d(result, arguments) -> int:
+    """Number of 2d nodes or faces of which the altitude is determined, for the profiler"""
+    if arguments.get("where", "face") in ["node", RasterStatPosition.NODE]:
+        return len(arguments["network"]._mesh2d.mesh2d_node_x)
+    return len(arguments["network"]._mesh2d.mesh2d_face_x)
+
+
 def mesh2d_add_rectilinear(
     network: Network,
     polygon: Union[Polygon, MultiPolygon],
@@ -242,6 +254,7 @@ def mesh1d_add_branch_from_linestring(
     return branchid
 
 
+@profiled(items="branches")
 def mesh1d_add_branches_from_gdf(
     network: Network,
     branches: gpd.GeoDataFrame,
@@ -370,6 +383,7 @@ def mesh1d_set_branch_order(network: Network, branchids: list, idx: int = None)
     # Save
     network._mesh1d.network1d_branch_order = branchorder
 
+@profiled(items=_count_links)
 def links1d2d_add_links_1d_to_2d(
     network: Network,
     branchids: List[str] = None,
@@ -443,6 +457,45 @@ def _filter_links_on_idx(network: Network, keep: np.ndarray) -> None:
     network._link1d2d.link1d2d_long_name = network._link1d2d.link1d2d_long_name[keep]
 
 
+def _faces_intersect_edges(
+    mesh2d: mk.Mesh2d, faces: np.ndarray, edges: np.ndarray
+) -> np.ndarray:
+    """Check which faces of the 2d mesh are crossed by a set of line segments. The
+    face boundaries are created as linestrings at once and queried against a spatial
+    index of the segments.
+
+    Args:
+        mesh2d (mk.Mesh2d): The 2d mesh, as returned by meshkernel
+        faces (np.ndarray): Indices of the faces to check
+        edges (np.ndarray): Segments with shape (n, 2, 2)
+
+    Returns:
+        np.ndarray: Boolean mask, True for each face that is crossed by a segment
+    """
+    crossed = np.zeros(len(faces), dtype=bool)
+    if len(faces) == 0 or len(edges) == 0:
+        return crossed
+
+    # Gather the nodes of each face from the flat face-node array, and close the
+    # boundary by repeating the first node
+    nodes_per_face = mesh2d.nodes_per_face
+    offsets = np.concatenate([[0], np.cumsum(nodes_per_face)[:-1]])
+    counts = nodes_per_face[faces] + 1
+    rows = np.repeat(np.arange(len(faces)), counts)
+    local = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    local[local == counts[rows] - 1] = 0
+    face_nodes = mesh2d.face_nodes[offsets[faces][rows] + local]
+
+    boundaries = shapely.linestrings(
+        mesh2d.node_x[face_nodes], mesh2d.node_y[face_nodes], indices=rows
+    )
+    tree = STRtree(shapely.linestrings(edges))
+    face_index, _ = tree.query(boundaries, predicate="intersects")
+    crossed[face_index] = True
+    return crossed
+
+
+@profiled(items=_count_links)
 def links1d2d_add_links_2d_to_1d_embedded(
     network: Network,
     branchids: List[str] = None,
@@ -452,8 +505,8 @@ def links1d2d_add_links_2d_to_1d_embedded(
 
     To find the intersecting cells in an efficient way, we follow we the next steps. 1) Get the
     maximum length of a face edge. 2) Buffer the branches with this length. 3) Find all face nodes
-    within this buffered geometry. 4) Check for each of the corresponding faces if it crossed the
-    branches.
+    within this buffered geometry. 4) Check which of the corresponding faces cross the branches,
+    with a spatial index of the branch segments.
 
     Args:
         network (Network): Network in which the links are made. Should contain a 1d and 2d mesh
@@ -461,11 +514,12 @@ def links1d2d_add_links_2d_to_1d_embedded(
         within (Union[Polygon, MultiPolygon], optional): Clipping polygon for 2d mesh that is. Defaults to None.
 
     """
+    # Get the 2d mesh from meshkernel once, every mesh2d property of the network retrieves it again
+    mesh2d = network._mesh2d.get_mesh2d()
+
     # Get the max edge distance
-    nodes2d = np.stack(
-        [network._mesh2d.mesh2d_node_x, network._mesh2d.mesh2d_node_y], axis=1
-    )
-    edge_node_crds = nodes2d[network._mesh2d.mesh2d_edge_nodes]
+    nodes2d = np.stack([mesh2d.node_x, mesh2d.node_y], axis=1)
+    edge_node_crds = nodes2d[mesh2d.edge_nodes.reshape((-1, 2))]
 
     diff = edge_node_crds[:, 0, :] - edge_node_crds[:, 1, :]
     maxdiff = np.hypot(diff[:, 0], diff[:, 1]).max()
@@ -475,9 +529,9 @@ def links1d2d_add_links_2d_to_1d_embedded(
         [network._mesh1d.mesh1d_node_x, network._mesh1d.mesh1d_node_y], axis=1
     )
 
-    # Create a prepared multilinestring of the 1d network, to check for intersections
-    mls = MultiLineString(nodes1d[network._mesh1d.mesh1d_edge_nodes].tolist())
-    mls_prep = prep(mls)
+    # Create a multilinestring of the 1d network, and the separate edges to check for intersections
+    edges1d = nodes1d[network._mesh1d.mesh1d_edge_nodes]
+    mls = MultiLineString(edges1d.tolist())
 
     # Buffer the branches with the max cell distances
     area = mls.buffer(maxdiff)
@@ -487,10 +541,8 @@ def links1d2d_add_links_2d_to_1d_embedded(
         area = area.intersection(within)
 
     # Create an array with 2d facecenters and check which intersect the (clipped) area
-    faces2d = np.stack(
-        [network._mesh2d.mesh2d_face_x, network._mesh2d.mesh2d_face_y], axis=1
-    )
-    
+    faces2d = np.stack([mesh2d.face_x, mesh2d.face_y], axis=1)
+
     mpgl = mk.GeometryList(*faces2d.T.copy())
     idx = np.zeros(len(faces2d), dtype=bool)
     for subarea in common.as_polygon_list(area):
@@ -517,14 +569,9 @@ def links1d2d_add_links_2d_to_1d_embedded(
             network.meshkernel.polygon_get_included_points(subarea, mpgl).values == 1
         )
 
-    # Check for each of the remaining faces, if it actually crosses the branches
-    nodes2d = np.stack(
-        [network._mesh2d.mesh2d_node_x, network._mesh2d.mesh2d_node_y], axis=1
-    )
+    # Check for the remaining faces, if they actually cross the branches
     where = np.nonzero(idx)[0]
-    for i, face_crds in enumerate(nodes2d[network._mesh2d.mesh2d_face_nodes[idx]]):
-        if not mls_prep.intersects(LineString(face_crds)):
-            idx[where[i]] = False
+    idx[where[~_faces_intersect_edges(mesh2d, where, edges1d)]] = False
 
     # Use the remaining points to create the links
     multipoint = mk.GeometryList(
@@ -535,10 +582,74 @@ def links1d2d_add_links_2d_to_1d_embedded(
     # TODO: The node mask does not seem to work
     node_mask = network._mesh1d.get_node_mask(branchids)
 
-    # Generate links
-    network._link1d2d._link_from_2d_to_1d_embedded(node_mask, points=multipoint)
+    # Generate links. The points are passed by position, as hydrolib-core passes them as
+    # "points", which is named "polygons" in meshkernel 4.3.
+    network._link1d2d.meshkernel.contacts_compute_with_points(node_mask, multipoint)
+    network._link1d2d._process()
 
 
+def _links_boundary_intersections(
+    start: np.ndarray, end: np.ndarray, segments: np.ndarray, eps: float = 1e-9
+) -> tuple:
+    """Intersect a set of links with the segments of the mesh boundary. The segments
+    crossed by each link are found with a spatial index, after which the intersection
+    points are calculated for all link-segment pairs at once.
+
+    Args:
+        start (np.ndarray): Start coordinates of the links, shape (n, 2)
+        end (np.ndarray): End coordinates of the links, shape (n, 2)
+        segments (np.ndarray): Boundary segments with shape (m, 2, 2)
+        eps (float, optional): Relative position along the link within which two
+            intersections are considered the same point. Defaults to 1e-9.
+
+    Returns:
+        tuple: The number of distinct intersections per link, and the distance from the
+            link start to the nearest intersection. Links that overlap the boundary
+            get a count of -1, links without intersection a distance of inf.
+    """
+    count = np.zeros(len(start), dtype=int)
+    dist = np.full(len(start), np.inf)
+    if len(start) == 0 or len(segments) == 0:
+        return count, dist
+
+    tree = STRtree(shapely.linestrings(segments))
+    ilink, iseg = tree.query(
+        shapely.linestrings(np.stack([start, end], axis=1)), predicate="intersects"
+    )
+
+    # Intersection point as position t along the link, p + t * r = q + u * s
+    p = start[ilink]
+    r = end[ilink] - p
+    q = segments[iseg, 0]
+    s = segments[iseg, 1] - q
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+
+    # Links that are parallel to and overlap a boundary segment are not valid
+    parallel = denom == 0.0
+    overlapping = np.unique(ilink[parallel])
+    ilink, p, q, s, denom = (
+        ilink[~parallel], p[~parallel], q[~parallel], s[~parallel], denom[~parallel]
+    )
+    t = ((q[:, 0] - p[:, 0]) * s[:, 1] - (q[:, 1] - p[:, 1]) * s[:, 0]) / denom
+
+    # Count the distinct intersections per link, a link crossing a boundary vertex
+    # intersects both adjacent segments in the same point
+    order = np.lexsort((t, ilink))
+    ilink, t = ilink[order], t[order]
+    distinct = np.ones(len(ilink), dtype=bool)
+    distinct[1:] = (ilink[1:] != ilink[:-1]) | (np.diff(t) > eps)
+    np.add.at(count, ilink[distinct], 1)
+
+    # The first entry per link is the nearest intersection
+    first = np.ones(len(ilink), dtype=bool)
+    first[1:] = ilink[1:] != ilink[:-1]
+    dist[ilink[first]] = t[first] * np.hypot(*(end - start)[ilink[first]].T)
+
+    count[overlapping] = -1
+    return count, dist
+
+
+@profiled(items=_count_links)
 def links1d2d_add_links_2d_to_1d_lateral(
     network: Network,
     dist_factor: Union[float, None] = 2.0,
@@ -605,11 +716,16 @@ def links1d2d_add_links_2d_to_1d_lateral(
     if dist_factor is None:
         return
 
-    # Create multilinestring
+    # Create an array with the segments of the mesh boundaries
     if isinstance(mpboundaries, Polygon):
-        multilinestring = MultiLineString([mpboundaries.exterior])
-    else: 
-        multilinestring = MultiLineString([poly.exterior for poly in mpboundaries.geoms])
+        exteriors = [mpboundaries.exterior]
+    else:
+        exteriors = [poly.exterior for poly in mpboundaries.geoms]
+    segments = []
+    for exterior in exteriors:
+        crds = np.asarray(exterior.coords)
+        segments.append(np.stack([crds[:-1], crds[1:]], axis=1))
+    segments = np.concatenate(segments)
 
     # Find the links that intersect the boundary close to the origin
     id1d = network._link1d2d.link1d2d[npresent:, 0]
@@ -640,27 +756,18 @@ def links1d2d_add_links_2d_to_1d_lateral(
         / np.hypot(x2 - x1, y2 - y1)
     ).mean(axis=1)
 
-    # Check which links to keep
-    keep = list(range(npresent))
-    for i, (node1d, face2d, comp_dist) in enumerate(
-        zip(nodes1d, faces2d, distance * dist_factor)
-    ):
-        isect = multilinestring.intersection(LineString([face2d, node1d]))
+    # Get the number of intersections with the boundary and the distance to the first
+    count, isect_dist = _links_boundary_intersections(faces2d, nodes1d, segments)
 
-        # If the intersection is for some reason not a Point of Multipoint, skip it.
-        if not isinstance(isect, (Point, MultiPoint)):
-            continue
-
-        # Skip the link if it has more than one intersection with the boundary
-        isect_list = common.as_point_list(isect)
-        if len(isect_list) != 1:
-            continue
-
-        # If the distance to the mesh 2d exterior intersection is smaller than
-        # the compared distance, keep it.
-        dist = np.hypot(*(face2d - isect_list[0].coords[:][0]))
-        if dist < comp_dist:
-            keep.append(i)
+    # Keep the links with a single intersection with the boundary, of which the distance
+    # to the mesh 2d exterior intersection is smaller than the compared distance
+    keep = np.concatenate(
+        [
+            np.arange(npresent),
+            np.nonzero((count == 1) & (isect_dist < distance * dist_factor))[0]
+            + npresent,
+        ]
+    )
 
     # Select the remaining links
     _filter_links_on_idx(network, keep)
@@ -684,22 +791,13 @@ def links1d2d_remove_within(
         [network._mesh2d.mesh2d_face_x, network._mesh2d.mesh2d_face_y], axis=1
     )[network._link1d2d.link1d2d[:, 1]]
 
-    # Create GeometryList MultiPoint object
-    mpgl_faces2d = GeometryList(*faces2d.T.copy())
-    mpgl_nodes1d = GeometryList(*nodes1d.T.copy())
+    # Check which links intersect the provided area, for all sub-polygons at once
+    # with a spatial index of the polygons
+    tree = STRtree(common.as_polygon_list(within))
     idx = np.zeros(len(network._link1d2d.link1d2d), dtype=bool)
-
-    # Check which links intersect the provided area
-    for polygon in common.as_polygon_list(within):
-        subarea = GeometryList.from_geometry(polygon)
-        idx |= (
-            network.meshkernel.polygon_get_included_points(subarea, mpgl_faces2d).values
-            == 1
-        )
-        idx |= (
-            network.meshkernel.polygon_get_included_points(subarea, mpgl_nodes1d).values
-            == 1
-        )
+    for points in [faces2d, nodes1d]:
+        ipoint, _ = tree.query(shapely.points(points), predicate="intersects")
+        idx[ipoint] = True
 
     # Remove these links
     keep = ~idx
@@ -732,19 +830,133 @@ def links1d2d_remove_1d_endpoints(network: Network) -> None:
     edgeid, counts = np.unique(edge_nodes, return_counts=True)
     to_remove = edgeid[counts == 1]
 
-    keep = np.ones(len(network._link1d2d.link1d2d), dtype=bool)
-    for i in to_remove:
-        network_node = (
-            network._mesh1d.network1d_node_x[i],
-            network._mesh1d.network1d_node_y[i],
-        )
-        if np.isin(network_node, nodes1d)[0]:
-            index = np.argwhere(np.isin(nodes1d, network_node)).ravel()[0]
-            keep[index] = False
+    # Remove the links of which the 1d node coincides with one of the end points
+    endpoints = (
+        network._mesh1d.network1d_node_x[to_remove]
+        + 1j * network._mesh1d.network1d_node_y[to_remove]
+    )
+    keep = ~np.isin(nodes1d[:, 0] + 1j * nodes1d[:, 1], endpoints)
 
     _filter_links_on_idx(network, keep)
     
 
+def _default_search_radius(xy: np.ndarray) -> float:
+    """Search radius of 10 times the average point spacing"""
+    spacing = np.sqrt(np.ptp(xy[:, 0]) * np.ptp(xy[:, 1]) / len(xy))
+    return 10.0 * spacing if spacing > 0 else 1.0
+
+
+def _missing_tiles(xy: np.ndarray, isnan: np.ndarray, tilesize: float):
+    """Group the missing points in square tiles. For each tile with missing points,
+    yields the missing points and the valid points in the tile and its 8 neighbours,
+    so all valid points within tilesize from the missing points are included.
+
+    Args:
+        xy (np.ndarray): Coordinates of the points
+        isnan (np.ndarray): Mask of the missing points
+        tilesize (float): Size of the tiles
+
+    Yields:
+        tuple: Indices of the missing points and of the surrounding valid points
+    """
+    # Tile index per point, shifted by one so the neighbours have a positive key
+    ij = np.floor((xy - xy.min(axis=0)) / tilesize).astype(np.int64) + 1
+    nj = ij[:, 1].max() + 2
+    keys = ij[:, 0] * nj + ij[:, 1]
+
+    valid = np.nonzero(~isnan)[0]
+    valid = valid[np.argsort(keys[valid], kind="stable")]
+    valid_keys = keys[valid]
+
+    missing = np.nonzero(isnan)[0]
+    missing = missing[np.argsort(keys[missing], kind="stable")]
+    tile_keys, starts = np.unique(keys[missing], return_index=True)
+
+    neighbours = (np.arange(-1, 2)[:, None] * nj + np.arange(-1, 2)[None, :]).ravel()
+    for key, points in zip(tile_keys, np.split(missing, starts[1:])):
+        lo = np.searchsorted(valid_keys, key + neighbours, side="left")
+        hi = np.searchsorted(valid_keys, key + neighbours, side="right")
+        yield points, np.concatenate([valid[a:b] for a, b in zip(lo, hi)])
+
+
+def _fill_nearest(
+    xy: np.ndarray, zvalues: np.ndarray, isnan: np.ndarray, search_radius: float = None
+) -> np.ndarray:
+    """Get the nearest valid value for the missing points. The KDTree only contains the
+    valid points around the missing points and is queried with all threads. For points
+    without a valid value within the search radius, the radius is doubled until one is
+    found.
+
+    Returns:
+        np.ndarray: Values for the missing points
+    """
+    if search_radius is None:
+        search_radius = _default_search_radius(xy)
+
+    missing = np.nonzero(isnan)[0]
+    valid = np.nonzero(~isnan)[0]
+    filled = np.full(len(missing), np.nan)
+    if len(valid) == 0:
+        return filled
+
+    todo = np.arange(len(missing))
+    while len(todo) > 0:
+        # Valid points within the search radius of the missing points without value.
+        # The valid points come first in points, so their position is their index in valid.
+        points = np.concatenate([valid, missing[todo]])
+        tiles = _missing_tiles(xy[points], np.arange(len(points)) >= len(valid), search_radius)
+        local = valid[np.unique(np.concatenate([sel for _, sel in tiles])).astype(int)]
+
+        if len(local) > 0:
+            distance, idx = KDTree(xy[local]).query(
+                xy[missing[todo]], distance_upper_bound=search_radius, workers=-1
+            )
+            found = np.isfinite(distance)
+            filled[todo[found]] = zvalues[local[idx[found]]]
+            todo = todo[~found]
+
+        if len(todo) > 0:
+            logger.info(
+                f"{len(todo)} points have no valid value within {search_radius:.1f}, doubling the search radius."
+            )
+            search_radius *= 2
+
+    return filled
+
+
+def _fill_interpolate(
+    xy: np.ndarray,
+    zvalues: np.ndarray,
+    isnan: np.ndarray,
+    search_radius: float = None,
+    fill_value: float = np.nan,
+) -> np.ndarray:
+    """Interpolate the missing points linearly, per tile from the valid points around
+    it. Points that can not be interpolated get the fill_value.
+
+    Returns:
+        np.ndarray: Values for the missing points
+    """
+    if search_radius is None:
+        search_radius = _default_search_radius(xy)
+
+    filled = np.full(len(xy), np.nan)
+    for points, valid in _missing_tiles(xy, isnan, search_radius):
+        if len(valid) < 3:
+            continue
+        try:
+            interp = LinearNDInterpolator(xy[valid], zvalues[valid], fill_value=np.nan)
+        except QhullError:
+            # The valid points are for example collinear
+            continue
+        filled[points] = interp(xy[points])
+
+    filled = filled[isnan]
+    filled[np.isnan(filled)] = fill_value
+    return filled
+
+
+@profiled(items=_count_mesh2d)
 def mesh2d_altitude_from_raster(
     network,
     rasterpath,
@@ -752,6 +964,8 @@ def mesh2d_altitude_from_raster(
     stat="mean",
     fill_option: FillOption = "fill_value",
     fill_value=None,
+    cache_dir=None,
+    search_radius=None,
 ):
     """
     Method to determine level of nodes
@@ -762,6 +976,17 @@ def mesh2d_altitude_from_raster(
 
     Note that the raster is not clipped. Any values outside the bounds are
     also taken into account.
+
+    If a cache_dir is given, the raster with the cell index per pixel is stored
+    in this directory, and reused by later calls for the same mesh and raster
+    grid (see rasterstats.CellLabelCache).
+
+    Missing values are filled locally: only the valid values within the
+    search_radius around the missing values are used for the nearest or
+    interpolation fill. By default, the search radius is 10 times the average
+    point spacing. With the nearest fill, values without a valid value within
+    the radius are filled from the nearest valid value anywhere in the mesh.
+    With interpolation, these get the fill_value.
     """
 
     if isinstance(fill_option, str):
@@ -798,7 +1023,9 @@ def mesh2d_altitude_from_raster(
         facedata.index = np.arange(len(xy), dtype=np.uint32) + 1
         facedata["crds"] = [cell for cell in cells]
 
-        df = rasterstats.raster_stats_fine_cells(rasterpath, facedata, stats=[stat])
+        df = rasterstats.raster_stats_fine_cells(
+            rasterpath, facedata, stats=[stat], cache_dir=cache_dir
+        )
         # Get z values
         zvalues = df[stat].values
 
@@ -809,9 +1036,11 @@ def mesh2d_altitude_from_raster(
 
         facedata = spatial.get_voronoi_around_nodes(xy, facedata)
         # Get raster statistics
-        df = rasterstats.raster_stats_fine_cells(rasterpath, facedata, stats=[stat])
-        # Get z values
-        zvalues = df[stat].values
+        df = rasterstats.raster_stats_fine_cells(
+            rasterpath, facedata, stats=[stat], cache_dir=cache_dir
+        )
+        # Get z values. Nodes without a voronoi polygon are not in df and get NaN
+        zvalues = df[stat].reindex(np.arange(len(xy)) + 1).values
 
     isnan = np.isnan(zvalues)
     if isnan.any():
@@ -829,23 +1058,18 @@ def mesh2d_altitude_from_raster(
             zvalues[isnan] = fill_value
 
         elif fill_option == FillOption.NEAREST:
-            # By looking for the nearest value in the grid
-            # Create a KDTree of the known points
-            tree = KDTree(data=xy[~isnan])
-            idx = tree.query(x=xy[isnan])[1]
-            zvalues[isnan] = zvalues[~isnan][idx]
+            # By looking for the nearest value in the grid, around the missing values
+            zvalues[isnan] = _fill_nearest(xy, zvalues, isnan, search_radius)
 
         elif fill_option == FillOption.INTERPOLATE:
             if fill_value is None:
                 raise ValueError(
                     "Provide a fill_value (keyword argument) to fill values that cannot be interpolated."
                 )
-            # By interpolating
-            isnan = np.isnan(zvalues)
-            interp = LinearNDInterpolator(
-                xy[~isnan], zvalues[~isnan], fill_value=fill_value
+            # By interpolating locally, per tile with missing values
+            zvalues[isnan] = _fill_interpolate(
+                xy, zvalues, isnan, search_radius, fill_value
             )
-            zvalues[isnan] = interp(xy[isnan])
 
     # Set values to mesh geometry
     setattr(network._mesh2d, f"mesh2d_{where.value}_z", zvalues)
@@ -1,4 +1,6 @@
+import hashlib
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product
 
 import geopandas as gpd
@@ -6,8 +8,11 @@ import numpy as np
 import pandas as pd
 import PIL.Image
 import PIL.ImageDraw
+import netCDF4
 import rasterio
+import shapely
 
+from rasterio import windows
 from rasterio.windows import Window
 from pathlib import Path
 from typing import Union
@@ -192,27 +197,72 @@ def raster_in_parts(
 
 
 def rasterize_cells(facedata, prt):
-    # Initialize mask
-    # Create mask
-    maskIm = PIL.Image.new("I", (prt.shape[1], prt.shape[0]), 0)
-    todraw = PIL.ImageDraw.Draw(maskIm)
+    """Rasterize the cells to an array with the cell index (the facedata index) for
+    each pixel of the part, 0 for pixels without a cell. Later cells overwrite earlier
+    ones on shared edges.
+
+    Each cell is drawn in its own frame, positioned on the raster grid. So a cell gets
+    the same pixels in every part or tile it is drawn in.
+    """
+    cellidx = np.zeros(prt.shape, dtype=np.int32)
 
-    cellsize = abs(prt.f.transform.a)
+    transform = prt.f.transform
+    cellsize = abs(transform.a)
 
     for row in facedata.itertuples():
-        # Create array from coordinate sequence
-        path = row.crds.copy()
-        # Convert to (0,0) and step size 1
-        path[:, 0] -= prt.lowerleft[0] - 0.5 * cellsize
-        path[:, 1] -= prt.lowerleft[1] + 0.5 * cellsize
-        path /= cellsize
-        # Convert from array to tuple list
-        path = list(zip(*zip(*path)))
+        # Create array from coordinate sequence, in pixels from the raster origin
+        path = np.array(row.crds, dtype=np.float64)
+        cols = (path[:, 0] - transform.c) / cellsize
+        rows = (transform.f - path[:, 1]) / cellsize
+
+        # Frame of the cell, with a margin of one pixel. The y-axis of the frame
+        # points up, the image is flipped afterwards.
+        col0 = int(np.floor(cols.min())) - 1
+        row0 = int(np.floor(rows.min())) - 1
+        row1 = int(np.ceil(rows.max())) + 1
+        width = int(np.ceil(cols.max())) + 2 - col0
+        path = list(zip(cols - col0, row1 - rows))
 
         # Create mask
-        todraw.polygon(path, outline=row.Index, fill=row.Index)
+        maskIm = PIL.Image.new("L", (width, row1 - row0), 0)
+        PIL.ImageDraw.Draw(maskIm).polygon(path, outline=1, fill=1)
+        mask = np.array(maskIm, dtype=bool)[::-1]
+
+        # Add the part of the mask within the part
+        top, left = row1 - mask.shape[0] - prt.ymin, col0 - prt.xmin
+        rsl = slice(max(top, 0), min(top + mask.shape[0], prt.shape[0]))
+        csl = slice(max(left, 0), min(left + mask.shape[1], prt.shape[1]))
+        if rsl.start >= rsl.stop or csl.start >= csl.stop:
+            continue
+        mask = mask[rsl.start - top : rsl.stop - top, csl.start - left : csl.stop - left]
+        cellidx[rsl, csl][mask] = row.Index
+
+    return cellidx
+
 
-    return np.array(maskIm, dtype=np.int32)[::-1]
+def part_cell_labels(facedata, prt, tree, label_cache=None):
+    """Cell index raster of a part, with only the cells that have their center in
+    the part (prt.idx). All cells that overlap the part are rasterized, like the
+    tiles of CellLabelCache, so pixels on a shared cell edge get the same cell
+    whether the labels are rasterized or read from the cache.
+
+    Args:
+        facedata (gpd.GeoDataFrame): Cells with the geometry and crds columns
+        prt (RasterPart): Part of the raster, with the cells in idx
+        tree (shapely.STRtree): Tree of the cell geometries
+        label_cache (CellLabelCache, optional): Cache to read the labels from. Defaults to None.
+
+    Returns:
+        np.ndarray: Cell indices, 0 for pixels without cell
+    """
+    if label_cache is None:
+        bounds = windows.bounds(prt.window, prt.f.transform)
+        sel = np.sort(tree.query(shapely.box(*bounds)))
+        cellidx = rasterize_cells(facedata.iloc[sel], prt)
+    else:
+        cellidx = label_cache.read(prt.window)
+    cellidx[~np.isin(cellidx, facedata.index.values[prt.idx])] = 0
+    return cellidx
 
 
 def check_geodateframe_rasterstats(facedata):
@@ -233,7 +283,9 @@ def check_geodateframe_rasterstats(facedata):
         facedata["crds"] = [row.coords[:] for row in facedata.geometry]
 
 
-def raster_stats_fine_cells(rasterpath: Union[str, Path], facedata, stats=["mean"]):
+def raster_stats_fine_cells(
+    rasterpath: Union[str, Path], facedata, stats=["mean"], cache_dir=None
+):
     """
     Calculate statistic from a raster, where the raster resoltion is (much)
     smaller than the cell size.
@@ -246,6 +298,9 @@ def raster_stats_fine_cells(rasterpath: Union[str, Path], facedata, stats=["mean
         Dataframe with polygons in which the raster statistics are derived.
     stats : list
         List of statistics to retrieve. Should be numpy functions that require one argument
+    cache_dir : str
+        Directory with cell index rasters (see CellLabelCache). If given, the
+        cells are not rasterized but read from the cell index raster.
     """
 
     # Create empty array for stats
@@ -253,6 +308,8 @@ def raster_stats_fine_cells(rasterpath: Union[str, Path], facedata, stats=["mean
 
     # Check geometries
     check_geodateframe_rasterstats(facedata)
+    label_cache = None if cache_dir is None else CellLabelCache(cache_dir, rasterpath, facedata)
+    tree = shapely.STRtree(facedata.geometry.values)
 
     # Open raster file
     with rasterio.open(rasterpath, "r") as f:
@@ -266,8 +323,9 @@ def raster_stats_fine_cells(rasterpath: Union[str, Path], facedata, stats=["mean
             if not valid.any():
                 continue
 
-            # Rasterize the cells in the part
-            cellidx_sel = rasterize_cells(facedata.loc[prt.idx], prt)
+            # Rasterize the cells in the part, or read them from the cache. Only
+            # the cells with their center in the part are used.
+            cellidx_sel = part_cell_labels(facedata, prt, tree, label_cache)
             assert cellidx_sel.shape == valid.shape
             cellidx_sel[~valid] = 0
             valid = cellidx_sel != 0
@@ -296,11 +354,396 @@ def raster_stats_fine_cells(rasterpath: Union[str, Path], facedata, stats=["mean
     return df
 
 
-def waterdepth_ahn(dempath, facedata, outpath, column):
+class HypsometricTables:
+    """Volume and wet area as function of the water level for each cell, stored as a
+    ragged array. The table of the i-th cell is in the flat arrays from offsets[i] to
+    offsets[i + 1].
+    """
+
+    def __init__(self, index, offsets, level, area, volume):
+        self.index = np.asarray(index)
+        self.offsets = np.asarray(offsets)
+        self.level = np.asarray(level)
+        self.area = np.asarray(area)
+        self.volume = np.asarray(volume)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, cell) -> pd.DataFrame:
+        """Get the table for a cell (label from the index of facedata)"""
+        i = np.searchsorted(self.index, cell)
+        if i == len(self.index) or self.index[i] != cell:
+            raise KeyError(cell)
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        return pd.DataFrame(
+            {"level": self.level[rows], "area": self.area[rows], "volume": self.volume[rows]}
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """All tables in one DataFrame, with a cell column"""
+        return pd.DataFrame(
+            {
+                "cell": np.repeat(self.index, np.diff(self.offsets)),
+                "level": self.level,
+                "area": self.area,
+                "volume": self.volume,
+            }
+        )
+
+
+def _hypsometry_part(cellidx, arr, levels, pixel_area):
+    """Calculate the hypsometric tables for the cells in a part, with grouped operations
+    on the pixels sorted per cell. Returns the cells, the number of levels per cell and
+    the flat level, area and volume arrays."""
+    sel = cellidx != 0
+    cells, inv = np.unique(cellidx[sel], return_inverse=True)
+    z = arr[sel].astype(np.float64)
+    ncells = len(cells)
+
+    # Lowest and highest pixel per cell
+    order = np.lexsort((z, inv))
+    inv, z = inv[order], z[order]
+    starts = np.searchsorted(inv, np.arange(ncells))
+    ends = np.append(starts[1:], len(inv))
+    zmin, zmax = z[starts], z[ends - 1]
+
+    # Assign each pixel to the lowest level it is below
+    if np.ndim(levels) == 0:
+        # A number of levels from the lowest to the highest pixel of each cell
+        nlevels = int(levels)
+        cell_levels = zmin[:, None] + (zmax - zmin)[:, None] * np.linspace(0, 1, nlevels)
+        dz = (zmax - zmin) / max(nlevels - 1, 1)
+        dz[dz == 0] = 1.0
+        bins = np.ceil((z - zmin[inv]) / dz[inv]).astype(int).clip(0, nlevels - 1)
+    else:
+        # The same levels for all cells
+        nlevels = len(levels)
+        cell_levels = np.broadcast_to(np.asarray(levels, dtype=np.float64), (ncells, nlevels))
+        bins = np.searchsorted(levels, z, side="left")
+
+    # Number of pixels and sum of the pixel levels below each level
+    nbins = nlevels + 1
+    counts = np.bincount(inv * nbins + bins, minlength=ncells * nbins).reshape((ncells, nbins))
+    sums = np.bincount(inv * nbins + bins, weights=z, minlength=ncells * nbins).reshape((ncells, nbins))
+    counts = counts.cumsum(axis=1)[:, :nlevels]
+    sums = sums.cumsum(axis=1)[:, :nlevels]
+
+    area = counts * pixel_area
+    volume = (counts * cell_levels - sums) * pixel_area
+
+    # Only keep the levels from the last dry level up to the first fully wet level
+    if np.ndim(levels) == 0:
+        keep = np.ones((ncells, nlevels), dtype=bool)
+    else:
+        k = np.arange(nlevels)
+        first = np.argmax(counts > 0, axis=1) - 1
+        full = counts == (ends - starts)[:, None]
+        last = np.where(full.any(axis=1), np.argmax(full, axis=1), nlevels - 1)
+        keep = (k >= first[:, None]) & (k <= last[:, None])
+
+    return cells, keep.sum(axis=1), cell_levels[keep], area[keep], volume[keep]
+
+
+def raster_hypsometry_fine_cells(
+    rasterpath: Union[str, Path], facedata, levels=10, cache_dir=None
+) -> HypsometricTables:
+    """
+    Calculate hypsometric tables (wet area and volume as function of the water
+    level) from a raster, for cells that are (much) larger than the raster
+    resolution. The raster is read in the same parts as raster_stats_fine_cells.
+
+    Parameters
+    ----------
+    rasterpath : str
+        Path to raster file
+    facedata : geopandas.GeoDataFrame
+        Dataframe with polygons for which the tables are derived.
+    levels : int or array-like
+        Number of levels, equally distributed between the lowest and highest
+        pixel of each cell, or an increasing array with levels for all cells.
+        For the latter, each table runs from the highest level below the
+        lowest pixel to the first level above the highest pixel.
+    cache_dir : str
+        Directory with cell index rasters (see CellLabelCache).
+
+    Returns
+    -------
+    HypsometricTables
+        Ragged array with the tables of the cells with raster data, sorted
+        by cell label (the facedata index).
+    """
+    check_geodateframe_rasterstats(facedata)
+    label_cache = None if cache_dir is None else CellLabelCache(cache_dir, rasterpath, facedata)
+    tree = shapely.STRtree(facedata.geometry.values)
+    if np.ndim(levels) > 0:
+        levels = np.asarray(levels, dtype=np.float64)
+        if (np.diff(levels) <= 0).any():
+            raise ValueError("The levels should be strictly increasing.")
+
+    chunks = []
+    with rasterio.open(rasterpath, "r") as f:
+        pixel_area = abs(f.transform.a * f.transform.e)
+        for prt in raster_in_parts(f, ncols=250, nrows=250, facedata=facedata):
+            arr = prt.read(1)
+            valid = arr != f.nodata
+            if not valid.any():
+                continue
+
+            # Only the cells with their center in the part are used
+            cellidx_sel = part_cell_labels(facedata, prt, tree, label_cache)
+            cellidx_sel[~valid] = 0
+            if cellidx_sel.any():
+                chunks.append(_hypsometry_part(cellidx_sel, arr, levels, pixel_area))
+
+    if not chunks:
+        return HypsometricTables([], [0], [], [], [])
+
+    # Combine the parts. A cell can occur in multiple parts, like in
+    # raster_stats_fine_cells the last one is used.
+    cells, nlevels, level, area, volume = (np.concatenate(arrs) for arrs in zip(*chunks))
+    starts = np.cumsum(nlevels) - nlevels
+    _, reverse_index = np.unique(cells[::-1], return_index=True)
+    entries = len(cells) - 1 - reverse_index
+
+    counts = nlevels[entries]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    rows = np.repeat(starts[entries] - offsets[:-1], counts) + np.arange(offsets[-1])
+
+    return HypsometricTables(cells[entries], offsets, level[rows], area[rows], volume[rows])
+
+
+def raster_in_tiles(f: rasterio.io.DatasetReader, tilesize: int) -> Window:
+    """Split a raster in non-overlapping windows of (at most) tilesize x tilesize
+    pixels, so each pixel is processed and written once.
+
+    Args:
+        f (rasterio.io.DatasetReader): Opened raster
+        tilesize (int): Width and height of the windows in pixels
+
+    Yields:
+        Window: Window of the tile
+    """
+    for row_off, col_off in product(
+        range(0, f.shape[0], tilesize), range(0, f.shape[1], tilesize)
+    ):
+        yield Window(
+            col_off=col_off,
+            row_off=row_off,
+            width=min(tilesize, f.shape[1] - col_off),
+            height=min(tilesize, f.shape[0] - row_off),
+        )
+
+
+def label_positions(cellidx: np.ndarray, labels: np.ndarray) -> tuple:
+    """Find the position of the labels in a cell index raster in an array of labels,
+    to gather cell values for each pixel at once.
+
+    Args:
+        cellidx (np.ndarray): Cell index raster, 0 where there is no cell
+        labels (np.ndarray): Cell labels (index of facedata)
+
+    Returns:
+        tuple: Array with the position of each pixel's cell in labels, and a mask that is
+            True for the pixels with a cell in labels.
+    """
+    order = np.argsort(labels)
+    pos = np.searchsorted(labels[order], cellidx).clip(max=len(labels) - 1)
+    found = (labels[order][pos] == cellidx) & (cellidx != 0)
+    return order[pos], found
+
+
+def _cells_per_tile(f: rasterio.io.DatasetReader, facedata: gpd.GeoDataFrame, tilesize: int):
+    """Get the tiles of the raster, with the positions of the cells that overlap each
+    tile. Tiles without cells are skipped."""
+    tree = shapely.STRtree(facedata.geometry.values)
+    for window in raster_in_tiles(f, tilesize):
+        sel = np.sort(tree.query(shapely.box(*windows.bounds(window, f.transform))))
+        if len(sel) > 0:
+            yield window, sel
+
+
+def _tile_part(f: rasterio.io.DatasetReader, window: Window) -> RasterPart:
+    return RasterPart(
+        f,
+        xmin=window.col_off,
+        ymin=window.row_off,
+        xmax=window.col_off + window.width,
+        ymax=window.row_off + window.height,
+    )
+
+
+class CellLabelCache:
+    """On-disk raster with the index of the mesh cell for each pixel, on the grid of
+    a raster. The file is memory-mapped when read and is stored under a key of the
+    mesh cells and the raster grid, so raster statistics and water depths for the
+    same mesh and raster grid reuse it instead of rasterizing the cells again.
+
+    Only the part of the raster covering the cells is stored. Pixels without a cell
+    have index 0.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        rasterpath: Union[str, Path],
+        facedata: gpd.GeoDataFrame,
+        tilesize: int = 1024,
+    ):
+        """
+        Args:
+            cache_dir (Union[str, Path]): Directory in which the cell index rasters are stored
+            rasterpath (Union[str, Path]): Raster of which the grid is used
+            facedata (gpd.GeoDataFrame): Cells with the geometry and crds columns
+            tilesize (int, optional): Tile size in pixels used to build the cache. Defaults to 1024.
+        """
+        check_geodateframe_rasterstats(facedata)
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        with rasterio.open(rasterpath, "r") as f:
+            self.key = self.get_key(f, facedata)
+            self.path = cache_dir / f"{self.key}.npy"
+            self.window = self._get_extent(f, facedata)
+            if not self.path.exists():
+                self._build(f, facedata, tilesize)
+
+    @staticmethod
+    def get_key(f: rasterio.io.DatasetReader, facedata: gpd.GeoDataFrame) -> str:
+        """Hash of the cells (labels and coordinates) and the raster grid"""
+        sha = hashlib.sha1()
+        sha.update(np.ascontiguousarray(facedata.index.values, dtype=np.int64).tobytes())
+        sha.update(np.array([len(crds) for crds in facedata["crds"]], dtype=np.int64).tobytes())
+        sha.update(np.concatenate(facedata["crds"].tolist()).astype(np.float64).tobytes())
+        sha.update(repr((tuple(f.transform), f.shape, str(f.crs))).encode())
+        return sha.hexdigest()
+
+    @staticmethod
+    def _get_extent(f: rasterio.io.DatasetReader, facedata: gpd.GeoDataFrame) -> Window:
+        """Window of the raster that covers the cells"""
+        xmin, ymin, xmax, ymax = facedata.geometry.total_bounds
+        rows, cols = zip(f.index(xmin, ymax), f.index(xmax, ymin))
+        row_off, col_off = max(min(rows), 0), max(min(cols), 0)
+        return Window(
+            col_off=col_off,
+            row_off=row_off,
+            width=max(min(max(cols) + 1, f.shape[1]) - col_off, 0),
+            height=max(min(max(rows) + 1, f.shape[0]) - row_off, 0),
+        )
+
+    def _build(self, f: rasterio.io.DatasetReader, facedata: gpd.GeoDataFrame, tilesize: int) -> None:
+        """Rasterize the cells per tile into the memory-mapped file"""
+        logger.info(f"Creating cell index raster {self.path.name}.")
+        tmppath = self.path.with_suffix(".tmp.npy")
+        labels = np.lib.format.open_memmap(
+            tmppath, mode="w+", dtype=np.int32, shape=(self.window.height, self.window.width)
+        )
+        for window, sel in _cells_per_tile(f, facedata, tilesize):
+            try:
+                window = windows.intersection(window, self.window)
+            except windows.WindowError:
+                continue
+            rows, cols = window.toslices()
+            labels[
+                rows.start - self.window.row_off : rows.stop - self.window.row_off,
+                cols.start - self.window.col_off : cols.stop - self.window.col_off,
+            ] = rasterize_cells(facedata.iloc[sel], _tile_part(f, window))
+        labels.flush()
+        del labels
+        tmppath.replace(self.path)
+
+    def read(self, window: Window) -> np.ndarray:
+        """Read the cell indices for a window of the raster
+
+        Args:
+            window (Window): Window in pixels of the raster
+
+        Returns:
+            np.ndarray: Cell indices, 0 for pixels without cell
+        """
+        cellidx = np.zeros((int(window.height), int(window.width)), dtype=np.int32)
+        try:
+            overlap = windows.intersection(window, self.window)
+        except windows.WindowError:
+            return cellidx
+
+        labels = np.load(self.path, mmap_mode="r")
+        rows, cols = overlap.toslices()
+        cellidx[
+            rows.start - window.row_off : rows.stop - window.row_off,
+            cols.start - window.col_off : cols.stop - window.col_off,
+        ] = labels[
+            rows.start - self.window.row_off : rows.stop - self.window.row_off,
+            cols.start - self.window.col_off : cols.stop - self.window.col_off,
+        ]
+        return cellidx
+
+
+def _tile_cell_positions(
+    f: rasterio.io.DatasetReader,
+    window: Window,
+    cells: gpd.GeoDataFrame,
+    label_cache: "CellLabelCache" = None,
+):
+    """Read the terrain level for a tile and rasterize the cells in it, or read them
+    from the cell index cache. Returns None if the tile has no terrain level data,
+    otherwise the terrain level, the position of each pixel's cell in cells and the
+    mask of pixels with a cell."""
+    prt = _tile_part(f, window)
+    arr = prt.read(1)
+    valid = arr != f.nodata
+    if not valid.any():
+        return None
+
+    if label_cache is None:
+        cellidx = rasterize_cells(cells, prt)
+    else:
+        cellidx = label_cache.read(window)
+    cellidx[~valid] = 0
+    pos, found = label_positions(cellidx, cells.index.values)
+    return arr, pos, found
+
+
+def _waterdepth_tile(dempath, window, cells, levels, label_cache=None):
+    """Calculate the water depth for one tile. Returns None if the tile has no
+    terrain level data."""
+    with rasterio.open(dempath, "r") as f:
+        positions = _tile_cell_positions(f, window, cells, label_cache)
+        if positions is None:
+            return None
+        arr, pos, found = positions
+
+        # Gather the water levels for the pixels
+        wdep_subgr = np.full(arr.shape, f.nodata, dtype=f.dtypes[0])
+        wdep_subgr[found] = np.maximum(levels[pos[found]] - arr[found], 0)
+    return wdep_subgr
+
+
+def tiled_profile(f: rasterio.io.DatasetReader, blocksize: int = 256, **kwargs) -> dict:
+    """Profile for a tiled, compressed GeoTIFF on the grid of raster f"""
+    out_meta = f.meta.copy()
+    out_meta.update(
+        driver="GTiff",
+        tiled=True,
+        blockxsize=blocksize,
+        blockysize=blocksize,
+        compress="deflate",
+        BIGTIFF="IF_SAFER",
+    )
+    out_meta.update(kwargs)
+    return out_meta
+
+
+def waterdepth_ahn(
+    dempath, facedata, outpath, column, tilesize=1024, max_workers=None, cache_dir=None
+):
     """
     Function that combines a dem and water levels to a water
     depth raster. No sub grid correction is done.
 
+    The raster is processed in tiles, that are written once to a tiled and
+    compressed GeoTIFF. Per tile, only the overlapping cells are rasterized.
+
     Parameters
     ----------
     dempath : str
@@ -312,54 +755,239 @@ def waterdepth_ahn(dempath, facedata, outpath, column):
         Path to output raster file
     column : str
         Name of the column with the water level data
+    tilesize : int
+        Width and height of the processed tiles in pixels, preferably a
+        multiple of 256 (the block size of the output)
+    max_workers : int
+        Number of worker processes to calculate the tiles. On Windows, call
+        this from within an 'if __name__ == "__main__":' block. Defaults to
+        None (sequential).
+    cache_dir : str
+        Directory with cell index rasters (see CellLabelCache). If given, the
+        cell index raster is read from or stored in this directory. Defaults
+        to None (rasterize per tile).
     """
+    check_geodateframe_rasterstats(facedata)
+    levels = facedata[column].values.astype(float)
+    label_cache = None if cache_dir is None else CellLabelCache(cache_dir, dempath, facedata)
 
-    # Open raster file
     with rasterio.open(dempath, "r") as f:
-        first = True
-        out_meta = f.meta.copy()
+        out_meta = tiled_profile(f)
+        tiles = list(_cells_per_tile(f, facedata, tilesize))
 
-        # Split file in parts based on shape
-        parts = raster_in_parts(f, ncols=250, nrows=250, facedata=facedata)
+    tile_windows = [window for window, _ in tiles]
+    args = (
+        [dempath] * len(tiles),
+        tile_windows,
+        (facedata.iloc[sel][["crds"]] for _, sel in tiles),
+        (levels[sel] for _, sel in tiles),
+        [label_cache] * len(tiles),
+    )
 
-        for prt in parts:
-            # Get values from array
-            arr = prt.read(1)
-            valid = arr != f.nodata
-            if not valid.any():
-                continue
+    with rasterio.open(outpath, "w", **out_meta) as dst:
+        if max_workers is not None and max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                _write_tiles(dst, tile_windows, executor.map(_waterdepth_tile, *args))
+        else:
+            _write_tiles(dst, tile_windows, map(_waterdepth_tile, *args))
 
-            cellidx_sel = rasterize_cells(facedata.loc[prt.idx], prt)
-            cellidx_sel[~valid] = 0
-            valid = cellidx_sel != 0
 
-            # Create array to assign water levels
-            wlev_subgr = np.zeros(cellidx_sel.shape, dtype=out_meta["dtype"])
+def _write_tiles(dst, tile_windows, results):
+    """Write the calculated tiles to the output raster, skipping empty tiles"""
+    for window, arr in zip(tile_windows, results):
+        if arr is not None:
+            dst.write(arr, 1, window=window)
 
-            for cell_idx in np.unique(cellidx_sel):
-                if cell_idx == 0:
-                    continue
-                # Mask
-                cellmask = cellidx_sel == cell_idx
-                if not cellmask.any():
-                    continue
-                # Add values for cell to raster
-                wlev_subgr[cellmask] = facedata.at[cell_idx, column]
-
-            # Write to output raster
-            with rasterio.open(outpath, "w" if first else "r+", **out_meta) as dst:
-                # Determine water depth
-                if not first:
-                    wdep_subgr = dst.read(1, window=prt.window)
-                else:
-                    wdep_subgr = np.ones_like(wlev_subgr) * f.nodata
-                    first = False
-                wdep_subgr[valid] = np.maximum(wlev_subgr - arr, 0).astype(
-                    out_meta["dtype"]
-                )[valid]
-                dst.write(wdep_subgr[None, :, :], window=prt.window)
-
-    compress(outpath)
+
+def read_map_waterlevels(mappath: Union[str, Path], timesteps=None) -> tuple:
+    """Read the 2d cells and water levels from a D-Flow FM map file.
+
+    Args:
+        mappath (Union[str, Path]): Path to the map file (_map.nc)
+        timesteps (optional): Index or slice of the output timesteps to read.
+            Defaults to None (all timesteps).
+
+    Returns:
+        tuple: GeoDataFrame with the cells (index starting at 1), an array with the
+            water levels with shape (ncells, ntimes) and the times of the timesteps.
+    """
+    tsel = slice(None) if timesteps is None else timesteps
+    with netCDF4.Dataset(mappath, "r") as ds:
+        nodes = np.c_[ds["mesh2d_node_x"][:].data, ds["mesh2d_node_y"][:].data]
+        face_nodes = ds["mesh2d_face_nodes"][:]
+        start_index = getattr(ds["mesh2d_face_nodes"], "start_index", 0)
+        facex = ds["mesh2d_face_x"][:].data
+        facey = ds["mesh2d_face_y"][:].data
+        times = np.atleast_1d(ds["time"][tsel].data)
+        levels = np.ma.filled(ds["mesh2d_s1"][tsel, :].astype(float), np.nan)
+
+    # Split the face nodes to coordinates per cell, without the fill values
+    counts = (~np.ma.getmaskarray(face_nodes)).sum(axis=1)
+    crds = nodes[np.ma.compressed(face_nodes).astype(int) - start_index]
+    geometry = shapely.polygons(
+        shapely.linearrings(crds, indices=np.repeat(np.arange(len(counts)), counts))
+    )
+    facedata = gpd.GeoDataFrame(
+        {
+            "crds": np.split(crds, np.cumsum(counts)[:-1]),
+            "facex": facex,
+            "facey": facey,
+        },
+        geometry=geometry,
+        index=np.arange(len(counts)) + 1,
+    )
+
+    return facedata, levels.reshape((len(times), -1)).T, times
+
+
+def _waterdepth_series_tile(dempath, window, cells, levels, times, threshold, label_cache=None):
+    """Calculate the water depth for all timesteps for one tile, with the maximum
+    depth and the time of inundation. Returns None if the tile has no terrain level
+    data."""
+    with rasterio.open(dempath, "r") as f:
+        positions = _tile_cell_positions(f, window, cells, label_cache)
+        if positions is None:
+            return None
+        arr, pos, found = positions
+
+        # Gather the water levels for all timesteps at once
+        depth = np.maximum(levels[pos[found], :] - arr[found][:, None], 0)
+
+        wdep_subgr = np.full((levels.shape[1],) + arr.shape, f.nodata, dtype=f.dtypes[0])
+        wdep_subgr[:, found] = depth.T
+        wdep_max = np.full(arr.shape, f.nodata, dtype=f.dtypes[0])
+        wdep_max[found] = np.nanmax(depth, axis=1)
+
+        # First timestep at which the depth exceeds the threshold
+        inundated = depth > threshold
+        first = np.argmax(inundated, axis=1)
+        toi = np.full(arr.shape, f.nodata, dtype="float64")
+        toi[found] = np.where(inundated.any(axis=1), times[first], f.nodata)
+
+    return wdep_subgr, wdep_max, toi
+
+
+def waterdepth_timeseries(
+    dempath,
+    facedata,
+    levels,
+    outdir,
+    times=None,
+    threshold=0.0,
+    tilesize=512,
+    max_workers=None,
+    cache_dir=None,
+):
+    """
+    Function that combines a dem and water levels for multiple timesteps to
+    water depth rasters. No sub grid correction is done.
+
+    The cells are rasterized once per tile, after which the water levels of all
+    timesteps are gathered for the pixels. Three tiled and compressed GeoTIFFs
+    are written to the output directory:
+    - waterdepth.tif: the water depth with one band per timestep
+    - waterdepth_max.tif: the maximum water depth over all timesteps
+    - time_of_inundation.tif: the first time the depth exceeds the threshold
+
+    Parameters
+    ----------
+    dempath : str
+        Path to raster file with terrain level
+    facedata : gpd.GeoDataFrame
+        GeoDataFrame with at least the cell geometry
+    levels : np.ndarray
+        Water levels with shape (number of cells, number of timesteps), in
+        the order of facedata
+    outdir : str
+        Directory to write the rasters to
+    times : np.ndarray
+        Times of the timesteps, used for the band descriptions and time of
+        inundation. Defaults to None (the timestep index).
+    threshold : float
+        Depth above which a pixel is inundated. Defaults to 0.0.
+    tilesize : int
+        Width and height of the processed tiles in pixels. A tile holds the
+        depths for all timesteps, so lower it for many timesteps.
+    max_workers : int
+        Number of worker processes to calculate the tiles. Defaults to None
+        (sequential).
+    cache_dir : str
+        Directory with cell index rasters (see CellLabelCache). Defaults to
+        None (rasterize per tile).
+    """
+    check_geodateframe_rasterstats(facedata)
+    levels = np.asarray(levels, dtype=float).reshape((len(facedata), -1))
+    label_cache = None if cache_dir is None else CellLabelCache(cache_dir, dempath, facedata)
+    times = np.arange(levels.shape[1]) if times is None else np.asarray(times)
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    with rasterio.open(dempath, "r") as f:
+        out_meta = tiled_profile(f)
+        tiles = list(_cells_per_tile(f, facedata, tilesize))
+
+    tile_windows = [window for window, _ in tiles]
+    args = (
+        [dempath] * len(tiles),
+        tile_windows,
+        (facedata.iloc[sel][["crds"]] for _, sel in tiles),
+        (levels[sel] for _, sel in tiles),
+        [times] * len(tiles),
+        [threshold] * len(tiles),
+        [label_cache] * len(tiles),
+    )
+
+    with rasterio.open(
+        outdir / "waterdepth.tif", "w", **dict(out_meta, count=len(times))
+    ) as dst, rasterio.open(
+        outdir / "waterdepth_max.tif", "w", **out_meta
+    ) as dst_max, rasterio.open(
+        outdir / "time_of_inundation.tif", "w", **dict(out_meta, dtype="float64")
+    ) as dst_toi:
+        for band, time in enumerate(times, start=1):
+            dst.set_band_description(band, str(time))
+
+        if max_workers is not None and max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(_waterdepth_series_tile, *args)
+                _write_series_tiles(dst, dst_max, dst_toi, tile_windows, results)
+        else:
+            results = map(_waterdepth_series_tile, *args)
+            _write_series_tiles(dst, dst_max, dst_toi, tile_windows, results)
+
+
+def _write_series_tiles(dst, dst_max, dst_toi, tile_windows, results):
+    """Write the calculated time series tiles to the output rasters"""
+    for window, result in zip(tile_windows, results):
+        if result is None:
+            continue
+        wdep_subgr, wdep_max, toi = result
+        dst.write(wdep_subgr, window=window)
+        dst_max.write(wdep_max, 1, window=window)
+        dst_toi.write(toi, 1, window=window)
+
+
+def waterdepth_from_map(dempath, mappath, outdir, timesteps=None, **kwargs):
+    """
+    Create water depth rasters for the output timesteps of a D-Flow FM map
+    file. See waterdepth_timeseries for the rasters that are written.
+
+    Parameters
+    ----------
+    dempath : str
+        Path to raster file with terrain level
+    mappath : str
+        Path to the D-Flow FM map file (_map.nc)
+    outdir : str
+        Directory to write the rasters to
+    timesteps : int, slice or list
+        Output timesteps to process. Defaults to None (all timesteps).
+    **kwargs
+        Passed to waterdepth_timeseries (threshold, tilesize, max_workers,
+        cache_dir)
+    """
+    facedata, levels, times = read_map_waterlevels(mappath, timesteps=timesteps)
+    waterdepth_timeseries(dempath, facedata, levels, outdir, times=times, **kwargs)
 
 
 def compress(path):
@@ -1,3 +1,4 @@
+import itertools
 import logging
 from typing import List, Tuple
 
@@ -5,16 +6,15 @@ import geopandas as gpd
 import numpy as np
 from matplotlib import path
 from scipy.spatial import Voronoi
-from shapely import affinity
+import shapely
+from shapely import STRtree, affinity
 from shapely.geometry import (
     LineString,
-    MultiLineString,
     MultiPolygon,
     Point,
     Polygon,
     box,
 )
-from shapely.prepared import prep
 from hydrolib.dhydamo.geometry import common
 
 logger = logging.getLogger(__name__)
@@ -256,8 +256,37 @@ def points_in_polygon(points: np.ndarray, polygon: Polygon) -> np.ndarray:
 
     return mainindex
 
+def _mesh_boundary_segments(facedata: gpd.GeoDataFrame) -> np.ndarray:
+    """Get the segments of the mesh boundary, including the boundaries of holes. These
+    are the face edges that are part of a single face only.
+
+    Args:
+        facedata (gpd.GeoDataFrame): GeoDataFrame with face polygons
+
+    Returns:
+        np.ndarray: Boundary segments with shape (n, 2, 2)
+    """
+    crds, ring = shapely.get_coordinates(
+        shapely.get_exterior_ring(facedata.geometry.values), return_index=True
+    )
+    # Consecutive coordinates of the same (closed) ring form an edge
+    same = ring[1:] == ring[:-1]
+    edges = np.stack([crds[:-1][same], crds[1:][same]], axis=1)
+
+    # Sort the edge nodes, so edges shared by two faces are equal
+    (x1, y1), (x2, y2) = edges[:, 0].T, edges[:, 1].T
+    swap = (x1 > x2) | ((x1 == x2) & (y1 > y2))
+    edges[swap] = edges[swap, ::-1]
+    _, index, counts = np.unique(
+        edges.reshape((-1, 4)), axis=0, return_index=True, return_counts=True
+    )
+    return edges[index[counts == 1]]
+
+
 def get_voronoi_around_nodes(nodes: np.ndarray, facedata: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    """Creates voronoi polygons around face nodes.
+    """Creates voronoi polygons around face nodes. The polygons are created at once from
+    the voronoi regions. Only the polygons that cross the mesh boundary are clipped, with
+    the faces they intersect.
 
     Args:
         nodes (np.ndarray): xy coordinates of face nodes
@@ -271,40 +300,55 @@ def get_voronoi_around_nodes(nodes: np.ndarray, facedata: gpd.GeoDataFrame) -> g
     border = box(nodes[:, 0].min(), nodes[:, 1].min(), nodes[:, 0].max(), nodes[:, 1].max()).buffer(1000).exterior
     borderpts = [border.interpolate(dist).coords[0] for dist in np.linspace(0, border.length, max(20, int(border.length / 100)))]
     vor = Voronoi(points=nodes.tolist()+borderpts)
-    clippoly = facedata.unary_union
-    # Get lines
-    lines = []
-    for poly in common.as_polygon_list(clippoly):
-        lines.append(poly.exterior)
-        lines.extend([line for line in poly.interiors])
-    linesprep = prep(MultiLineString(lines))
-    clipprep = prep(clippoly)
-
-    # Collect polygons
-    data = []
-    for (pr, pt) in zip(vor.point_region, nodes):
-        region = vor.regions[pr]
-        if pr == -1:
-            break
-        while -1 in region:
-            region.remove(-1)
-        if len(region) < 3:
-            continue
-        crds = vor.vertices[region]
-        if clipprep.intersects(Point(pt)):
-            poly = Polygon(crds)
-            if linesprep.intersects(poly):
-                poly = poly.intersection(clippoly)
-                if isinstance(poly, MultiPolygon):
-                    poly = poly.buffer(0.001)
-                if isinstance(poly, MultiPolygon):
-                    logger.warning('Got multipolygon when clipping voronoi polygon. Only adding coordinates for largest of the polygons.')
-                    poly = poly[np.argmax([p.area for p in common.as_polygon_list(poly)])]
-                crds = np.vstack(poly.exterior.coords[:])
-            data.append({'geometry': poly, 'crds': crds})
-            
+
+    # Flatten the regions of the nodes to vertex indices, without the -1 (vertex at infinity)
+    regions = [vor.regions[pr] for pr in vor.point_region[: len(nodes)]]
+    counts = np.array([len(region) for region in regions])
+    vertices = np.fromiter(itertools.chain.from_iterable(regions), dtype=int, count=counts.sum())
+    region_index = np.repeat(np.arange(len(nodes)), counts)
+    valid = vertices != -1
+    vertices, region_index = vertices[valid], region_index[valid]
+    counts = np.bincount(region_index, minlength=len(nodes))
+
+    # Only keep nodes with a polygon, that lie within the mesh
+    tree = STRtree(facedata.geometry.values)
+    inode, _ = tree.query(shapely.points(nodes), predicate="intersects")
+    keep = np.zeros(len(nodes), dtype=bool)
+    keep[inode] = True
+    keep &= counts >= 3
+    selected = keep[region_index]
+    vertices, region_index = vertices[selected], region_index[selected]
+    kept = np.nonzero(keep)[0]
+
+    # Create all polygons at once
+    crds = vor.vertices[vertices]
+    polygons = shapely.polygons(
+        shapely.linearrings(crds, indices=np.searchsorted(kept, region_index))
+    )
+    crds = np.split(crds, np.cumsum(counts[kept])[:-1])
+
+    # Find the polygons that cross the mesh boundary
+    segments = _mesh_boundary_segments(facedata)
+    _, ipoly = STRtree(polygons).query(shapely.linestrings(segments), predicate="intersects")
+    ipoly = np.unique(ipoly)
+
+    # Clip these with the union of the faces they intersect
+    ipair, iface = tree.query(polygons[ipoly], predicate="intersects")
+    split = np.flatnonzero(np.diff(ipair)) + 1
+    local = [shapely.union_all(facedata.geometry.values[faces]) for faces in np.split(iface, split) if len(faces)]
+    ipoly = ipoly[np.unique(ipair)]
+    clipped = shapely.intersection(polygons[ipoly], local)
+    for i, poly in zip(ipoly, clipped):
+        if isinstance(poly, MultiPolygon):
+            poly = poly.buffer(0.001)
+        if isinstance(poly, MultiPolygon):
+            logger.warning('Got multipolygon when clipping voronoi polygon. Only adding coordinates for largest of the polygons.')
+            poly = poly.geoms[np.argmax([p.area for p in common.as_polygon_list(poly)])]
+        polygons[i] = poly
+        crds[i] = np.vstack(poly.exterior.coords[:])
+
     # Limit to model extend
-    facedata = gpd.GeoDataFrame(data)
-    facedata.index=np.arange(len(nodes), dtype=np.uint32) + 1
+    facedata = gpd.GeoDataFrame({'crds': crds}, geometry=polygons)
+    facedata.index = kept.astype(np.uint32) + 1
 
     return facedata
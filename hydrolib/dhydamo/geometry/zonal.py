@@ -0,0 +1,373 @@
+import hashlib
+import logging
+from typing import List, Union
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from affine import Affine
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def _as_geometry_array(zones) -> np.ndarray:
+    """Get the geometries of a (Geo)DataFrame, GeoSeries, list or single geometry as array"""
+    if isinstance(zones, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        return np.asarray(zones.geometry.values, dtype=object)
+    if isinstance(zones, shapely.Geometry):
+        return np.array([zones], dtype=object)
+    return np.asarray(list(zones), dtype=object)
+
+
+def geometry_key(*zones, **options) -> str:
+    """Hash of one or more sets of geometries and options"""
+    sha = hashlib.sha1()
+    for geometries in zones:
+        for wkb in shapely.to_wkb(_as_geometry_array(geometries)):
+            sha.update(wkb)
+        sha.update(b"|")
+    sha.update(repr(sorted(options.items())).encode())
+    return sha.hexdigest()
+
+
+def zone_key(zones, affine: Affine, shape: tuple, **options) -> str:
+    """Hash of the zone geometries, the raster grid and the options of a zone index"""
+    return geometry_key(zones, affine=tuple(affine), shape=tuple(shape), **options)
+
+
+def select_counts(found: np.ndarray, counts: np.ndarray, categories) -> np.ndarray:
+    """Columns of a category count matrix (zones x found categories) for the given
+    categories, with zeros for categories that were not found"""
+    categories = np.asarray(list(categories))
+    result = np.zeros((counts.shape[0], len(categories)))
+    if len(found) == 0:
+        return result
+    icat = np.minimum(np.searchsorted(found, categories), len(found) - 1)
+    present = found[icat] == categories
+    result[:, present] = counts[:, icat[present]]
+    return result
+
+
+def majority_of_counts(categories: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Most occurring category per zone from a category count matrix, NaN for zones
+    without pixels. For ties, the lowest category is taken."""
+    result = np.full(counts.shape[0], np.nan)
+    if len(categories) > 0:
+        has = counts.sum(axis=1) > 0
+        result[has] = categories[np.argmax(counts[has], axis=1)]
+    return result
+
+
+class ZoneIndex:
+    """Sparse zone x pixel matrix for a set of zones (for example catchments) on a
+    raster grid. The matrix contains the membership of the pixels, or the covered
+    fraction of each pixel. Once built, zonal statistics for any raster on the same
+    grid follow from sparse matrix products (count, sum, mean) or grouped reductions
+    of the zone pixels (min, max, median, majority and categorical counts), without
+    rasterizing the zones again.
+
+    The pixel selection equals that of rasterstats.zonal_stats: pixels with their
+    center in the zone, or all pixels touched by the zone if all_touched is True.
+
+    The statistics take a raster on the grid, or only the values of the zone pixels
+    as read from a file with read_pixels, so large rasters need not be decoded fully.
+    """
+
+    def __init__(
+        self,
+        zones,
+        affine: Affine,
+        shape: tuple,
+        all_touched: bool = False,
+        fractional: bool = False,
+        supersample: int = 10,
+    ):
+        """
+        Args:
+            zones: GeoDataFrame, GeoSeries, list of geometries or a single geometry
+            affine (Affine): Transform of the raster grid
+            shape (tuple): Shape (rows, columns) of the raster grid
+            all_touched (bool, optional): Include all pixels touched by a zone. Defaults to False.
+            fractional (bool, optional): Weigh the pixels with the fraction covered by the
+                zone, estimated by supersampling. Overrides all_touched. Defaults to False.
+            supersample (int, optional): Supersampling factor per pixel side for the
+                fractional coverage. Defaults to 10.
+        """
+        geometries = _as_geometry_array(zones)
+        self.affine = affine
+        self.shape = tuple(shape)
+        self.all_touched = all_touched
+        self.fractional = fractional
+
+        nrows, ncols = self.shape
+        izones, ipixels, weights = [], [], []
+        for izone, geometry in enumerate(geometries):
+            if geometry is None or geometry.is_empty:
+                continue
+            window = self._window(geometry.bounds)
+            if window is None:
+                continue
+            row_off, col_off, height, width = window
+            transform = affine * Affine.translation(col_off, row_off)
+
+            if fractional:
+                fine = geometry_mask(
+                    [geometry],
+                    out_shape=(height * supersample, width * supersample),
+                    transform=transform * Affine.scale(1 / supersample),
+                    invert=True,
+                )
+                cover = fine.reshape(height, supersample, width, supersample).mean(axis=(1, 3))
+            else:
+                cover = geometry_mask(
+                    [geometry],
+                    out_shape=(height, width),
+                    transform=transform,
+                    all_touched=all_touched,
+                    invert=True,
+                ).astype(np.float64)
+
+            rows, cols = np.nonzero(cover)
+            izones.append(np.full(len(rows), izone))
+            ipixels.append((rows + row_off) * ncols + cols + col_off)
+            weights.append(cover[rows, cols])
+
+        if izones:
+            izones, ipixels, weights = (np.concatenate(arrs) for arrs in (izones, ipixels, weights))
+        self.matrix = sparse.csr_matrix(
+            (weights, (izones, ipixels)), shape=(len(geometries), nrows * ncols)
+        )
+        self.matrix.sort_indices()
+
+        # Pixels within any zone, for products with only these pixels
+        self.pixels = np.unique(self.matrix.indices)
+        self._pixel_matrix = self.matrix[:, self.pixels]
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def _window(self, bounds: tuple) -> Union[tuple, None]:
+        """Pixel window (row_off, col_off, height, width) covering the bounds, clipped
+        to the raster grid. None if the bounds are outside the grid.
+
+        The window is the same as the one rasterstats rasterizes a geometry in. So with
+        all_touched, pixels outside the bounds that only touch the geometry on their
+        edge or corner are not included, as in rasterstats.zonal_stats.
+        """
+        xmin, ymin, xmax, ymax = bounds
+        cols, rows = ~self.affine * (np.array([xmin, xmax]), np.array([ymax, ymin]))
+        row0 = max(int(np.floor(rows.min())), 0)
+        row1 = min(int(np.ceil(rows.max())), self.shape[0])
+        col0 = max(int(np.floor(cols.min())), 0)
+        col1 = min(int(np.ceil(cols.max())), self.shape[1])
+        if row1 <= row0 or col1 <= col0:
+            return None
+        return row0, col0, row1 - row0, col1 - col0
+
+    def _check_shape(self, shape: tuple) -> None:
+        if tuple(shape) != self.shape:
+            raise ValueError(
+                f"Raster shape {tuple(shape)} does not match the zone index grid {self.shape}."
+            )
+
+    def _check_pixels(self, values: np.ndarray) -> None:
+        if len(values) != len(self.pixels):
+            raise ValueError(
+                f"Number of values {len(values)} does not match the zone pixels {len(self.pixels)}."
+            )
+
+    def read_pixels(self, dataset, band: int = 1, window_pixels: int = 2**22) -> np.ndarray:
+        """Read the values of the zone pixels (self.pixels) from an open rasterio dataset.
+        Only windows of rows with zone pixels are read, each limited to the columns of
+        those pixels, so rasters larger than the zones are not decoded fully.
+
+        Args:
+            dataset: Open rasterio dataset on the grid of the zone index
+            band (int, optional): Band to read. Defaults to 1.
+            window_pixels (int, optional): Approximate number of pixels per window read,
+                rounded to whole blocks of rows. Defaults to 2**22.
+
+        Returns:
+            np.ndarray: Values of the zone pixels, which can be passed to the statistics
+        """
+        self._check_shape((dataset.height, dataset.width))
+        ncols = self.shape[1]
+        values = np.empty(len(self.pixels), dtype=dataset.dtypes[band - 1])
+        if len(self.pixels) == 0:
+            return values
+
+        block_rows = dataset.block_shapes[band - 1][0]
+        window_rows = max(window_pixels // (ncols * block_rows), 1) * block_rows
+        rows, cols = np.divmod(self.pixels, ncols)
+        # the pixels are sorted, so each window of rows is a slice of the pixels
+        strips = rows // window_rows
+        starts = np.flatnonzero(np.diff(strips, prepend=-1))
+        for start, end in zip(starts, np.append(starts[1:], len(self.pixels))):
+            r, c = rows[start:end], cols[start:end]
+            row0, col0 = r[0], c.min()
+            window = Window(col0, row0, c.max() + 1 - col0, r[-1] + 1 - row0)
+            values[start:end] = dataset.read(band, window=window)[r - row0, c - col0]
+        return values
+
+    def _zone_values(self, arr: np.ndarray) -> np.ndarray:
+        """Values of the zone pixels in the order of the matrix entries, from a raster
+        on the grid or from the values of self.pixels"""
+        if arr.ndim == 1:
+            self._check_pixels(arr)
+            return arr[np.searchsorted(self.pixels, self.matrix.indices)]
+        self._check_shape(arr.shape)
+        return arr.ravel()[self.matrix.indices]
+
+    def _valid(self, values: np.ndarray, nodata) -> np.ndarray:
+        valid = np.ones(values.shape, dtype=bool)
+        if nodata is not None:
+            valid &= values != nodata
+        if np.issubdtype(values.dtype, np.floating):
+            valid &= ~np.isnan(values)
+        return valid
+
+    def _weighted_sums(self, arr: np.ndarray, nodata) -> tuple:
+        """Weighted count and sum of the valid pixels per zone, for a raster or a stack
+        of rasters with shape (n, rows, columns)"""
+        if arr.ndim == 1:
+            self._check_pixels(arr)
+            values = arr[:, None]
+        else:
+            self._check_shape(arr.shape[-2:])
+            values = arr.reshape((-1, self.shape[0] * self.shape[1]))[:, self.pixels].T
+        valid = self._valid(values, nodata)
+        count = self._pixel_matrix @ valid.astype(np.float64)
+        total = self._pixel_matrix @ np.where(valid, values, 0.0).astype(np.float64)
+        if arr.ndim == 3:
+            return count, total
+        return count[:, 0], total[:, 0]
+
+    def count(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        """Number of valid pixels per zone (weighted with the covered fraction)"""
+        return self._weighted_sums(arr, nodata)[0]
+
+    def sum(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        """Sum of the valid pixels per zone (weighted with the covered fraction)"""
+        return self._weighted_sums(arr, nodata)[1]
+
+    def mean(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        """Mean of the valid pixels per zone, NaN for zones without valid pixels. For a
+        stack of rasters with shape (n, rows, columns), the result has shape (zones, n)."""
+        count, total = self._weighted_sums(arr, nodata)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / np.where(count > 0, count, 1.0), np.nan)
+
+    def _entries(self, arr: np.ndarray, nodata) -> tuple:
+        """Zone, value and weight of the valid zone pixels, sorted by zone and value"""
+        zone = np.repeat(np.arange(len(self)), np.diff(self.matrix.indptr))
+        values = self._zone_values(arr)
+        valid = self._valid(values, nodata)
+        zone, values, weights = zone[valid], values[valid], self.matrix.data[valid]
+        order = np.lexsort((values, zone))
+        return zone[order], values[order], weights[order]
+
+    def _zone_starts(self, zone: np.ndarray) -> tuple:
+        starts = np.searchsorted(zone, np.arange(len(self)))
+        counts = np.diff(np.append(starts, len(zone)))
+        return starts, counts
+
+    def min(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        zone, values, _ = self._entries(arr, nodata)
+        starts, counts = self._zone_starts(zone)
+        result = np.full(len(self), np.nan)
+        result[counts > 0] = values[starts[counts > 0]]
+        return result
+
+    def max(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        zone, values, _ = self._entries(arr, nodata)
+        starts, counts = self._zone_starts(zone)
+        result = np.full(len(self), np.nan)
+        result[counts > 0] = values[starts[counts > 0] + counts[counts > 0] - 1]
+        return result
+
+    def median(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        """Median of the valid pixels per zone (not weighted), like numpy.median"""
+        zone, values, _ = self._entries(arr, nodata)
+        starts, counts = self._zone_starts(zone)
+        has = counts > 0
+        result = np.full(len(self), np.nan)
+        lo = starts[has] + (counts[has] - 1) // 2
+        hi = starts[has] + counts[has] // 2
+        result[has] = (values[lo].astype(np.float64) + values[hi]) / 2.0
+        return result
+
+    def category_counts(self, arr: np.ndarray, nodata=None) -> tuple:
+        """Number of pixels (weighted with the covered fraction) per zone and category
+
+        Returns:
+            tuple: Array with the categories and a matrix (zones x categories) with counts
+        """
+        zone, values, weights = self._entries(arr, nodata)
+        categories, icat = np.unique(values, return_inverse=True)
+        counts = np.bincount(
+            zone * len(categories) + icat,
+            weights=weights,
+            minlength=len(self) * len(categories),
+        ).reshape((len(self), len(categories)))
+        return categories, counts
+
+    def counts(self, arr: np.ndarray, categories, nodata=None) -> np.ndarray:
+        """Number of pixels (weighted with the covered fraction) per zone for the given
+        categories, as a matrix (zones x categories) with zeros for absent categories"""
+        return select_counts(*self.category_counts(arr, nodata), categories)
+
+    def majority(self, arr: np.ndarray, nodata=None) -> np.ndarray:
+        """Most occurring value per zone. For ties, the lowest value is taken."""
+        return majority_of_counts(*self.category_counts(arr, nodata))
+
+    def categorical(self, arr: np.ndarray, nodata=None) -> List[dict]:
+        """Pixel counts per category for each zone, as dictionaries"""
+        categories, counts = self.category_counts(arr, nodata)
+        if not self.fractional:
+            counts = counts.round().astype(int)
+        return [
+            {categories[i]: row[i] for i in np.nonzero(row)[0]} for row in counts
+        ]
+
+    def zonal_stats(
+        self,
+        arr: np.ndarray,
+        stats: Union[str, List[str]] = None,
+        categorical: bool = False,
+        nodata=-999,
+    ) -> List[dict]:
+        """Zonal statistics with the same output as rasterstats.zonal_stats: a
+        dictionary per zone, with None for the statistics of zones without valid pixels.
+        Like rasterstats, the default nodata value for arrays is -999.
+
+        Args:
+            arr (np.ndarray): Raster on the grid of the zone index
+            stats (Union[str, List[str]], optional): count, sum, mean, min, max, median
+                and/or majority. Defaults to None (count, min, max and mean), or no
+                statistics when categorical is True.
+            categorical (bool, optional): Add the pixel counts per category. Defaults to False.
+            nodata (optional): Value of the pixels that are ignored. Defaults to -999.
+        """
+        if stats is None:
+            stats = [] if categorical else ["count", "min", "max", "mean"]
+        elif isinstance(stats, str):
+            stats = stats.split()
+
+        results = [{} for _ in range(len(self))]
+        if categorical:
+            for result, counts in zip(results, self.categorical(arr, nodata)):
+                result.update(counts)
+
+        if stats:
+            count = self.count(arr, nodata)
+            for stat in stats:
+                values = count if stat == "count" else getattr(self, stat)(arr, nodata)
+                for result, value, n in zip(results, values, count):
+                    if stat == "count":
+                        result[stat] = int(value) if not self.fractional else float(value)
+                    else:
+                        result[stat] = None if n == 0 else value.item()
+        return results
@@ -0,0 +1,242 @@
+import logging
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+from pydantic.v1 import PrivateAttr
+
+from hydrolib.core.basemodel import ModelSaveSettings
+from hydrolib.core.dflowfm.bc.models import ForcingModel
+
+logger = logging.getLogger(__name__)
+
+
+class BCWriter:
+    """Streaming writer for D-Flow FM forcing files (boundaryconditions.bc).
+
+    Forcings are registered as NumPy arrays and only formatted when the file is
+    written. The data block of each forcing is formatted in chunks, so the memory
+    use is limited to the arrays themselves plus one chunk of text. A set of
+    series that share the same time axis (e.g. all laterals from one DataFrame)
+    can be added as a single 2D table, in which case the values are not copied.
+    """
+
+    def __init__(
+        self,
+        float_format: str = "%.6g",
+        time_format: str = "%.10g",
+        chunksize: int = 10000,
+    ) -> None:
+        """Initialize an empty writer
+
+        Args:
+            float_format (str, optional): %-format for the forcing values. Defaults to "%.6g".
+            time_format (str, optional): %-format for the time column. Defaults to "%.10g".
+            chunksize (int, optional): Number of data rows formatted at once. Defaults to 10000.
+        """
+        self.float_format = float_format
+        self.time_format = time_format
+        self.chunksize = chunksize
+
+        self._forcings = []
+        self._last_written = None
+
+    def __len__(self) -> int:
+        return len(self._forcings)
+
+    @property
+    def names(self) -> List[str]:
+        """Names of all registered forcings, in order of writing"""
+        return [forcing["name"] for forcing in self._forcings]
+
+    def add_constant(self, name: str, quantity: str, unit: str, value: float) -> None:
+        """Add a forcing with a constant value
+
+        Args:
+            name (str): Name (node id or lateral id) of the forcing
+            quantity (str): Forcing quantity, e.g. lateral_discharge or waterlevelbnd
+            unit (str): Unit of the quantity
+            value (float): Constant value
+        """
+        self._forcings.append(
+            {
+                "name": name,
+                "header": [
+                    ("name", name),
+                    ("function", "constant"),
+                    ("quantity", quantity),
+                    ("unit", unit),
+                ],
+                "times": None,
+                "values": np.atleast_1d(np.asarray(value, dtype=float)),
+                "column": None,
+            }
+        )
+        self._last_written = None
+
+    def add_timeseries(
+        self,
+        name: str,
+        quantity: str,
+        unit: str,
+        times: Union[list, np.ndarray],
+        values: Union[list, np.ndarray],
+        time_unit: str,
+        timeinterpolation: str = "linear",
+    ) -> None:
+        """Add a single time series forcing
+
+        Args:
+            name (str): Name (node id or lateral id) of the forcing
+            quantity (str): Forcing quantity, e.g. lateral_discharge or dischargebnd
+            unit (str): Unit of the quantity
+            times (Union[list, np.ndarray]): Times, relative to the reference in time_unit
+            values (Union[list, np.ndarray]): Values per time step
+            time_unit (str): Time unit, e.g. 'minutes since 2016-06-01 00:00:00'
+            timeinterpolation (str, optional): Time interpolation method. Defaults to "linear".
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if times.shape != values.shape:
+            raise ValueError(
+                f'Times and values of forcing "{name}" have different lengths ({len(times)} and {len(values)}).'
+            )
+        self._forcings.append(
+            {
+                "name": name,
+                "header": self._timeseries_header(
+                    name, quantity, unit, time_unit, timeinterpolation
+                ),
+                "times": times,
+                "values": values,
+                "column": None,
+            }
+        )
+        self._last_written = None
+
+    def add_timeseries_table(
+        self,
+        names: List[str],
+        quantity: str,
+        unit: str,
+        times: Union[list, np.ndarray],
+        values: np.ndarray,
+        time_unit: str,
+        timeinterpolation: str = "linear",
+    ) -> None:
+        """Add a set of time series forcings that share the same time axis. Every
+        column in values becomes one [Forcing] block. The table is referenced, not
+        copied, so this is the preferred method for large sets of laterals.
+
+        Args:
+            names (List[str]): Name of the forcing for each column in values
+            quantity (str): Forcing quantity, e.g. lateral_discharge
+            unit (str): Unit of the quantity
+            times (Union[list, np.ndarray]): Times, relative to the reference in time_unit
+            values (np.ndarray): Values with shape (number of times, number of names)
+            time_unit (str): Time unit, e.g. 'minutes since 2016-06-01 00:00:00'
+            timeinterpolation (str, optional): Time interpolation method. Defaults to "linear".
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 2 or values.shape != (len(times), len(names)):
+            raise ValueError(
+                f"Expected values with shape ({len(times)}, {len(names)}), got {values.shape}."
+            )
+        for column, name in enumerate(names):
+            self._forcings.append(
+                {
+                    "name": name,
+                    "header": self._timeseries_header(
+                        name, quantity, unit, time_unit, timeinterpolation
+                    ),
+                    "times": times,
+                    "values": values,
+                    "column": column,
+                }
+            )
+        self._last_written = None
+
+    @staticmethod
+    def _timeseries_header(
+        name: str, quantity: str, unit: str, time_unit: str, timeinterpolation: str
+    ) -> list:
+        return [
+            ("name", name),
+            ("function", "timeseries"),
+            ("timeInterpolation", timeinterpolation),
+            ("quantity", "time"),
+            ("unit", time_unit),
+            ("quantity", quantity),
+            ("unit", unit),
+        ]
+
+    def write(self, filepath: Union[str, Path]) -> None:
+        """Write all registered forcings to a .bc file
+
+        Args:
+            filepath (Union[str, Path]): Path of the forcing file
+        """
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filepath, "w") as f:
+            f.write("# written by HYDROLIB-dhydamo\n\n")
+            f.write("[General]\nfileVersion = 1.01\nfileType    = boundConds\n")
+            for forcing in self._forcings:
+                self._write_forcing(f, forcing)
+
+        self._last_written = filepath.resolve()
+        logger.info(f"Written {len(self._forcings)} forcings to {filepath}.")
+
+    def _write_forcing(self, f, forcing: dict) -> None:
+        """Write the header and data block of a single forcing"""
+        width = max(len(key) for key, _ in forcing["header"])
+        f.write("\n[Forcing]\n")
+        f.write("".join(f"{key:{width}s} = {value}\n" for key, value in forcing["header"]))
+
+        values = forcing["values"]
+        if forcing["column"] is not None:
+            values = values[:, forcing["column"]]
+
+        # Constant
+        if forcing["times"] is None:
+            f.write(self.float_format % values[0] + "\n")
+            return
+
+        # Time series, formatted per chunk of rows
+        rowfmt = f"{self.time_format} {self.float_format}\n"
+        times = forcing["times"]
+        for start in range(0, len(times), self.chunksize):
+            end = min(start + self.chunksize, len(times))
+            block = np.empty((end - start, 2))
+            block[:, 0] = times[start:end]
+            block[:, 1] = values[start:end]
+            f.write((rowfmt * (end - start)) % tuple(block.ravel().tolist()))
+
+
+class StreamingForcingModel(ForcingModel):
+    """ForcingModel of which the content is written by a BCWriter instead of the
+    hydrolib-core INI serializer. It can be referenced from Boundary and Lateral
+    blocks like a regular ForcingModel, and is written when the FM model is saved.
+    """
+
+    _writer: BCWriter = PrivateAttr(default=None)
+
+    def set_writer(self, writer: BCWriter) -> None:
+        """Couple the writer that produces the file content"""
+        self._writer = writer
+
+    @property
+    def writer(self) -> BCWriter:
+        return self._writer
+
+    def _save(self, save_settings: ModelSaveSettings) -> None:
+        path = self._resolved_filepath
+        if path is None or self._writer is None:
+            return
+        # Every Lateral and Boundary refers to (a shallow copy of) this model, which
+        # share the writer. Only write the file once per location.
+        if self._writer._last_written == path.resolve() and path.exists():
+            return
+        self._writer.write(path)
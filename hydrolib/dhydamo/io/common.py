@@ -10,6 +10,7 @@ import pandas as pd
 from shapely import wkb
 from shapely.geometry import LineString, MultiPolygon, Point, Polygon
 
+from hydrolib.dhydamo.core.profiling import profiled
 from hydrolib.dhydamo.geometry import spatial
 
 logger = logging.getLogger()
@@ -222,6 +223,7 @@ class ExtendedGeoDataFrame(gpd.GeoDataFrame):
                 f"\t{laynum:5d}\t|\t{layer_name:30s}\t|\t{geom_type:12s}\t|\t{nfeatures:10d}\t|\t{nfields:10d}"
             )
 
+    @profiled(items="self")
     def read_gpkg_layer(
         self,
         gpkg_path: Union[str, Path],
@@ -381,6 +383,7 @@ class ExtendedGeoDataFrame(gpd.GeoDataFrame):
                     f"Merge of two profile columns'{col1}' and '{col2}' did not succeed."
                 )
 
+    @profiled(items="self")
     def snap_to_branch(self, branches, snap_method, maxdist=5):
         """Snap the geometries to the branch"""
         spatial.find_nearest_branch(
@@ -461,6 +464,7 @@ class ExtendedDataFrame(pd.DataFrame):
                     )
                 )
 
+    @profiled(items="self")
     def read_gpkg_layer(
         self,
         gpkg_path: Union[str, Path],
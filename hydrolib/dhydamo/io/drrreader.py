@@ -1,13 +1,18 @@
 import logging
 import os
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Union
 
 import numpy as np
 import pandas as pd
+import rasterio
+import shapely
+import xarray as xr
+from affine import Affine
 from pydantic.v1 import validate_arguments, StrictFloat, StrictInt, StrictStr
-from rasterstats import zonal_stats
 from rasterio.transform import from_origin
 from tqdm.auto import tqdm
 from hydrolib.dhydamo.io import idfreader
@@ -16,6 +21,27 @@ from hydrolib.dhydamo.io.common import ExtendedDataFrame, ExtendedGeoDataFrame
 logger = logging.getLogger(__name__)
 
 
+def raster_time(file: Union[str, Path]) -> pd.Timestamp:
+    """Time of a meteo raster, from the part of the filename after the first underscore
+    (for example NSL_201606010000.ASC)"""
+    return pd.Timestamp(os.path.split(file)[1].split("_")[1].split(".")[0])
+
+
+def _pixel_area(file: Union[str, Path]) -> float:
+    """Area of a pixel of a raster, from the raster metadata only"""
+    with rasterio.open(file) as dataset:
+        return dataset.transform[0] * -dataset.transform[4]
+
+
+def _zonal_or_uniform(drrmodel, zones, value, stat: str = "mean") -> np.ndarray:
+    """Zonal statistic (all touched pixels) per zone of a raster file, or a spatially
+    uniform value"""
+    if isinstance(value, (Path, str)):
+        rast, affine = drrmodel.read_raster(value, static=True)
+        return drrmodel.zonal_array(zones, rast, affine, stat, all_touched=True)
+    return np.full(len(zones), float(value))
+
+
 class UnpavedIO:
     def __init__(self, unpaved):
         self.unpaved = unpaved
@@ -47,85 +73,8 @@ class UnpavedIO:
             zonalstats_alltouched (bool, optional): method to carry out zonal statistics, see rasterstats docx. Defaults to False.
         """
         all_touched = False if zonalstats_alltouched is None else zonalstats_alltouched
+        drrmodel = self.unpaved.drrmodel
 
-        # required rasters
-        warnings.filterwarnings("ignore")
-        lu_rast, lu_affine = self.unpaved.drrmodel.read_raster(landuse, static=True)
-        lu_counts = zonal_stats(
-            catchments,
-            lu_rast,
-            affine=lu_affine,
-            categorical=True,
-            all_touched=all_touched,
-        )
-
-        rast, affine = self.unpaved.drrmodel.read_raster(soiltype, static=True)
-        soiltypes = zonal_stats(
-            catchments,
-            soiltype,
-            affine=affine,
-            stats="majority",
-            all_touched=all_touched,
-        )
-
-        rast, affine = self.unpaved.drrmodel.read_raster(surface_level, static=True)
-        mean_elev = zonal_stats(
-            catchments, rast, affine=affine, stats="median", all_touched=all_touched
-        )
-
-        # optional rasters
-        if isinstance(surface_storage, str):
-            rast, affine = self.unpaved.drrmodel.read_raster(
-                surface_storage, static=True
-            )
-            sstores = zonal_stats(
-                catchments, rast, affine=affine, stats="mean", all_touched=True
-            )
-        elif isinstance(surface_storage, int):
-            surface_storage = float(surface_storage)
-        if isinstance(infiltration_capacity, str):
-            rast, affine = self.unpaved.drrmodel.read_raster(
-                infiltration_capacity, static=True
-            )
-            infcaps = zonal_stats(
-                catchments, rast, affine=affine, stats="mean", all_touched=True
-            )
-        elif isinstance(infiltration_capacity, int):
-            infiltration_capacity = float(infiltration_capacity)
-        if isinstance(initial_gwd, str):
-            rast, affine = self.unpaved.drrmodel.read_raster(initial_gwd, static=True)
-            ini_gwds = zonal_stats(
-                catchments, rast, affine=affine, stats="mean", all_touched=True
-            )
-        elif isinstance(initial_gwd, int):
-            initial_gwd = float(initial_gwd)
-
-        # get raster cellsize
-        px_area = lu_affine[0] * -lu_affine[4]
-
-        unpaved_drr = ExtendedDataFrame(required_columns=["id"])
-        unpaved_drr.set_data(
-            pd.DataFrame(
-                np.zeros((len(catchments), 12)),
-                columns=[
-                    "id",
-                    "total_area",
-                    "lu_areas",
-                    "surface_level",
-                    "soiltype",
-                    "surface_storage",
-                    "infiltration_capacity",
-                    "initial_gwd",
-                    "meteo_area",
-                    "px",
-                    "py",
-                    "boundary_node",
-                ],
-                dtype="str",
-            ),
-            index_col="id",
-        )
-        unpaved_drr.index = catchments.code
         # HyDAMO Crop code; hydamo name, sobek index, sobek name:
         # 1 aardappelen   3 potatoes
         # 2 graan         5 grain
@@ -140,62 +89,53 @@ class UnpavedIO:
         # 11 natuuur     13 nature
         # 12 braak       14 fallow
         sobek_indices = [3, 5, 4, 2, 15, 10, 9, 1, 11, 12, 13, 14]
-        for num, cat in enumerate(catchments.itertuples()):
-            # if no rasterdata could be obtained for this catchment, skip it.
-            if mean_elev[num]["median"] is None:
-                logger.warning(f"No rasterdata available for catchment {cat.code}.")
-                continue
-            tm = [
-                m
-                for m in meteo_areas.itertuples()
-                if m.geometry.contains(cat.geometry.centroid)
-            ]
-            ms = meteo_areas.iloc[0, :][0] if tm == [] else tm[0].code
-            # find corresponding meteo-station
-            # ms = [ms for ms in meteo_areas.itertuples() if ms.geometry.contains(cat.geometry.centroid)]
-            # ms = ms[0] if ms != [] else meteo_areas.iloc[0,:][0]
-            mapping = np.zeros(16, dtype=int)
-            for i in range(1, 13):
-                if i in lu_counts[num]:
-                    mapping[sobek_indices[i - 1] - 1] = lu_counts[num][i] * px_area
-            lu_map = " ".join(map(str, mapping))
-            elev = mean_elev[num]["median"]
-            unpaved_drr.at[cat.code, "id"] = str(cat.code)
-            unpaved_drr.at[cat.code, "total_area"] = f"{cat.geometry.area:.0f}"
-            unpaved_drr.at[cat.code, "lu_areas"] = lu_map
-            unpaved_drr.at[cat.code, "surface_level"] = f"{elev:.2f}"
-            unpaved_drr.at[
-                cat.code, "soiltype"
-            ] = f'{soiltypes[num]["majority"]+100.:.0f}'
-            if isinstance(surface_storage, float):
-                unpaved_drr.at[cat.code, "surface_storage"] = f"{surface_storage:.3f}"
-            else:
-                unpaved_drr.at[
-                    cat.code, "surface_storage"
-                ] = f'{sstores[num]["mean"]:.3f}'
-            if isinstance(infiltration_capacity, float):
-                unpaved_drr.at[
-                    cat.code, "infiltration_capacity"
-                ] = f"{infiltration_capacity:.3f}"
-            else:
-                unpaved_drr.at[
-                    cat.code, "infiltration_capacity"
-                ] = f'{infcaps[num]["mean"]:.3f}'
-            if isinstance(initial_gwd, float):
-                unpaved_drr.at[cat.code, "initial_gwd"] = f"{initial_gwd:.2f}"
-            else:
-                unpaved_drr.at[cat.code, "initial_gwd"] = f'{ini_gwds[num]["mean"]:.2f}'
-            unpaved_drr.at[cat.code, "meteo_area"] = str(ms)
-            unpaved_drr.at[
-                cat.code, "px"
-            ] = f"{cat.geometry.centroid.coords[0][0]-10:.0f}"
-            unpaved_drr.at[cat.code, "py"] = f"{cat.geometry.centroid.coords[0][1]:.0f}"
-            unpaved_drr.at[cat.code, "boundary_node"] = str(cat.lateraleknoopcode)
 
-        [
-            self.unpaved.add_unpaved(**unpaved)
-            for unpaved in unpaved_drr.to_dict("records")
-        ]
+        # required rasters
+        warnings.filterwarnings("ignore")
+        # class counts from the raster windows covering the catchments, shared with the other node types
+        lu_counts = drrmodel.raster_counts(
+            catchments, landuse, range(1, 13), all_touched=all_touched
+        )
+        soiltypes = drrmodel.raster_majority(catchments, soiltype, all_touched=all_touched)
+        rast, affine = drrmodel.read_raster(surface_level, static=True)
+        elev = drrmodel.zonal_array(
+            catchments, rast, affine, "median", all_touched=all_touched
+        )
+
+        # get raster cellsize
+        px_area = _pixel_area(landuse)
+
+        # land use areas in whole m2, in the order of the SOBEK land use classes
+        lu_areas = np.zeros((len(catchments), 16))
+        lu_areas[:, np.array(sobek_indices) - 1] = np.trunc(lu_counts * px_area)
+
+        centroids = catchments.geometry.centroid
+        unpaved_drr = pd.DataFrame(
+            lu_areas, columns=self.unpaved.lu_columns, index=catchments.code.values
+        )
+        unpaved_drr["total_area"] = catchments.geometry.area.values
+        unpaved_drr["surface_level"] = elev
+        unpaved_drr["soiltype"] = soiltypes + 100.0
+        # optional rasters
+        unpaved_drr["surface_storage"] = _zonal_or_uniform(
+            drrmodel, catchments, surface_storage
+        )
+        unpaved_drr["infiltration_capacity"] = _zonal_or_uniform(
+            drrmodel, catchments, infiltration_capacity
+        )
+        unpaved_drr["initial_gwd"] = _zonal_or_uniform(drrmodel, catchments, initial_gwd)
+        unpaved_drr["meteo_area"] = drrmodel.meteo_area_codes(
+            catchments, meteo_areas
+        ).astype(str)
+        unpaved_drr["px"] = centroids.x.values - 10.0
+        unpaved_drr["py"] = centroids.y.values
+        unpaved_drr["boundary_node"] = catchments.lateraleknoopcode.astype(str).values
+
+        # if no rasterdata could be obtained for a catchment, skip it.
+        missing = np.isnan(elev)
+        for code in catchments.code.values[missing]:
+            logger.warning(f"No rasterdata available for catchment {code}.")
+        self.unpaved.add_nodes(unpaved_drr[~missing])
 
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def ernst_from_input(
@@ -219,25 +159,13 @@ class UnpavedIO:
             infiltration_resistance = 300.0
         if runoff_resistance is None:
             runoff_resistance = 1.0
-        
-        ernst_drr = ExtendedDataFrame(required_columns=["id"])
-        ernst_drr.set_data(
-            pd.DataFrame(
-                np.zeros((len(catchments), 5)),
-                columns=["id", "cvo", "lv", "cvi", "cvs"],
-                dtype="str",
-            ),
-            index_col="id",
-        )
-        ernst_drr.index = catchments.code
-        for num, cat in enumerate(catchments.itertuples()):
-            ernst_drr.at[cat.code, "id"] = str(cat.code)
-            ernst_drr.at[cat.code, "cvo"] = " ".join([str(res) for res in resistance])
-            ernst_drr.at[cat.code, "lv"] = " ".join([str(depth) for depth in depths])
-            ernst_drr.at[cat.code, "cvi"] = f'{infiltration_resistance:.2f}'
-            ernst_drr.at[cat.code, "cvs"] = f'{runoff_resistance:.2f}'
 
-        [self.unpaved.add_ernst_def(**ernst) for ernst in ernst_drr.to_dict("records")]
+        ernst_drr = pd.DataFrame(index=catchments.code.values)
+        ernst_drr["cvo"] = [tuple(resistance)] * len(catchments)
+        ernst_drr["lv"] = [tuple(depths)] * len(catchments)
+        ernst_drr["cvi"] = float(infiltration_resistance)
+        ernst_drr["cvs"] = float(runoff_resistance)
+        self.unpaved.add_ernst_defs(ernst_drr)
 
 
 class PavedIO:
@@ -276,315 +204,112 @@ class PavedIO:
             _type_: _description_
         """
         all_touched = False if zonalstats_alltouched is None else zonalstats_alltouched
+        drrmodel = self.paved.drrmodel
 
-        lu_rast, lu_affine = self.paved.drrmodel.read_raster(landuse, static=True)
-        lu_counts = zonal_stats(
-            catchments,
-            lu_rast,
-            affine=lu_affine,
-            categorical=True,
-            all_touched=all_touched,
-        )
-        sl_rast, sl_affine = self.paved.drrmodel.read_raster(surface_level, static=True)
-        mean_elev = zonal_stats(
-            catchments,
-            sl_rast,
-            affine=sl_affine,
-            stats="median",
-            all_touched=all_touched,
+        sl_rast, sl_affine = drrmodel.read_raster(surface_level, static=True)
+        elev = drrmodel.zonal_array(
+            catchments, sl_rast, sl_affine, "median", all_touched=all_touched
         )
-
-        if isinstance(street_storage, (Path, str)):
-            strs_rast, strs_affine = self.paved.drrmodel.read_raster(
-                street_storage, static=True
-            )
-            str_stors = zonal_stats(
-                catchments,
-                strs_rast,
-                affine=strs_affine,
-                stats="mean",
-                all_touched=True,
-            )
-        
-        if isinstance(sewer_storage, (Path, str)):
-            sews_rast, sews_affine = self.paved.drrmodel.read_raster(
-                sewer_storage, static=True
-            )
-            sew_stors = zonal_stats(
-                catchments,
-                sews_rast,
-                affine=sews_affine,
-                stats="mean",
-                all_touched=True,
-            )
-        
-        if isinstance(pump_capacity,  (Path, str)):
-            # raster of POC in mm/h
-            pump_rast, pump_affine = self.paved.drrmodel.read_raster(
-                pump_capacity, static=True
-            )
-            pump_caps = zonal_stats(
-                catchments,
-                pump_rast,
-                affine=pump_affine,
-                stats="mean",
-                all_touched=True,
-            )
-        
-        def update_dict(dict1, dict2):
-            for i in dict2.keys():
-                if i in dict1:
-                    dict1[i] += dict2[i]
-                else:
-                    dict1[i] = dict2[i]
-            return dict1
+        paved_pixels = drrmodel.raster_counts(
+            catchments, landuse, [14], all_touched=all_touched
+        )[:, 0]
 
         # get raster cellsize
-        px_area = lu_affine[0] * -lu_affine[4]
-        paved_drr = ExtendedDataFrame(required_columns=["id"])
-        if sewer_areas is not None:
-            # if the parameters ara rasters, do the zonal statistics per sewage area as well.
-            if isinstance(street_storage,(Path, str)):
-                str_stors_sa = zonal_stats(
-                    sewer_areas,
-                    strs_rast,
-                    affine=strs_affine,
-                    stats="mean",
-                    all_touched=True,
-                )
-            if isinstance(sewer_storage, (Path, str)):
-                sew_stors_sa = zonal_stats(
-                    sewer_areas,
-                    sews_rast,
-                    affine=sews_affine,
-                    stats="mean",
-                    all_touched=True,
-                )
-            if isinstance(pump_capacity, (Path, str)):
-                pump_caps_sa = zonal_stats(
-                    sewer_areas,
-                    pump_rast,
-                    affine=pump_affine,
-                    stats="mean",
-                    all_touched=True,
-                )
-            mean_sa_elev = zonal_stats(
-                sewer_areas, sl_rast, affine=sl_affine, stats="median", all_touched=True
-            )
+        px_area = _pixel_area(landuse)
 
-            # initialize the array of paved nodes, which should contain a node for all catchments and all overflows
-            paved_drr.set_data(
-                pd.DataFrame(
-                    np.zeros((len(catchments) + len(overflows), 10)),
-                    columns=[
-                        "id",
-                        "area",
-                        "surface_level",
-                        "street_storage",
-                        "sewer_storage",
-                        "pump_capacity",
-                        "meteo_area",
-                        "px",
-                        "py",
-                        "boundary_node",
-                    ],
-                    dtype="str",
-                ),
-                index_col="id",
-            )
-            paved_drr.index = pd.concat([catchments.code, overflows.code], ignore_index=True)
-
-
-            # find the paved area in the sewer areas
-            for isew, sew in enumerate(sewer_areas.itertuples()):
-                pav_area = 0
-                pixels = zonal_stats(
-                    sew.geometry,
-                    lu_rast,
-                    affine=lu_affine,
-                    categorical=True,
-                    all_touched=all_touched,
-                )[0]
-                if 14.0 not in pixels:
-                    logger.warning(f"No paved area in sewer area {sew.code}.")
-                    continue
-                pav_pixels = pixels[14.0]
-                pav_area += pav_pixels * px_area
-
-                # subtract it fromthe total paved area in this catchment, make sure at least 0 remains
-                # lu_counts[cat_ind][14.0] -=  pav_pixels
-                # if lu_counts[cat_ind][14.0] < 0: lu_counts[cat_ind][14.0]  = 0
-
-                elev = mean_sa_elev[isew]["median"]
-                # find overflows related to this sewer area
-                ovf = overflows[overflows.codegerelateerdobject == sew.code]
-                for ov in ovf.itertuples():
-                    # find corresponding meteo-station
-                    tm = [
-                        m
-                        for m in meteo_areas.itertuples()
-                        if m.geometry.contains(sew.geometry.centroid)
+        if sewer_areas is not None:
+            # only the paved area outside the sewer areas is assigned to the catchment nodes,
+            # the paved area in the sewer areas to the overflows. Both are counted in one pass.
+            union = sewer_areas.unary_union
+            geometries = np.asarray(catchments.geometry.values, dtype=object)
+            intersects = shapely.intersects(geometries, union)
+            nparts = intersects.sum()
+            sewer_pixels = drrmodel.raster_counts(
+                np.concatenate(
+                    [
+                        shapely.difference(geometries[intersects], union),
+                        np.asarray(sewer_areas.geometry.values, dtype=object),
                     ]
-                    ms = meteo_areas.iloc[0, :][0] if tm == [] else tm[0].code
-
-                    # add prefix to the overflow id to create the paved-node id
-                    paved_drr.at[ov.code, "id"] = str(ov.code)
-                    paved_drr.at[ov.code, "area"] = str(pav_area * ov.fractie)
-                    paved_drr.at[ov.code, "surface_level"] = f"{elev:.2f}"
-                    
-                    # if a float is given, a standard value is passed. If a string is given, a rastername is assumed to zonal statistics are applied.
-                    if isinstance(street_storage,  float):
-                        paved_drr.at[
-                            ov.code, "street_storage"
-                        ] = f"{street_storage:.2f}"
-                    elif isinstance(street_storage, (Path, str)):
-                        paved_drr.at[
-                            ov.code, "street_storage"
-                        ] = f'{str_stors_sa[isew]["mean"]:.2f}'
-                    else:
-                        raise ValueError('Street_storage has the wrong datatype. It should be a filename (Path or string) or number (float or int).')
-                    
-                    # three options: it can be an attribute of a sewer area, a uniform value or a raster
-                    if sew.riool_berging_mm is None or np.isnan(sew.riool_berging_mm) or not isinstance(sew.riool_berging_mm, float):  
-                        if isinstance(sewer_storage, float):
-                            paved_drr.at[ov.code, "sewer_storage"] = f"{sewer_storage:.2f}"   
-                        elif isinstance(sewer_storage, (Path, str)):
-                            paved_drr.at[
-                            ov.code, "sewer_storage"
-                            ] = f'{sew_stors_sa[isew]["mean"]:.2f}'
-                        else:
-                            raise ValueError('Sewer_storage has the wrong datatype. It should be a filename (Path or string) or number (float or int).')                            
-                    else:                                     
-                        paved_drr.at[ov.code, "sewer_storage"] = f'{sew.riool_berging_mm:.2f}'
-                    
-                    # three options: it can be an attribute of a sewer area, a uniform value or a raster
-                    if sew.riool_poc_m3s is None or np.isnan(sew.riool_poc_m3s) or not isinstance(sew.riool_poc_m3s, float):                    
-                         if isinstance(pump_capacity, float):
-                            # convert the value from mm/h to m3/s
-                            paved_drr.at[ov.code, "pump_capacity"] = f"{pump_capacity * (float(pav_area) * ov.fractie) / (1000. * 3600.):.8f}"   
-                         elif isinstance(pump_capacity, (Path, str)):
-                            # convert the value (extracted from the raster) from mm/h to m3/s
-                            paved_drr.at[
-                            ov.code, "pump_capacity"
-                            ] = f'{pump_caps_sa[isew]["mean"] * (float(pav_area) * ov.fractie) / (1000. * 3600.):.8f}'
-                         else:
-                            raise ValueError('Pump_capacity has the wrong datatype. It should be a filename (Path or string) or number (float or int).')        
-                    else:
-                        # use the attribute value
-                        paved_drr.at[ov.code, "pump_capacity"] = f'{sew.riool_poc_m3s * ov.fractie:.8f}'
-                                              
-                    paved_drr.at[ov.code, "meteo_area"] = str(ms)
-                    paved_drr.at[ov.code, "px"] = f"{ov.geometry.coords[0][0]+10:.0f}"
-                    paved_drr.at[ov.code, "py"] = f"{ov.geometry.coords[0][1]:.0f}"
-                    paved_drr.at[ov.code, "boundary_node"] = ov.code
-        else:
-            # in this case only the catchments are taken into account. A node is created for every catchment nonetheless, but only nodes with a remaining area >0 are written.
-            paved_drr.set_data(
-                pd.DataFrame(
-                    np.zeros((len(catchments), 10)),
-                    columns=[
-                        "id",
-                        "area",
-                        "surface_level",
-                        "street_storage",
-                        "sewer_storage",
-                        "pump_capacity",
-                        "meteo_area",
-                        "px",
-                        "py",
-                        "boundary_node",
-                    ],
-                    dtype="str",
                 ),
-                index_col="id",
-            )
-            paved_drr.index = catchments.code
-
-        for num, cat in enumerate(catchments.itertuples()):
-            # if no rasterdata could be obtained for this catchment, skip it.
-            if mean_elev[num]["median"] is None:
-                logger.warning(f"No rasterdata available for catchment {cat.code}.")
-                continue
-            if sewer_areas is not None:
-                if cat.geometry.intersects(sewer_areas.unary_union):
-                    area_outside_sewer = cat.geometry.difference(
-                        sewer_areas.unary_union
-                    )
-                    if area_outside_sewer.area == 0:
-                        logger.info(
-                            f"No paved area outside sewer area in catchments {cat.code}."
-                        )
-                        pav_area = 0.0
-                    else:
-                        pixels = zonal_stats(
-                            area_outside_sewer,
-                            lu_rast,
-                            affine=lu_affine,
-                            categorical=True,
-                            all_touched=all_touched,
-                        )[0]
-                        if 14.0 in pixels:
-                            pav_area = str(pixels[14.0] * px_area)
-                        else:
-                            pav_area = 0.0
-                else:
-                    pixels = zonal_stats(
-                                cat.geometry,
-                                lu_rast,
-                                affine=lu_affine,
-                                categorical=True,
-                                all_touched=all_touched,
-                            )[0]
-                    if 14.0 in pixels:
-                        pav_area = str(pixels[14.0] * px_area)
-                    else:
-                        pav_area = 0.0
-            else:
-                pav_area = (
-                    str(lu_counts[num][14.0] * px_area)
-                    if 14.0 in lu_counts[num]
-                    else "0"
-                )
+                landuse,
+                [14],
+                all_touched=all_touched,
+            )[:, 0]
+            paved_pixels[intersects] = sewer_pixels[:nparts]
+            sa_area = sewer_pixels[nparts:] * px_area
+
+        area = paved_pixels * px_area
+        centroids = catchments.geometry.centroid
+        paved_drr = pd.DataFrame(index=catchments.code.values)
+        paved_drr["area"] = area
+        paved_drr["surface_level"] = elev
+        # if a float is given, a standard value is passed. If a string is given, a rastername is assumed to zonal statistics are applied.
+        paved_drr["street_storage"] = _zonal_or_uniform(drrmodel, catchments, street_storage)
+        paved_drr["sewer_storage"] = _zonal_or_uniform(drrmodel, catchments, sewer_storage)
+        # convert the pump capacity from mm/h to m3/s
+        paved_drr["pump_capacity"] = (
+            _zonal_or_uniform(drrmodel, catchments, pump_capacity)
+            * area
+            / (1000.0 * 3600.0)
+        )
+        paved_drr["meteo_area"] = drrmodel.meteo_area_codes(
+            catchments, meteo_areas
+        ).astype(str)
+        paved_drr["px"] = centroids.x.values + 10.0
+        paved_drr["py"] = centroids.y.values
+        paved_drr["boundary_node"] = catchments.lateraleknoopcode.astype(str).values
+
+        # if no rasterdata could be obtained for a catchment, skip it.
+        missing = np.isnan(elev)
+        for code in catchments.code.values[missing]:
+            logger.warning(f"No rasterdata available for catchment {code}.")
+        self.paved.add_nodes(paved_drr[~missing])
 
-            # find corresponding meteo-station
-            tm = [
-                m
-                for m in meteo_areas.itertuples()
-                if m.geometry.contains(cat.geometry.centroid)
-            ]
-            ms = meteo_areas.iloc[0, :][0] if tm == [] else tm[0].code
-
-            elev = mean_elev[num]["median"]
-            paved_drr.at[cat.code, "id"] = str(cat.code)
-            paved_drr.at[cat.code, "area"] = str(pav_area)  #
-            paved_drr.at[cat.code, "surface_level"] = f"{elev:.2f}"
-            # if a float is given, a standard value is passed. If a string is given, a rastername is assumed to zonal statistics are applied.
-            if isinstance(street_storage, float):
-                paved_drr.at[cat.code, "street_storage"] = f"{street_storage:.2f}"
-            else:
-                paved_drr.at[
-                    cat.code, "street_storage"
-                ] = f'{str_stors[num]["mean"]:.2f}'
-            if isinstance(sewer_storage, float):
-                paved_drr.at[cat.code, "sewer_storage"] = f"{sewer_storage:.2f}"
-            else:
-                paved_drr.at[
-                    cat.code, "sewer_storage"
-                ] = f'{sew_stors[num]["mean"]:.2f}'
-            if isinstance(pump_capacity, float):
-                paved_drr.at[cat.code, "pump_capacity"] = f'{(pump_capacity * float(pav_area)) / (1000. * 3600.):.8f}'
-            else:
-                paved_drr.at[
-                    cat.code, "pump_capacity"
-                ] = f'{pump_caps[num]["mean"] * (float(pav_area)) / (1000. * 3600.):.8f}'
-            
-            paved_drr.at[cat.code, "meteo_area"] = str(ms)
-            paved_drr.at[
-                cat.code, "px"
-            ] = f"{cat.geometry.centroid.coords[0][0]+10:.0f}"
-            paved_drr.at[cat.code, "py"] = f"{cat.geometry.centroid.coords[0][1]:.0f}"
-            paved_drr.at[cat.code, "boundary_node"] = cat.lateraleknoopcode
-        [self.paved.add_paved(**pav) for pav in paved_drr.to_dict("records")]
+        if sewer_areas is not None:
+            # the paved area in the sewer areas is assigned to nodes at the related overflows
+            for code in sewer_areas.code.values[sa_area == 0.0]:
+                logger.warning(f"No paved area in sewer area {code}.")
+            sa_elev = drrmodel.zonal_array(
+                sewer_areas, sl_rast, sl_affine, "median", all_touched=True
+            )
+            sa_street = _zonal_or_uniform(drrmodel, sewer_areas, street_storage)
+            # sewer storage and pump capacity can be attributes of a sewer area, otherwise a uniform value or a raster is used
+            sa_sewer = pd.to_numeric(sewer_areas.riool_berging_mm, errors="coerce").values
+            sa_sewer = np.where(
+                np.isnan(sa_sewer),
+                _zonal_or_uniform(drrmodel, sewer_areas, sewer_storage),
+                sa_sewer,
+            )
+            sa_poc = pd.to_numeric(sewer_areas.riool_poc_m3s, errors="coerce").values
+            sa_pump = _zonal_or_uniform(drrmodel, sewer_areas, pump_capacity)
+            sa_meteo_codes = drrmodel.meteo_area_codes(sewer_areas, meteo_areas)
+
+            # find the sewer area of each overflow
+            sa_index = pd.Series(np.arange(len(sewer_areas)), index=sewer_areas.code.values)
+            sa_index = sa_index[~sa_index.index.duplicated(keep="last")]
+            isew = sa_index.reindex(overflows.codegerelateerdobject.values).values
+            related = ~np.isnan(isew)
+            related[related] = sa_area[isew[related].astype(int)] > 0.0
+            isew = isew[related].astype(int)
+
+            fraction = overflows.fractie.values[related].astype(float)
+            ov_area = sa_area[isew] * fraction
+            ov_drr = pd.DataFrame(index=overflows.code.values[related])
+            ov_drr["area"] = ov_area
+            ov_drr["surface_level"] = sa_elev[isew]
+            ov_drr["street_storage"] = sa_street[isew]
+            ov_drr["sewer_storage"] = sa_sewer[isew]
+            # convert the pump capacity from mm/h to m3/s, unless the sewer area has a capacity in m3/s
+            ov_drr["pump_capacity"] = np.where(
+                np.isnan(sa_poc[isew]),
+                sa_pump[isew] * ov_area / (1000.0 * 3600.0),
+                sa_poc[isew] * fraction,
+            )
+            ov_drr["meteo_area"] = sa_meteo_codes[isew].astype(str)
+            ov_drr["px"] = overflows.geometry.x.values[related] + 10.0
+            ov_drr["py"] = overflows.geometry.y.values[related]
+            ov_drr["boundary_node"] = overflows.code.values[related].astype(str)
+            self.paved.add_nodes(ov_drr)
 
 
 class GreenhouseIO:
@@ -612,79 +337,37 @@ class GreenhouseIO:
             zonalstats_alltouched (bool, optional): method to carry out zonal statistis, see rasterstats docx. Defaults to False.onalstats_alltouched (bool, optional): method to. Defaults to False.
         """
         all_touched = False if zonalstats_alltouched is None else zonalstats_alltouched
-
-        lu_rast, lu_affine = self.greenhouse.drrmodel.read_raster(landuse, static=True)
-        lu_counts = zonal_stats(
-            catchments,
-            lu_rast,
-            affine=lu_affine,
-            categorical=True,
-            all_touched=all_touched,
-        )
-        rast, affine = self.greenhouse.drrmodel.read_raster(surface_level, static=True)
-        mean_elev = zonal_stats(
-            catchments, rast, affine=affine, stats="median", all_touched=all_touched
+        drrmodel = self.greenhouse.drrmodel
+
+        gh_pixels = drrmodel.raster_counts(
+            catchments, landuse, [15], all_touched=all_touched
+        )[:, 0]
+        rast, affine = drrmodel.read_raster(surface_level, static=True)
+        elev = drrmodel.zonal_array(
+            catchments, rast, affine, "median", all_touched=all_touched
         )
-        # optional rasters
-        if isinstance(roof_storage, (Path, str)):
-            rast, affine = self.greenhouse.drrmodel.read_raster(
-                roof_storage, static=True
-            )
-            roofstors = zonal_stats(
-                catchments, rast, affine=affine, stats="mean", all_touched=True
-            )
-        
+
         # get raster cellsize
-        px_area = lu_affine[0] * -lu_affine[4]
+        px_area = _pixel_area(landuse)
 
-        gh_drr = ExtendedDataFrame(required_columns=["id"])
-        gh_drr.set_data(
-            pd.DataFrame(
-                np.zeros((len(catchments), 8)),
-                columns=[
-                    "id",
-                    "area",
-                    "surface_level",
-                    "roof_storage",
-                    "meteo_area",
-                    "px",
-                    "py",
-                    "boundary_node",
-                ],
-                dtype="str",
-            ),
-            index_col="id",
-        )
-        gh_drr.index = catchments.code
-        for num, cat in enumerate(catchments.itertuples()):
-            # if no rasterdata could be obtained for this catchment, skip it.
-            if mean_elev[num]["median"] is None:
-                logger.warning(f"No rasterdata available for catchment {cat.code}.")
-                continue
+        centroids = catchments.geometry.centroid
+        gh_drr = pd.DataFrame(index=catchments.code.values)
+        gh_drr["area"] = gh_pixels * px_area
+        gh_drr["surface_level"] = elev
+        # optional rasters
+        gh_drr["roof_storage"] = _zonal_or_uniform(drrmodel, catchments, roof_storage)
+        gh_drr["meteo_area"] = drrmodel.meteo_area_codes(
+            catchments, meteo_areas
+        ).astype(str)
+        gh_drr["px"] = centroids.x.values + 20.0
+        gh_drr["py"] = centroids.y.values
+        gh_drr["boundary_node"] = catchments.lateraleknoopcode.astype(str).values
 
-            # find corresponding meteo-station
-            tm = [
-                m
-                for m in meteo_areas.itertuples()
-                if m.geometry.contains(cat.geometry.centroid)
-            ]
-            ms = meteo_areas.iloc[0, :][0] if tm == [] else tm[0].code
-
-            elev = mean_elev[num]["median"]
-            gh_drr.at[cat.code, "id"] = str(cat.code)
-            gh_drr.at[cat.code, "area"] = (
-                str(lu_counts[num][15] * px_area) if 15 in lu_counts[num] else "0"
-            )
-            gh_drr.at[cat.code, "surface_level"] = f"{elev:.2f}"
-            if isinstance(roof_storage, float):
-                gh_drr.at[cat.code, "roof_storage"] = f"{roof_storage:.2f}"
-            else:
-                gh_drr.at[cat.code, "roof_storage"] = f'{roofstors[num]["mean"]:.2f}'
-            gh_drr.at[cat.code, "meteo_area"] = str(ms)
-            gh_drr.at[cat.code, "px"] = f"{cat.geometry.centroid.coords[0][0]+20:.0f}"
-            gh_drr.at[cat.code, "py"] = f"{cat.geometry.centroid.coords[0][1]:.0f}"
-            gh_drr.at[cat.code, "boundary_node"] = cat.lateraleknoopcode
-        [self.greenhouse.add_greenhouse(**gh) for gh in gh_drr.to_dict("records")]
+        # if no rasterdata could be obtained for a catchment, skip it.
+        missing = np.isnan(elev)
+        for code in catchments.code.values[missing]:
+            logger.warning(f"No rasterdata available for catchment {code}.")
+        self.greenhouse.add_nodes(gh_drr[~missing])
 
 
 class OpenwaterIO:
@@ -711,96 +394,215 @@ class OpenwaterIO:
             _type_: _description_
         """
         all_touched = False if zonalstats_alltouched is None else zonalstats_alltouched
+        drrmodel = self.openwater.drrmodel
 
-        lu_rast, lu_affine = self.openwater.drrmodel.read_raster(landuse, static=True)
-        lu_counts = zonal_stats(
-            catchments,
-            lu_rast,
-            affine=lu_affine,
-            categorical=True,
-            all_touched=all_touched,
-        )
+        ow_pixels = drrmodel.raster_counts(
+            catchments, landuse, [13], all_touched=all_touched
+        )[:, 0]
 
         # get raster cellsize
-        px_area = lu_affine[0] * -lu_affine[4]
+        px_area = _pixel_area(landuse)
 
-        ow_drr = ExtendedDataFrame(required_columns=["id"])
-        ow_drr.set_data(
-            pd.DataFrame(
-                np.zeros((len(catchments), 6)),
-                columns=["id", "area", "meteo_area", "px", "py", "boundary_node"],
-                dtype="str",
-            ),
-            index_col="id",
-        )
-        ow_drr.index = catchments.code
-        for num, cat in enumerate(catchments.itertuples()):
-            # find corresponding meteo-station
-            tm = [
-                m
-                for m in meteo_areas.itertuples()
-                if m.geometry.contains(cat.geometry.centroid)
-            ]
-            ms = meteo_areas.iloc[0, :][0] if tm == [] else tm[0].code
-
-            ow_drr.at[cat.code, "id"] = str(cat.code)
-            ow_drr.at[cat.code, "area"] = (
-                str(lu_counts[num][13] * px_area) if 13 in lu_counts[num] else "0"
-            )
-            ow_drr.at[cat.code, "meteo_area"] = str(ms)
-            ow_drr.at[cat.code, "px"] = f"{cat.geometry.centroid.coords[0][0]-20:.0f}"
-            ow_drr.at[cat.code, "py"] = f"{cat.geometry.centroid.coords[0][1]:.0f}"
-            ow_drr.at[cat.code, "boundary_node"] = cat.lateraleknoopcode
-        [self.openwater.add_openwater(**ow) for ow in ow_drr.to_dict("records")]
+        centroids = catchments.geometry.centroid
+        ow_drr = pd.DataFrame(index=catchments.code.values)
+        ow_drr["area"] = ow_pixels * px_area
+        ow_drr["meteo_area"] = drrmodel.meteo_area_codes(
+            catchments, meteo_areas
+        ).astype(str)
+        ow_drr["px"] = centroids.x.values - 20.0
+        ow_drr["py"] = centroids.y.values
+        ow_drr["boundary_node"] = catchments.lateraleknoopcode.astype(str).values
+        self.openwater.add_nodes(ow_drr)
 
 
 class ExternalForcingsIO:
     def __init__(self, external_forcings):
         self.external_forcings = external_forcings
 
+    def _meteo_files(self, folder: Union[Path, str], time_window: tuple = None) -> list:
+        """Time and path of every raster (or IDF file) in a meteo folder, sorted by time.
+        The time is parsed from the filename, or from the header of IDF files. With a
+        time window (start, end), only the files within the window are kept."""
+        files = []
+        for file in os.listdir(folder):
+            path = os.path.join(folder, file)
+            if file.endswith(".idf"):
+                time = idfreader.header(path, pattern=None)["time"]
+            else:
+                time = raster_time(path)
+            files.append((time, path))
+        if time_window is not None:
+            start, end = (pd.Timestamp(t) for t in time_window)
+            files = [(time, path) for time, path in files if start <= time <= end]
+        return sorted(files)
+
+    def _read_meteo_file(self, path: str) -> tuple:
+        if path.endswith(".idf"):
+            dataset = idfreader.open(path)
+            array = dataset[0, 0, :, :].values
+            header = idfreader.header(path, pattern=None)
+            affine = from_origin(
+                header["xmin"], header["ymax"], header["dx"], header["dx"]
+            )
+            return array, affine
+        return self.external_forcings.drrmodel.read_raster(path, static=True, cache=False)
+
+    def _read_meteo_folder(
+        self,
+        folder: Union[Path, str],
+        max_workers: int = None,
+        prefetch: int = 64,
+        time_window: tuple = None,
+    ):
+        """Generator with the time, array and affine of every raster in a meteo folder, in
+        order of time. The rasters are read and decoded ahead in a thread pool, with at
+        most prefetch rasters waiting, so the memory use is bounded.
+
+        Args:
+            folder (str): folder with rasters (or IDF files) per time step
+            max_workers (int, optional): number of reading threads. Defaults to None (the ThreadPoolExecutor default).
+            prefetch (int, optional): maximum number of rasters read ahead. Defaults to 64.
+            time_window (tuple, optional): start and end time of the rasters that are read. Defaults to None.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for time, path in self._meteo_files(folder, time_window):
+                pending.append((time, executor.submit(self._read_meteo_file, path)))
+                if len(pending) > prefetch:
+                    ready_time, future = pending.popleft()
+                    yield (ready_time, *future.result())
+            while pending:
+                ready_time, future = pending.popleft()
+                yield (ready_time, *future.result())
+
+    def _read_meteo_cube(
+        self,
+        path: Union[Path, str],
+        variable: str = None,
+        time_window: tuple = None,
+        chunksize: int = 64,
+    ):
+        """Generator with the time, array and affine of the time slices of a NetCDF (or
+        Zarr) cube with dimensions (time, y, x), such as the KNMI radar archive. The cube
+        is opened lazily and read per chunk of time slices. The areas should be in the
+        coordinate system of the cube.
+
+        Args:
+            path (str): NetCDF file, or Zarr store (a path ending with .zarr, requires zarr)
+            variable (str, optional): variable with the meteo data. Defaults to None, the only three-dimensional variable.
+            time_window (tuple, optional): start and end time of the slices that are read. Defaults to None.
+            chunksize (int, optional): number of time slices that are read at once. Defaults to 64.
+        """
+        engine = "zarr" if str(path).rstrip("/").endswith(".zarr") else None
+        with xr.open_dataset(path, engine=engine) as ds:
+            if variable is None:
+                variables = [name for name, var in ds.data_vars.items() if var.ndim == 3]
+                if len(variables) != 1:
+                    raise ValueError(
+                        f"Specify the variable of the meteo cube, got {variables}."
+                    )
+                variable = variables[0]
+            data = ds[variable]
+            tdim, ydim, xdim = data.dims
+            if time_window is not None:
+                data = data.sel({tdim: slice(*time_window)})
+
+            x, y = data[xdim].values, data[ydim].values
+            dx = (x[-1] - x[0]) / (len(x) - 1)
+            dy = (y[-1] - y[0]) / (len(y) - 1)
+            affine = Affine(dx, 0.0, x[0] - dx / 2, 0.0, dy, y[0] - dy / 2)
+
+            times = pd.DatetimeIndex(data[tdim].values)
+            for i in range(0, len(times), chunksize):
+                block = data.isel({tdim: slice(i, i + chunksize)}).values
+                for time, array in zip(times[i : i + chunksize], block):
+                    yield time, array, affine
+
+    def _meteo_frames(
+        self,
+        folder: Union[Path, str],
+        cube: Union[Path, str],
+        cube_variable: str,
+        time_window: tuple,
+        chunksize: int,
+        max_workers: int,
+    ):
+        """Frames (time, array, affine) from a meteo cube if given, else from a folder"""
+        if cube is not None:
+            return self._read_meteo_cube(cube, cube_variable, time_window, chunksize)
+        return self._read_meteo_folder(folder, max_workers, chunksize, time_window)
+
+    def _meteo_means(
+        self, areas: ExtendedGeoDataFrame, frames, chunksize: int, **kwargs
+    ) -> tuple:
+        """Mean of a series of meteo rasters per area. Consecutive rasters on the same
+        grid are stacked in chunks, and each chunk is aggregated with a single product
+        with the (cached) zone index of the areas on that grid.
+
+        Args:
+            areas (ExtendedGeoDataFrame): areas for which the means are derived
+            frames (iterable): time, array and affine per raster
+            chunksize (int): maximum number of rasters per stack
+            **kwargs: passed to the progress bar
+
+        Returns:
+            tuple: times, array (times x areas) with means and the affine of the last raster
+        """
+        times, means, chunk, affine = [], [], [], None
+        for time, array, frame_affine in tqdm(frames, **kwargs):
+            if chunk and (
+                len(chunk) == chunksize
+                or frame_affine != affine
+                or array.shape != chunk[0].shape
+            ):
+                means.append(self._stack_means(areas, chunk, affine))
+                chunk = []
+            affine = frame_affine
+            chunk.append(array)
+            times.append(time)
+        if chunk:
+            means.append(self._stack_means(areas, chunk, affine))
+        arr = np.vstack(means) if means else np.zeros((0, len(areas)))
+        return times, arr, affine
+
+    def _stack_means(self, areas: ExtendedGeoDataFrame, chunk: list, affine) -> np.ndarray:
+        index = self.external_forcings.drrmodel.zone_index(
+            areas, affine, chunk[0].shape, all_touched=True
+        )
+        return index.mean(np.stack(chunk), nodata=-999).T
+
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     def seepage_from_input(
-        self, catchments: ExtendedGeoDataFrame, seepage_folder: Union[Path, str]
+        self,
+        catchments: ExtendedGeoDataFrame,
+        seepage_folder: Union[Path, str],
+        chunksize: int = 64,
+        max_workers: int = None,
     ) -> None:
         """Perform zonal statistics to derive seepage time series per catchment. Time steps are derived from the data
 
         Args:
             catchments (ExtendedGeoDataFrame): catchment areas
             seepage_folder (str): folder where the seepage rasters are stored
+            chunksize (int, optional): number of rasters that are aggregated at once. Defaults to 64.
+            max_workers (int, optional): number of threads that read the rasters. Defaults to None.
         """
-        warnings.filterwarnings("ignore")        
+        warnings.filterwarnings("ignore")
         file_list = os.listdir(seepage_folder)
-        file_list = [file for file in file_list if file.lower()]        
-        times = []
-        convert_units=False
-        arr = np.zeros((len(file_list), len(catchments.code)))
-        for ifile, file in tqdm(
-            enumerate(file_list), total=len(file_list), desc="Reading seepage files"
-        ):
-            if file.endswith('.idf'):
-                dataset = idfreader.open(os.path.join(seepage_folder, file))                
-                array = dataset[0, 0, :, :].values
-                header = idfreader.header(os.path.join(seepage_folder, file), pattern=None)
-                affine = from_origin(
-                    header["xmin"], header["ymax"], header["dx"], header["dx"]
-                )
-                time = header['time']
-                convert_units=True
-            else:
-                array, affine, time = self.external_forcings.drrmodel.read_raster(
-                    os.path.join(seepage_folder, file)
-                )
-            times.append(time)
-            stats = zonal_stats(
-                catchments, array, affine=affine, stats="mean", all_touched=True
-            )
-            arr[ifile, :] = [s["mean"] for s in stats]
+        # if an NHI model (IDF files) is used, convert units from m3 to mm/d
+        convert_units = any(file.endswith(".idf") for file in file_list)
+        times, arr, affine = self._meteo_means(
+            catchments,
+            self._read_meteo_folder(seepage_folder, max_workers, chunksize),
+            chunksize,
+            total=len(file_list),
+            desc="Reading seepage files",
+        )
         result = pd.DataFrame(
             arr, columns=["sep_" + str(cat) for cat in catchments.code]
         )
         result.index = times
         if convert_units:
-            # if an NHI model (IDF files) is used, convert units from m3 to mm/d
             result = (result / (1e-3 * (affine[0] * -affine[4]))) / (
                     (times[2] - times[1]).total_seconds() / 86400.0
             )
@@ -813,6 +615,11 @@ class ExternalForcingsIO:
         areas: ExtendedGeoDataFrame,
         precip_folder: Union[Path, str] = None,
         precip_file: Union[Path, str] = None,
+        chunksize: int = 64,
+        max_workers: int = None,
+        precip_cube: Union[Path, str] = None,
+        cube_variable: str = None,
+        time_window: tuple = None,
     ) -> None:
         """Create time series of precipitation for every meteo_area, based on zonal statistics from rasters.
 
@@ -820,25 +627,27 @@ class ExternalForcingsIO:
             areas (ExtendedGeoDataFrame): meteo areas for which time series are created
             precip_folder (str, optional): folder where precipitation rasters are stored. Only used if no precip_file is given. Defaults to None.
             precip_file (str, optional): existing meteo-file, which is used if available.
+            chunksize (int, optional): number of rasters that are aggregated at once. Defaults to 64.
+            max_workers (int, optional): number of threads that read the rasters. Defaults to None.
+            precip_cube (str, optional): NetCDF (or Zarr) cube with precipitation (time, y, x), used instead of the folder if given. Defaults to None.
+            cube_variable (str, optional): variable in the cube. Defaults to None, the only three-dimensional variable.
+            time_window (tuple, optional): start and end time of the time series. Defaults to None, all times.
         """
         if precip_file is None:
             warnings.filterwarnings("ignore")
-            file_list = os.listdir(precip_folder)
-            times = []
-            arr = np.zeros((len(file_list), len(areas.code)))
-            for ifile, file in tqdm(
-                enumerate(file_list),
-                total=len(file_list),
+            times, arr, _ = self._meteo_means(
+                areas,
+                self._meteo_frames(
+                    precip_folder,
+                    precip_cube,
+                    cube_variable,
+                    time_window,
+                    chunksize,
+                    max_workers,
+                ),
+                chunksize,
                 desc="Reading precipitation files",
-            ):
-                array, affine, time = self.external_forcings.drrmodel.read_raster(
-                    os.path.join(precip_folder, file)
-                )
-                times.append(time)
-                stats = zonal_stats(
-                    areas, array, affine=affine, stats="mean", all_touched=True
-                )
-                arr[ifile, :] = [s["mean"] for s in stats]
+            )
             result = pd.DataFrame(
                 arr, columns=["ms_" + str(area) for area in areas.code]
             )
@@ -853,6 +662,11 @@ class ExternalForcingsIO:
         areas: ExtendedGeoDataFrame,
         evap_folder: Union[Path, str] = None,
         evap_file: Union[Path, str] = None,
+        chunksize: int = 64,
+        max_workers: int = None,
+        evap_cube: Union[Path, str] = None,
+        cube_variable: str = None,
+        time_window: tuple = None,
     ) -> None:
         """Create time series of evaporation for every meteo_area, based on zonal statistics from rasters.
 
@@ -860,28 +674,27 @@ class ExternalForcingsIO:
             areas (ExtendedGeoDataFrame): meteo areas for which time series are created
             evap_folder (str, optional): folder where precipitation rasters are stored. Only used if no precip_file is given. Defaults to None.
             evap_file (str, optional): existing meteo-file, which is used if available.
+            chunksize (int, optional): number of rasters that are aggregated at once. Defaults to 64.
+            max_workers (int, optional): number of threads that read the rasters. Defaults to None.
+            evap_cube (str, optional): NetCDF (or Zarr) cube with evaporation (time, y, x), used instead of the folder if given. Defaults to None.
+            cube_variable (str, optional): variable in the cube. Defaults to None, the only three-dimensional variable.
+            time_window (tuple, optional): start and end time of the time series. Defaults to None, all times.
         """
         if evap_file is None:
             warnings.filterwarnings("ignore")
-            file_list = os.listdir(evap_folder)
-            # aggregated evap
-            # areas['dissolve'] = 1
-            # agg_areas = areas.iloc[0:len(areas),:].dissolve(by='dissolve',aggfunc='mean')
-            times = []
-            arr = np.zeros((len(file_list), len(areas)))
-            for ifile, file in tqdm(
-                enumerate(file_list),
-                total=len(file_list),
+            times, arr, _ = self._meteo_means(
+                areas,
+                self._meteo_frames(
+                    evap_folder,
+                    evap_cube,
+                    cube_variable,
+                    time_window,
+                    chunksize,
+                    max_workers,
+                ),
+                chunksize,
                 desc="Reading evaporation files",
-            ):
-                array, affine, time = self.external_forcings.drrmodel.read_raster(
-                    os.path.join(evap_folder, file)
-                )
-                times.append(time)
-                stats = zonal_stats(
-                    areas, array, affine=affine, stats="mean", all_touched=True
-                )
-                arr[ifile, :] = [s["mean"] for s in stats]
+            )
             result = pd.DataFrame(
                 arr, columns=["ms_" + str(area) for area in areas.code]
             )
@@ -908,33 +721,17 @@ class ExternalForcingsIO:
 
         """
         # find the catchments that have no area attached and no nodes that will be attached to the boundary
+        occurring = set()
+        for nodes in [
+            drrmodel.unpaved.active_nodes(),
+            drrmodel.paved.active_nodes(),
+            drrmodel.greenhouse.active_nodes(),
+            drrmodel.openwater.active_nodes(),
+        ]:
+            occurring.update(nodes["boundary_node"])
         not_occurring = []
         for cat in catchments.itertuples():
-            occurs = False
-            if cat.lateraleknoopcode in [
-                val["boundary_node"]
-                for val in drrmodel.unpaved.unp_nodes.values()
-                if np.sum([float(d) for d in val["ar"].split(" ")]) > 0.0
-            ]:
-                occurs = True
-            if cat.lateraleknoopcode in [
-                val["boundary_node"]
-                for val in drrmodel.paved.pav_nodes.values()
-                if float(val["ar"]) > 0.0
-            ]:
-                occurs = True
-            if cat.lateraleknoopcode in [
-                val["boundary_node"]
-                for val in drrmodel.greenhouse.gh_nodes.values()
-                if float(val["ar"]) > 0.0
-            ]:
-                occurs = True
-            if cat.lateraleknoopcode in [
-                val["boundary_node"]
-                for val in drrmodel.openwater.ow_nodes.values()
-                if float(val["ar"]) > 0.0
-            ]:
-                occurs = True
+            occurs = str(cat.lateraleknoopcode) in occurring
             if occurs == False:
                 not_occurring.append(cat.lateraleknoopcode)
 
@@ -1,5 +1,4 @@
 # coding: latin-1
-import csv
 import datetime
 import logging
 import os
@@ -11,6 +10,7 @@ import pandas as pd
 from shapely.geometry import LineString, Point, box
 
 from hydrolib.dhydamo.core.hydamo import HyDAMO
+from hydrolib.dhydamo.core.profiling import profiled
 
 # from delft3dfmpy.core.geometry import orthogonal_line
 
@@ -18,6 +18,50 @@ from hydrolib.dhydamo.core.hydamo import HyDAMO
 logger = logging.getLogger(__name__)
 
 
+def _str(values) -> np.ndarray:
+    """Column as an array of str objects, numbers in their shortest representation"""
+    return np.asarray(values).astype(str).astype(object)
+
+
+def _fmt(values, spec: str) -> np.ndarray:
+    """Column of numbers formatted with a %-format, as an array of str objects"""
+    return np.char.mod(spec, np.asarray(values, dtype=float)).astype(object)
+
+
+def _ids(prefix: str, nodes: pd.DataFrame) -> np.ndarray:
+    """RR ids of the nodes in a node table"""
+    return prefix + _str(nodes.index)
+
+
+def _layers(values: pd.Series) -> np.ndarray:
+    """Space separated values per layer, formatted once per distinct set of layers"""
+    formatted = {layers: " ".join(map(str, layers)) for layers in set(values)}
+    return np.array([formatted[layers] for layers in values], dtype=object)
+
+
+def _write_lines(filepath: str, blocks: list) -> None:
+    """Write blocks (arrays or lists) of lines to a file, in a single buffered write"""
+    with open(filepath, "w") as f:
+        f.write("".join("".join(block) for block in blocks))
+
+
+def _write_rows(f, values: np.ndarray, chunksize: int, prefix: str = "") -> None:
+    """Stream a 2-D array of values to a file, with a fixed float format, in blocks of rows
+
+    The first columns can be formatted with a prefix (e.g. "%d %d %d " for dates),
+    the other columns are written as %.3f. Missing values are written as 0.
+    """
+    if np.isnan(values).any():
+        logger.warning("Missing meteo values are written as 0.")
+        values = np.nan_to_num(values, nan=0.0)
+    ncols = values.shape[1] - prefix.count("%")
+    row = prefix + " ".join(["%.3f"] * ncols) + "\n"
+    for start in range(0, len(values), chunksize):
+        block = values[start : start + chunksize]
+        # one format operation per block of rows
+        f.write((row * len(block)) % tuple(block.ravel()))
+
+
 class DRRWriter:
     """Writer for RR files"""
 
@@ -43,6 +87,7 @@ class DRRWriter:
         else:
             self.wwtp = Point((wwtp[0], wwtp[1]))
 
+    @profiled()
     def write_all(self):  # write all RR files
         """
         Wrapper method to write all components
@@ -81,6 +126,7 @@ class DRRWriter:
         shutil.copytree(srcRR, targetRR)
         return True
 
+    @profiled()
     def write_topology(self):
         """
         Wrapper to write the topolgy files for RR. The following files are written:
@@ -93,189 +139,94 @@ class DRRWriter:
         None.
 
         """
-        filepath = os.path.join(self.output_dir, "3B_NOD.TP")
-        with open(filepath, "w") as f:
-
-            # Unpaved nodes
-            if any(self.rrmodel.unpaved.unp_nodes):
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        f.write(
-                            "NODE id '"
-                            + dct["id"]
-                            + "' nm '"
-                            + dct["id"]
-                            + "' ri '-1' mt 1 '2' nt 44 ObID '3B_UNPAVED' px "
-                            + dct["px"]
-                            + " py "
-                            + dct["py"]
-                            + " node\n"
-                        )
-
-            # Paved nodes
-            if any(self.rrmodel.paved.pav_nodes):
-                for _, dct in self.rrmodel.paved.pav_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "NODE id '"
-                            + dct["id"]
-                            + "' nm '"
-                            + dct["id"]
-                            + "' ri '-1' mt 1 '1' nt 43 ObID '3B_PAVED' px "
-                            + dct["px"]
-                            + " py "
-                            + dct["py"]
-                            + " node\n"
-                        )
-
-                f.write(
-                    "NODE id 'WWTP' nm 'WWTP' ri '-1' mt 1 '14' nt 56 ObID '3B_WWTP' px "
-                    + str(self.wwtp.coords[0][0])
-                    + " py "
-                    + str(self.wwtp.coords[0][1])
-                    + " node\n"
-                )
-                f.write(
-                    "NODE id 'WWTP_BND' nm 'WWTP_BND' ri '-1' mt 1 '6' nt 47 ObID '3B_BOUNDARY' px "
-                    + str(self.wwtp.coords[0][0] + 50.0)
-                    + " py "
-                    + str(self.wwtp.coords[0][1] + 50.0)
-                    + " node\n"
-                )
-
-            # Greenhouse nodes
-            if any(self.rrmodel.greenhouse.gh_nodes):
-                for _, dct in self.rrmodel.greenhouse.gh_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "NODE id '"
-                            + dct["id"]
-                            + "' nm '"
-                            + dct["id"]
-                            + "' ri '-1' mt 1 '3' nt 45 ObID '3B_GREENHOUSE' px "
-                            + dct["px"]
-                            + " py "
-                            + dct["py"]
-                            + " node\n"
-                        )
-
-            # Openwater nodes
-            if any(self.rrmodel.openwater.ow_nodes):
-                for _, dct in self.rrmodel.openwater.ow_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "NODE id '"
-                            + dct["id"]
-                            + "' nm '"
-                            + dct["id"]
-                            + "' ri '-1' mt 1 '21' nt 46 ObID 'OW_PRECIP' px "
-                            + dct["px"]
-                            + " py "
-                            + dct["py"]
-                            + " node\n"
-                        )
-
-            # Boundary_nodes
-            if any(self.rrmodel.external_forcings.boundary_nodes):
-                for _, dct in self.rrmodel.external_forcings.boundary_nodes.items():
-                    f.write(
-                        "NODE id '"
-                        + dct["id"]
-                        + "' nm '"
-                        + dct["id"]
-                        + "' ri '-1' mt 1 '6' nt 78 ObID 'SBK_SBK-3B-NODE' px "
-                        + dct["px"]
-                        + " py "
-                        + dct["py"]
-                        + " node\n"
-                    )
-
-        filepath = os.path.join(self.output_dir, "3B_LINK.TP")
-        with open(filepath, "w") as f:
-
-            cnt = 0
-            if any(self.rrmodel.unpaved.unp_nodes):
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        cnt += 1
-                        f.write(
-                            "BRCH id 'link_"
-                            + str(cnt)
-                            + "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn '"
-                            + dct["id"]
-                            + "' en '"
-                            + dct["boundary_node"]
-                            + "' brch\n"
-                        )
-            if any(self.rrmodel.paved.pav_nodes):
-                for _, dct in self.rrmodel.paved.pav_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        cnt += 1
-                        f.write(
-                            "BRCH id 'link_"
-                            + str(cnt)
-                            + "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn '"
-                            + dct["id"]
-                            + "' en '"
-                            + dct["boundary_node"]
-                            + "' brch\n"
-                        )
-                        cnt += 1
-                        f.write(
-                            "BRCH id 'link_"
-                            + str(cnt)
-                            + "' ri '-1' mt 1 '1' bt 18 ObID '3B_LINK_RWZI' bn '"
-                            + dct["id"]
-                            + "' en 'WWTP' brch\n"
-                        )
-                cnt += 1
-                f.write(
-                    "BRCH id 'link_"
-                    + str(cnt)
-                    + "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn 'WWTP' en 'WWTP_BND' brch\n"
-                )
+        unpaved = self.rrmodel.unpaved.active_nodes()
+        paved = self.rrmodel.paved.active_nodes()
+        greenhouse = self.rrmodel.greenhouse.active_nodes()
+        openwater = self.rrmodel.openwater.active_nodes()
+        has_paved = not self.rrmodel.paved.nodes.empty
+        boundaries = list(self.rrmodel.external_forcings.boundary_nodes.values())
+
+        def node_lines(ids, nodes, obj):
+            return (
+                "NODE id '" + ids + "' nm '" + ids + obj + " px "
+                + _fmt(nodes["px"], "%.0f") + " py " + _fmt(nodes["py"], "%.0f")
+                + " node\n"
+            )
 
-            if any(self.rrmodel.greenhouse.gh_nodes):
-                for _, dct in self.rrmodel.greenhouse.gh_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        cnt += 1
-                        f.write(
-                            "BRCH id 'link_"
-                            + str(cnt)
-                            + "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn '"
-                            + dct["id"]
-                            + "' en '"
-                            + dct["boundary_node"]
-                            + "' brch\n"
-                        )
-            if any(self.rrmodel.openwater.ow_nodes):
-                for _, dct in self.rrmodel.openwater.ow_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        cnt += 1
-                        f.write(
-                            "BRCH id 'link_"
-                            + str(cnt)
-                            + "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn '"
-                            + dct["id"]
-                            + "' en '"
-                            + dct["boundary_node"]
-                            + "' brch\n"
-                        )
+        lines = [
+            node_lines(
+                _ids("unp_", unpaved), unpaved, "' ri '-1' mt 1 '2' nt 44 ObID '3B_UNPAVED'"
+            ),
+            node_lines(
+                _ids("pav_", paved), paved, "' ri '-1' mt 1 '1' nt 43 ObID '3B_PAVED'"
+            ),
+        ]
+        if has_paved:
+            x, y = self.wwtp.coords[0]
+            lines.append(
+                [
+                    f"NODE id 'WWTP' nm 'WWTP' ri '-1' mt 1 '14' nt 56 ObID '3B_WWTP' px {x} py {y} node\n",
+                    f"NODE id 'WWTP_BND' nm 'WWTP_BND' ri '-1' mt 1 '6' nt 47 ObID '3B_BOUNDARY' px {x + 50.0} py {y + 50.0} node\n",
+                ]
+            )
+        lines += [
+            node_lines(
+                _ids("gh_", greenhouse), greenhouse, "' ri '-1' mt 1 '3' nt 45 ObID '3B_GREENHOUSE'"
+            ),
+            node_lines(
+                _ids("ow_", openwater), openwater, "' ri '-1' mt 1 '21' nt 46 ObID 'OW_PRECIP'"
+            ),
+            [
+                f"NODE id '{dct['id']}' nm '{dct['id']}' ri '-1' mt 1 '6' nt 78 ObID 'SBK_SBK-3B-NODE' px {dct['px']} py {dct['py']} node\n"
+                for dct in boundaries
+            ],
+        ]
+        _write_lines(os.path.join(self.output_dir, "3B_NOD.TP"), lines)
+
+        # links from every node to its boundary, and from the paved nodes to the WWTP
+        link = "' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn '"
+        link_rwzi = "' ri '-1' mt 1 '1' bt 18 ObID '3B_LINK_RWZI' bn '"
+        heads, begins, ends = [], [], []
+
+        def add_links(head, ids, boundaries):
+            heads.append(np.full(len(ids), head, dtype=object))
+            begins.append(ids)
+            ends.append(boundaries)
+
+        add_links(link, _ids("unp_", unpaved), _str(unpaved["boundary_node"]))
+        # two links per paved node: to its boundary and to the WWTP
+        add_links(
+            np.tile([link, link_rwzi], len(paved)),
+            np.repeat(_ids("pav_", paved), 2),
+            np.column_stack(
+                [_str(paved["boundary_node"]), np.full(len(paved), "WWTP", dtype=object)]
+            ).ravel(),
+        )
+        if has_paved:
+            add_links(link, np.array(["WWTP"], dtype=object), np.array(["WWTP_BND"], dtype=object))
+        add_links(link, _ids("gh_", greenhouse), _str(greenhouse["boundary_node"]))
+        add_links(link, _ids("ow_", openwater), _str(openwater["boundary_node"]))
+        heads, begins, ends = (
+            np.concatenate(arrs).astype(object) for arrs in (heads, begins, ends)
+        )
+        numbers = _str(np.arange(1, len(heads) + 1))
+        _write_lines(
+            os.path.join(self.output_dir, "3B_LINK.TP"),
+            ["BRCH id 'link_" + numbers + heads + begins + "' en '" + ends + "' brch\n"],
+        )
 
         # bound3b.3b
-        filepath = os.path.join(self.output_dir, "Bound3B.3B")
-        with open(filepath, "w") as f:
-            for _, dct in self.rrmodel.external_forcings.boundary_nodes.items():
-                f.write("BOUN id '" + dct["id"] + "' bl 2 '0' is 0 boun\n")
-            if any(self.rrmodel.paved.pav_nodes):
-                f.write("BOUN id 'WWTP_BND' bl 0 -3 is 0 boun\n")
+        lines = [f"BOUN id '{dct['id']}' bl 2 '0' is 0 boun\n" for dct in boundaries]
+        if has_paved:
+            lines.append("BOUN id 'WWTP_BND' bl 0 -3 is 0 boun\n")
+        _write_lines(os.path.join(self.output_dir, "Bound3B.3B"), [lines])
 
         # BoundaryConditions.bc
         filepath = os.path.join(self.output_dir, "BoundaryConditions.bc")
         header = {"fileVersion": "1.01", "fileType": "boundConds"}
         with open(filepath, "w") as f:
             self._write_dict(f, header, "General", "\n")
-            for _, dct in self.rrmodel.external_forcings.boundary_nodes.items():
+            for dct in boundaries:
                 temp = {
                     "name": "" + dct["id"],
                     "function": "constant",
@@ -283,7 +234,7 @@ class DRRWriter:
                     "unit": "m",
                 }
                 self._write_dict(f, temp, "Boundary", "    0\n\n")
-            if any(self.rrmodel.paved.pav_nodes):
+            if has_paved:
                 temp = {
                     "name": "WWTP_BND",
                     "function": "constant",
@@ -292,6 +243,7 @@ class DRRWriter:
                 }
                 self._write_dict(f, temp, "Boundary", "    0\n\n")
 
+    @profiled()
     def write_unpaved(self):
         """
         Method to write all files associated with unpaved nodes: UNPAVED.3B, UNPAVED.ALF, UNPAVED.STO, UNPAVED.INF and UNPAVED.SEP. All files contain a definition for every node  because they may or may not be spatially distributed.
@@ -301,130 +253,77 @@ class DRRWriter:
         None.
 
         """
-        if any(self.rrmodel.unpaved.unp_nodes):
-            filepath = os.path.join(self.output_dir, "UNPAVED.3B")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        f.write(
-                            "UNPV id '"
-                            + dct["id"]
-                            + "' na "
-                            + dct["na"]
-                            + " ga "
-                            + dct["ga"]
-                            + " ar "
-                            + dct["ar"]
-                            + " lv "
-                            + dct["lv"]
-                            + " co "
-                            + dct["co"]
-                            + " su "
-                            + dct["su"]
-                            + " sd 'sto_"
-                            + dct["id"]
-                            + "' ic 'inf_"
-                            + dct["id"]
-                            + "' bt "
-                            + dct["bt"]
-                            + " ed '"
-                            + dct["ed"]
-                            + "' sp '"
-                            + dct["sp"]
-                            + "' ig 0 "
-                            + dct["ig"]
-                            + " mg "
-                            + dct["mg"]
-                            + " gl "
-                            + dct["gl"]
-                            + " is "
-                            + dct["is"]
-                            + " ms '"
-                            + dct["ms"]
-                            + "' unpv\n"
-                        )
-
-            filepath = os.path.join(self.output_dir, "UNPAVED.STO")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        f.write(
-                            "STDF id 'sto_"
-                            + dct["id"]
-                            + "' nm 'sto_"
-                            + dct["id"]
-                            + "' ml "
-                            + dct["sd"]
-                            + " il 0 stdf\n"
-                        )
-
-            filepath = os.path.join(self.output_dir, "UNPAVED.INF")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        f.write(
-                            "INFC id 'inf_"
-                            + dct["id"]
-                            + "' nm 'inf_"
-                            + dct["id"]
-                            + "' ic "
-                            + dct["ic"]
-                            + " infc\n"
-                        )
-
-            filepath = os.path.join(self.output_dir, "UNPAVED.ALF")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.unpaved.ernst_defs.items():
-                    if (
-                        np.sum(
-                            [
-                                float(d)
-                                for d in self.rrmodel.unpaved.unp_nodes[_]["ar"].split(
-                                    " "
-                                )
-                            ]
-                        )
-                        > 0.0
-                    ):
-                        f.write(
-                            "ERNS id '"
-                            + dct["id"]
-                            + "' nm '"
-                            + dct["id"]
-                            + "' cvi "
-                            + dct["cvi"]
-                            + " cvo 0 "
-                            + dct["cvo"]
-                            + " cvs "
-                            + dct["cvs"]
-                            + " lv "
-                            + dct["lv"]
-                            + " erns\n"
-                        )
-
-            filepath = os.path.join(self.output_dir, "UNPAVED.SEP")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.unpaved.unp_nodes.items():
-                    if np.sum([float(d) for d in dct["ar"].split(" ")]) > 0.0:
-                        f.write(
-                            "SEEP id '"
-                            + dct["sp"]
-                            + "' nm '"
-                            + dct["sp"]
-                            + "' co 4 PDIN 0 0 pdin ss 0\n"
-                        )
-                        f.write("TBLE\n")
-                        for row in self.rrmodel.external_forcings.seepage[dct["sp"]][
-                            "seepage"
-                        ].items():
-                            f.write(
-                                "'"
-                                + row[0].strftime("%Y/%m/%d;%H:%M:%S")
-                                + "' "
-                                + f"{row[1]:.5f} <\n"
-                            )
-                        f.write("tble\nseep\n")
+        if self.rrmodel.unpaved.nodes.empty:
+            return
+
+        nodes = self.rrmodel.unpaved.active_nodes()
+        codes = _str(nodes.index)
+        ids = "unp_" + codes
+        # land use areas in whole m2
+        lu_areas = np.trunc(nodes[self.rrmodel.unpaved.lu_columns].to_numpy())
+        ar = _fmt(lu_areas[:, 0], "%.0f")
+        for column in lu_areas.T[1:]:
+            ar = ar + " " + _fmt(column, "%.0f")
+        lv = _fmt(nodes["surface_level"], "%.2f")
+
+        _write_lines(
+            os.path.join(self.output_dir, "UNPAVED.3B"),
+            [
+                "UNPV id '" + ids + "' na 16 ga " + _fmt(nodes["total_area"], "%.0f")
+                + " ar " + ar + " lv " + lv + " co 3 su 0 sd 'sto_" + ids
+                + "' ic 'inf_" + ids + "' bt " + _fmt(nodes["soiltype"], "%.0f")
+                + " ed 'ernst_" + codes + "' sp 'sep_" + codes + "' ig 0 "
+                + _fmt(nodes["initial_gwd"], "%.2f") + " mg " + lv
+                + " gl 1.5 is 0 ms 'ms_" + _str(nodes["meteo_area"]) + "' unpv\n"
+            ],
+        )
+
+        _write_lines(
+            os.path.join(self.output_dir, "UNPAVED.STO"),
+            [
+                "STDF id 'sto_" + ids + "' nm 'sto_" + ids + "' ml "
+                + _fmt(nodes["surface_storage"], "%.3f") + " il 0 stdf\n"
+            ],
+        )
+
+        _write_lines(
+            os.path.join(self.output_dir, "UNPAVED.INF"),
+            [
+                "INFC id 'inf_" + ids + "' nm 'inf_" + ids + "' ic "
+                + _fmt(nodes["infiltration_capacity"], "%.3f") + " infc\n"
+            ],
+        )
+
+        ernst = self.rrmodel.unpaved.ernst
+        ernst = ernst[ernst.index.isin(nodes.index)]
+        ernst_ids = "ernst_" + _str(ernst.index)
+        _write_lines(
+            os.path.join(self.output_dir, "UNPAVED.ALF"),
+            [
+                "ERNS id '" + ernst_ids + "' nm '" + ernst_ids + "' cvi "
+                + _fmt(ernst["cvi"], "%.2f") + " cvo 0 " + _layers(ernst["cvo"])
+                + " cvs " + _fmt(ernst["cvs"], "%.2f") + " lv " + _layers(ernst["lv"])
+                + " erns\n"
+            ],
+        )
+
+        seepage = self.rrmodel.external_forcings.seepage
+        lines = []
+        index, times = None, None
+        for sp in "sep_" + codes:
+            series = seepage[sp]["seepage"]
+            # the formatted times are reused as long as the time index is the same
+            if index is None or not series.index.equals(index):
+                index = series.index
+                times = "'" + _str(index.strftime("%Y/%m/%d;%H:%M:%S")) + "' "
+            lines.append(
+                [f"SEEP id '{sp}' nm '{sp}' co 4 PDIN 0 0 pdin ss 0\n", "TBLE\n"]
+            )
+            lines.append(times + _fmt(series.to_numpy(), "%.5f") + " <\n")
+            lines.append(["tble\nseep\n"])
+        _write_lines(os.path.join(self.output_dir, "UNPAVED.SEP"), lines)
 
+    @profiled()
     def write_paved(self):
         """
         Method to write all files associated with paved nodes: PAVED.3B, PAVED.STO and PAVED.DWA. The latter contains only one definition.
@@ -434,50 +333,29 @@ class DRRWriter:
         None.
 
         """
-        if any(self.rrmodel.paved.pav_nodes):
-            filepath = os.path.join(self.output_dir, "PAVED.3B")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.paved.pav_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "PAVE id '"
-                            + dct["id"]
-                            + "' ar "
-                            + dct["ar"]
-                            + " lv "
-                            + dct["lv"]
-                            + " sd 'sto_"
-                            + dct["id"]
-                            + "' ss 0 qc 0 "
-                            + dct["qc"]
-                            + " 0 qo 2 2 ms '"
-                            + dct["ms"]
-                            + "' is "
-                            + dct["is"]
-                            + " np "
-                            + dct["np"]
-                            + " dw 'Def_DWA' ro "
-                            + dct["ro"]
-                            + " ru "
-                            + dct["ru"]
-                            + " qh '' pave\n"
-                        )
-
-            filepath = os.path.join(self.output_dir, "PAVED.STO")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.paved.pav_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "STDF id 'sto_"
-                            + dct["id"]
-                            + "' nm 'sto_"
-                            + dct["id"]
-                            + "' ms "
-                            + dct["strs"]
-                            + " is 0 mr "
-                            + dct["sews"]
-                            + " 0.0 ir 0.0 0.0 stdf\n"
-                        )
+        if not self.rrmodel.paved.nodes.empty:
+            nodes = self.rrmodel.paved.active_nodes()
+            ids = _ids("pav_", nodes)
+            _write_lines(
+                os.path.join(self.output_dir, "PAVED.3B"),
+                [
+                    "PAVE id '" + ids + "' ar " + _str(nodes["area"]) + " lv "
+                    + _fmt(nodes["surface_level"], "%.2f") + " sd 'sto_" + ids
+                    + "' ss 0 qc 0 " + _fmt(nodes["pump_capacity"], "%.8f")
+                    + " 0 qo 2 2 ms 'ms_" + _str(nodes["meteo_area"])
+                    + "' is 0 np 0 dw 'Def_DWA' ro 0 ru 0 qh '' pave\n"
+                ],
+            )
+
+            _write_lines(
+                os.path.join(self.output_dir, "PAVED.STO"),
+                [
+                    "STDF id 'sto_" + ids + "' nm 'sto_" + ids + "' ms "
+                    + _fmt(nodes["street_storage"], "%.2f") + " is 0 mr "
+                    + _fmt(nodes["sewer_storage"], "%.2f")
+                    + " 0.0 ir 0.0 0.0 stdf\n"
+                ],
+            )
 
             filepath = os.path.join(self.output_dir, "PAVED.DWA")
             with open(filepath, "w") as f:
@@ -493,6 +371,7 @@ class DRRWriter:
             with open(filepath, "w") as f:
                 f.write("\n")
 
+    @profiled()
     def write_greenhouse(self):
         """
         Method to write all files associated with greenhouse nodes: GREENHSE.3B, GREENHSE.RF and GREENHSE.SIL. The latter contains only one definition.
@@ -502,45 +381,32 @@ class DRRWriter:
         None.
 
         """
-        if any(self.rrmodel.greenhouse.gh_nodes):
-            filepath = os.path.join(self.output_dir, "GREENHSE.3B")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.greenhouse.gh_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "GRHS id '"
-                            + dct["id"]
-                            + "' na 10 ar 0 0 "
-                            + dct["ar"]
-                            + " 0 0 0 0 0 0 0 sl "
-                            + dct["sl"]
-                            + " as 0 si 'Def_silo' sd 'sto_"
-                            + dct["id"]
-                            + "' ms '"
-                            + dct["ms"]
-                            + "' is "
-                            + dct["is"]
-                            + " grhs\n"
-                        )
+        if not self.rrmodel.greenhouse.nodes.empty:
+            nodes = self.rrmodel.greenhouse.active_nodes()
+            ids = _ids("gh_", nodes)
+            _write_lines(
+                os.path.join(self.output_dir, "GREENHSE.3B"),
+                [
+                    "GRHS id '" + ids + "' na 10 ar 0 0 " + _str(nodes["area"])
+                    + " 0 0 0 0 0 0 0 sl " + _fmt(nodes["surface_level"], "%.2f")
+                    + " as 0 si 'Def_silo' sd 'sto_" + ids + "' ms 'ms_"
+                    + _str(nodes["meteo_area"]) + "' is 0 grhs\n"
+                ],
+            )
 
             filepath = os.path.join(self.output_dir, "GREENHSE.SIL")
             with open(filepath, "w") as f:
                 f.write("SILO id 'Def_silo' nm 'Def_silo' sc 0.0 pc 0.0 silo\n")
 
-            filepath = os.path.join(self.output_dir, "GREENHSE.RF")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.greenhouse.gh_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "STDF id 'sto_"
-                            + dct["id"]
-                            + "' nm 'sto_"
-                            + dct["id"]
-                            + "' mk "
-                            + dct["sd"]
-                            + " ik 0 stdf\n"
-                        )
+            _write_lines(
+                os.path.join(self.output_dir, "GREENHSE.RF"),
+                [
+                    "STDF id 'sto_" + ids + "' nm 'sto_" + ids + "' mk "
+                    + _fmt(nodes["roof_storage"], "%.2f") + " ik 0 stdf\n"
+                ],
+            )
 
+    @profiled()
     def write_openwater(self):
         """
          Method to write OPENWATE.3B file.
@@ -551,25 +417,30 @@ class DRRWriter:
 
         """
         # write openwater.3b
-        if any(self.rrmodel.openwater.ow_nodes):
-            filepath = os.path.join(self.output_dir, "OPENWATE.3B")
-            with open(filepath, "w") as f:
-                for _, dct in self.rrmodel.openwater.ow_nodes.items():
-                    if float(dct["ar"]) > 0.0:
-                        f.write(
-                            "OWRR id '"
-                            + dct["id"]
-                            + "' ar "
-                            + dct["ar"]
-                            + " ms '"
-                            + dct["ms"]
-                            + "' owrr\n"
-                        )
-
-    def write_meteo(self):
+        if not self.rrmodel.openwater.nodes.empty:
+            nodes = self.rrmodel.openwater.active_nodes()
+            _write_lines(
+                os.path.join(self.output_dir, "OPENWATE.3B"),
+                [
+                    "OWRR id '" + _ids("ow_", nodes) + "' ar " + _str(nodes["area"])
+                    + " ms 'ms_" + _str(nodes["meteo_area"]) + "' owrr\n"
+                ],
+            )
+
+    @profiled()
+    def write_meteo(self, chunksize: int = 10000):
         """
         Method to write meteofiles (DEFAULT.BUI and DEFAULT.EVP) based on values per catchment.
 
+        The value matrices are streamed to the files in blocks of rows, with a
+        fixed float format, so long series with many stations are written quickly
+        and identically on every platform.
+
+        Parameters
+        ----------
+        chunksize : int, optional
+            Number of time steps formatted and written at once. The default is 10000.
+
         Returns
         -------
         None.
@@ -580,82 +451,57 @@ class DRRWriter:
         if isinstance(self.rrmodel.external_forcings.precip, str):
             shutil.copy(self.rrmodel.external_forcings.precip, filepath)
         else:
-            df = {}
-            for ii, ms in enumerate(self.rrmodel.external_forcings.precip.items()):
-                df[ms[0]] = pd.Series(ms[1]["precip"])
-
-            f = open(filepath, "w")
-            f.write("*Name of this file: c:\\Result\\1058\\DEFAULT.BUI\n")
-            f.close()
-            f = open(filepath, "a")
-            f.write("*Date and time of construction: 00/00/2000 00:00:00.\n")
-            f.write("1\n")
-            f.write("*Aantal stations\n")
-            f.write(str(len(self.rrmodel.external_forcings.precip)) + "\n")
-            f.write("*Namen van stations\n")
-            for ms in self.rrmodel.external_forcings.precip.items():
-                f.write("'" + ms[0] + "'" + "\n")
-            f.write(
-                "*Aantal gebeurtenissen (omdat het 1 bui betreft is dit altijd 1)\n"
-            )
-            f.write("*en het aantal seconden per waarnemingstijdstap\n")
-            f.write(
-                f'1 {(ms[1]["precip"].index[1]-ms[1]["precip"].index[0]).total_seconds():.0f}\n'
-            )
-            f.write("*Elke commentaarregel wordt begonnen met een * (asterisk).\n")
-            f.write(
-                "*Eerste record bevat startdatum en -tijd, lengte van de gebeurtenis in dd hh mm ss\n"
-            )
-            f.write("*Het format is: yyyymmdd:hhmmss:ddhhmmss")
-            f.write("*Daarna voor elk station de neerslag in mm per tijdstap.\n")
-            duration = (
-                ms[1]["precip"].index[-1] - ms[1]["precip"].index[0]
-            ).total_seconds()
-            f.write(
-                ms[1]["precip"].index[0].strftime("%Y %#m %#d %#H %#M %#S ")
-                + str(int(duration / 86400.0))
-                + " "
-                + str(int(np.remainder(duration, 86400.0) / 3600.0))
-                + " 0 0\n"
-            )
-            f.close()
             self._dict_to_df()
-            self.precip_df.to_csv(
-                filepath,
-                header=False,
-                index=False,
-                sep=" ",
-                float_format="%.3f",
-                mode="a",
-            )
-        #%%
+            times = self.precip_df.index
+            timestep = (times[1] - times[0]).total_seconds() if len(times) > 1 else 0.0
+            duration = times[-1] - times[0]
+            with open(filepath, "w") as f:
+                f.write("*Name of this file: c:\\Result\\1058\\DEFAULT.BUI\n")
+                f.write("*Date and time of construction: 00/00/2000 00:00:00.\n")
+                f.write("1\n")
+                f.write("*Aantal stations\n")
+                f.write(f"{len(self.precip_df.columns)}\n")
+                f.write("*Namen van stations\n")
+                f.write("".join(f"'{ms}'\n" for ms in self.precip_df.columns))
+                f.write(
+                    "*Aantal gebeurtenissen (omdat het 1 bui betreft is dit altijd 1)\n"
+                )
+                f.write("*en het aantal seconden per waarnemingstijdstap\n")
+                f.write(f"1 {timestep:.0f}\n")
+                f.write("*Elke commentaarregel wordt begonnen met een * (asterisk).\n")
+                f.write(
+                    "*Eerste record bevat startdatum en -tijd, lengte van de gebeurtenis in dd hh mm ss\n"
+                )
+                f.write("*Het format is: yyyymmdd:hhmmss:ddhhmmss\n")
+                f.write("*Daarna voor elk station de neerslag in mm per tijdstap.\n")
+                start = times[0]
+                f.write(
+                    f"{start.year} {start.month} {start.day} {start.hour} {start.minute} {start.second} "
+                    f"{duration.components.days} {duration.components.hours} "
+                    f"{duration.components.minutes} {duration.components.seconds}\n"
+                )
+                _write_rows(f, self.precip_df.to_numpy(dtype=float), chunksize)
 
-        #%%%
         # evaporation
         filepath = os.path.join(self.output_dir, "DEFAULT.EVP")
         if isinstance(self.rrmodel.external_forcings.evap, str):
             shutil.copy(self.rrmodel.external_forcings.evap, filepath)
         else:
-            f = open(filepath, "w")
-            f.write("*Verdampingsfile\n")
-            f.write("*Meteo data: evaporation intensity in mm/day\n")
-            f.write("*First record: start date, data in mm/day\n")
-            f.write(
-                "*Datum (year month day), verdamping (mm/dag) voor elk weerstation\n"
-            )
-            f.write("*jaar maand dag verdamping[mm]\n")
-            f.close()
             table = list(self.rrmodel.external_forcings.evap.values())[0]["evap"]
-            table.sort_index().to_csv(
-                filepath,
-                float_format="%.3f",
-                date_format="%#Y  %#m  %#d ",
-                sep=" ",
-                header=False,
-                quoting=csv.QUOTE_NONE,
-                mode="a",
-                escapechar=" ",
+            table = table.sort_index()
+            dates = table.index
+            values = np.column_stack(
+                [dates.year, dates.month, dates.day, table.to_numpy(dtype=float)]
             )
+            with open(filepath, "w") as f:
+                f.write("*Verdampingsfile\n")
+                f.write("*Meteo data: evaporation intensity in mm/day\n")
+                f.write("*First record: start date, data in mm/day\n")
+                f.write(
+                    "*Datum (year month day), verdamping (mm/dag) voor elk weerstation\n"
+                )
+                f.write("*jaar maand dag verdamping[mm]\n")
+                _write_rows(f, values, chunksize, prefix="%d %d %d ")
 
     def _dict_to_df(self):
         """
@@ -665,10 +511,12 @@ class DRRWriter:
         None.
 
         """
-        df = {}
-        for ii, stat in enumerate(self.rrmodel.external_forcings.precip.items()):
-            df[stat[0]] = pd.Series(stat[1]["precip"])
-        self.precip_df = pd.DataFrame(df)
+        self.precip_df = pd.DataFrame(
+            {
+                ms: pd.Series(dct["precip"])
+                for ms, dct in self.rrmodel.external_forcings.precip.items()
+            }
+        ).sort_index()
 
     def _write_dict(self, f, dct, header, endline):
         """
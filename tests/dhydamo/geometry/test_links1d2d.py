@@ -0,0 +1,77 @@
+import sys
+from types import SimpleNamespace
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from scipy.spatial import KDTree
+from shapely.geometry import LineString, Polygon
+
+sys.path.append(".")
+from hydrolib.dhydamo.geometry.gridgeom import geometry
+from hydrolib.dhydamo.geometry.gridgeom.links1d2d import Links1d2d
+
+
+class _Mesh2d:
+    """Rectangular 2D mesh with the face accessors used by Links1d2d."""
+
+    def __init__(self, ncols, nrows, cellsize):
+        self.faces = [
+            np.array(
+                [
+                    (i * cellsize, j * cellsize),
+                    ((i + 1) * cellsize, j * cellsize),
+                    ((i + 1) * cellsize, (j + 1) * cellsize),
+                    (i * cellsize, (j + 1) * cellsize),
+                ]
+            )
+            for j in range(nrows)
+            for i in range(ncols)
+        ]
+
+    def get_faces(self, geometry=None):
+        if geometry == "center":
+            return np.array([face.mean(axis=0) for face in self.faces])
+        return self.faces
+
+
+def _links1d2d():
+    # 4 x 4 cells of 10 m, with a diagonal branch outside the mesh
+    mesh2d = _Mesh2d(4, 4, 10.0)
+    nodes1d = np.array([[45.0 + 3 * i, 2.0 + 12 * i] for i in range(5)])
+    network = SimpleNamespace(
+        _mesh1d=SimpleNamespace(
+            mesh1d_node_x=nodes1d[:, 0],
+            mesh1d_node_y=nodes1d[:, 1],
+            mesh1d_edge_nodes=np.c_[np.arange(4), np.arange(1, 5)],
+        )
+    )
+    hydamo = SimpleNamespace(
+        branches=gpd.GeoDataFrame(
+            index=["branch1"], geometry=[LineString(nodes1d)]
+        ),
+        boundary_conditions=pd.DataFrame(),
+    )
+    return Links1d2d(network, mesh2d, hydamo)
+
+
+def test_generate_2d_to_1d_removes_links_crossing_cells():
+    links1d2d = _links1d2d()
+    links1d2d.generate_2d_to_1d(intersecting=False)
+
+    # Reference: all nearest links, filtered with a per-link loop over the cells
+    reference = _links1d2d()
+    faces = reference.mesh2d.get_faces()
+    centers = reference.mesh2d.get_faces(geometry="center")
+    _, nearest = KDTree(reference.mesh1d["nodes1d"]).query(centers)
+    cells = gpd.GeoDataFrame(geometry=[Polygon(face) for face in faces])
+    cellbounds = cells.bounds.values.T
+    expected = []
+    for iface, inode in enumerate(nearest):
+        link = LineString([reference.mesh1d["nodes1d"][inode], centers[iface]])
+        selectie = cells.loc[geometry.possibly_intersecting(cellbounds, link)]
+        if selectie.intersects(link).sum() <= 1:
+            expected.append((inode + 1, iface + 1))
+
+    assert 0 < len(expected) < len(faces)
+    assert list(zip(links1d2d.nodes1d, links1d2d.faces2d)) == expected
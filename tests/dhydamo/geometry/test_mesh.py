@@ -1,18 +1,20 @@
 import sys
 from pathlib import Path
 
+import geopandas as gpd
 import matplotlib.pyplot as plt
 import numpy as np
 import pytest
 from meshkernel.py_structures import DeleteMeshOption
+from scipy.spatial import KDTree
 from shapely.affinity import translate
-from shapely.geometry import LineString, MultiLineString, MultiPolygon, Polygon, box
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Point, Polygon, box
 
 sys.path.append(".")
 from hydrolib.core.dflowfm.mdu.models import FMModel
 from hydrolib.core.dflowfm.net.models import Branch
 from hydrolib.dhydamo.core.hydamo import HyDAMO
-from hydrolib.dhydamo.geometry import common, mesh, viz
+from hydrolib.dhydamo.geometry import common, mesh, spatial, viz
 from hydrolib.dhydamo.geometry.models import GeometryList
 from tests.dhydamo.io import test_from_hydamo
 
@@ -328,6 +330,85 @@ def test_links1d2d_add_links_2d_to_1d_lateral(do_plot=False):
         plt.show()
 
 
+def test_links1d2d_add_links_2d_to_1d_embedded():
+    network, _, _ = _prepare_1d2d_mesh()
+
+    # The bulk crossing test should select the same faces as a check per face
+    mesh2d = network._mesh2d.get_mesh2d()
+    nodes1d = np.stack(
+        [network._mesh1d.mesh1d_node_x, network._mesh1d.mesh1d_node_y], axis=1
+    )
+    edges1d = nodes1d[network._mesh1d.mesh1d_edge_nodes]
+    faces = np.arange(len(mesh2d.face_x))
+    crossed = mesh._faces_intersect_edges(mesh2d, faces, edges1d)
+
+    nodes2d = np.stack([mesh2d.node_x, mesh2d.node_y], axis=1)
+    mls = MultiLineString(edges1d.tolist())
+    expected = np.array(
+        [
+            mls.intersects(LineString(crds))
+            for crds in nodes2d[network._mesh2d.mesh2d_face_nodes]
+        ]
+    )
+    np.testing.assert_array_equal(crossed, expected)
+    assert crossed.any()
+
+    mesh.links1d2d_add_links_2d_to_1d_embedded(network)
+    assert 0 < len(network._link1d2d.link1d2d) <= crossed.sum()
+
+
+
+def test_links1d2d_add_links_2d_to_1d_lateral_with_present_links():
+    network, _, _ = _prepare_1d2d_mesh()
+    mesh.links1d2d_add_links_2d_to_1d_lateral(network)
+    expected = network._link1d2d.link1d2d.copy()
+
+    # Links that are already present are kept, the filter only selects from the new links
+    network, _, _ = _prepare_1d2d_mesh()
+    mesh.links1d2d_add_links_1d_to_2d(network)
+    present = network._link1d2d.link1d2d.copy()
+    assert len(present) > 0
+    mesh.links1d2d_add_links_2d_to_1d_lateral(network)
+    links = network._link1d2d.link1d2d
+    np.testing.assert_array_equal(links[: len(present)], present)
+    np.testing.assert_array_equal(links[len(present) :], expected)
+
+
+def test_links_boundary_intersections():
+    crds = np.asarray(box(0, 0, 10, 10).exterior.coords)
+    segments = np.stack([crds[:-1], crds[1:]], axis=1)
+
+    # Single crossing, crossing through a corner, two crossings, no crossing and overlap
+    start = np.array([[5.0, 5.0], [8.0, 8.0], [-1.0, 5.0], [2.0, 2.0], [0.0, 2.0]])
+    end = np.array([[5.0, 12.0], [12.0, 12.0], [11.0, 5.0], [3.0, 3.0], [0.0, 8.0]])
+
+    count, dist = mesh._links_boundary_intersections(start, end, segments)
+    np.testing.assert_array_equal(count, [1, 1, 2, 0, -1])
+    np.testing.assert_allclose(dist[:3], [5.0, np.hypot(2.0, 2.0), 1.0])
+    assert np.isinf(dist[3])
+
+
+def test_links1d2d_remove_within_multipolygon():
+    network, _, _ = _prepare_1d2d_mesh()
+    mesh.links1d2d_add_links_1d_to_2d(network)
+    nlinks = len(network._link1d2d.link1d2d)
+
+    # Remove links with a 1d node or 2d face in one of the areas. The first area only
+    # contains the 2d face of a link, the second both sides of two links.
+    areas = MultiPolygon([box(-4.5, 2.5, -4, 3), box(-1, 3, 1, 5)])
+    mesh.links1d2d_remove_within(network, areas)
+
+    nodes1d = np.stack(
+        [network._mesh1d.mesh1d_node_x, network._mesh1d.mesh1d_node_y], axis=1
+    )[network._link1d2d.link1d2d[:, 0]]
+    faces2d = np.stack(
+        [network._mesh2d.mesh2d_face_x, network._mesh2d.mesh2d_face_y], axis=1
+    )[network._link1d2d.link1d2d[:, 1]]
+    assert len(network._link1d2d.link1d2d) == nlinks - 3
+    assert not any(areas.intersects(Point(crd)) for crd in nodes1d)
+    assert not any(areas.intersects(Point(crd)) for crd in faces2d)
+
+
 def test_linkd1d2d_remove_links_within_polygon(do_plot=False):
     network, within, _ = _prepare_1d2d_mesh()
     within = within.buffer(-2)
@@ -397,6 +478,31 @@ def _prepare_hydamo(culverts: bool = False):
     return hydamo
 
 
+def test_get_voronoi_around_nodes():
+    # L-shaped mesh of 1x1 cells with a hole, so the boundary is not convex
+    area = box(0, 0, 6, 6).difference(box(3, 3, 6, 6)).difference(box(1, 1, 2, 2))
+    cells = [
+        box(x, y, x + 1, y + 1)
+        for x in range(6)
+        for y in range(6)
+        if area.contains(box(x, y, x + 1, y + 1))
+    ]
+    facedata = gpd.GeoDataFrame(geometry=cells)
+    nodes = np.unique(
+        np.vstack([np.asarray(cell.exterior.coords)[:-1] for cell in cells]), axis=0
+    )
+
+    voronoi = spatial.get_voronoi_around_nodes(nodes, facedata)
+
+    # Every node gets a polygon, and together they cover the mesh exactly
+    assert len(voronoi) == len(nodes)
+    np.testing.assert_array_equal(voronoi.index, np.arange(len(nodes)) + 1)
+    assert np.isclose(voronoi.area.sum(), area.area)
+    assert voronoi.geometry.within(area.buffer(1e-6)).all()
+    for crds, geometry in zip(voronoi["crds"], voronoi.geometry):
+        assert np.isclose(Polygon(crds).area, geometry.area)
+
+
 @pytest.mark.parametrize(
     "where,fill_option,fill_value,outcome",
     [
@@ -442,6 +548,32 @@ def test_mesh2d_altitude_from_raster(where, fill_option, fill_value, outcome):
         fill_value=fill_value,
     )
 
+def test_fill_missing_values_locally():
+    # Grid of points with a plane, with a block of missing values in the middle
+    # The points are shifted a little, so the nearest points are unique
+    x, y = np.meshgrid(np.arange(50.0), np.arange(40.0))
+    xy = np.c_[x.ravel(), y.ravel()]
+    xy += np.random.default_rng(0).uniform(-0.1, 0.1, size=xy.shape)
+    zvalues = 0.5 * xy[:, 0] + 0.25 * xy[:, 1]
+    isnan = (np.abs(xy[:, 0] - 20) < 4) & (np.abs(xy[:, 1] - 20) < 3)
+    zvalues[isnan] = np.nan
+
+    # Interpolating a plane gives the plane, also with a small search radius
+    filled = mesh._fill_interpolate(xy, zvalues, isnan, search_radius=5.0, fill_value=-1.0)
+    np.testing.assert_allclose(filled, 0.5 * xy[isnan, 0] + 0.25 * xy[isnan, 1])
+
+    # The nearest fill equals the fill from a tree of all valid points
+    _, idx = KDTree(xy[~isnan]).query(xy[isnan])
+    expected = zvalues[~isnan][idx]
+    for search_radius in [None, 10.0, 1.5, 0.1]:
+        filled = mesh._fill_nearest(xy, zvalues, isnan, search_radius=search_radius)
+        np.testing.assert_allclose(filled, expected)
+
+    # Points that can not be interpolated get the fill value
+    filled = mesh._fill_interpolate(xy, zvalues, isnan, search_radius=1.5, fill_value=-1.0)
+    assert (filled == -1.0).any()
+
+
 def test_mesh1d_add_branches_from_gdf(do_plot=False):
     # Create full HyDAMO object (use from other test)
     hydamo = test_from_hydamo.test_hydamo_object_from_gpkg()
@@ -0,0 +1,272 @@
+import sys
+from itertools import product
+
+import geopandas as gpd
+import netCDF4
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Polygon, box
+
+sys.path.append(".")
+from hydrolib.dhydamo.geometry import rasterstats
+
+NODATA = -9999.0
+
+
+@pytest.fixture
+def dempath(tmp_path):
+    # 40 x 40 pixels of 1 m, the terrain rises 0.1 m per pixel to the right
+    dem = np.tile(np.arange(40, dtype="float32") * 0.1, (40, 1))
+    dem[:5, :5] = NODATA
+    path = tmp_path / "dem.tif"
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=40,
+        height=40,
+        count=1,
+        dtype="float32",
+        nodata=NODATA,
+        transform=from_origin(0, 40, 1, 1),
+    ) as dst:
+        dst.write(dem, 1)
+    return path
+
+
+@pytest.fixture
+def facedata():
+    cells = [box(x, y, x + 20, y + 20) for x in (0, 20) for y in (0, 20)]
+    facedata = gpd.GeoDataFrame(
+        {"crds": [np.asarray(cell.exterior.coords) for cell in cells]},
+        geometry=cells,
+        index=np.arange(1, 5),
+    )
+    facedata["facex"] = facedata.geometry.centroid.x
+    facedata["facey"] = facedata.geometry.centroid.y
+    facedata["level"] = [1.0, 1.5, 2.0, 2.5]
+    return facedata
+
+
+def _expected_depth(facedata):
+    dem = np.tile(np.arange(40, dtype="float32") * 0.1, (40, 1))
+    levels = np.empty((40, 40))
+    for cell in facedata.itertuples():
+        xmin, ymin, xmax, ymax = cell.geometry.bounds
+        levels[40 - int(ymax) : 40 - int(ymin), int(xmin) : int(xmax)] = cell.level
+    return np.maximum(levels - dem, 0)
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_waterdepth_ahn(dempath, facedata, tmp_path, max_workers):
+    outpath = tmp_path / "depth.tif"
+    rasterstats.waterdepth_ahn(
+        dempath, facedata, outpath, "level", tilesize=16, max_workers=max_workers
+    )
+
+    with rasterio.open(outpath) as f:
+        assert f.profile["tiled"]
+        assert f.profile["compress"] == "deflate"
+        depth = f.read(1)
+
+    # Compare away from the cell edges, where the rasterization may go either way
+    inner = np.ones((40, 40), dtype=bool)
+    inner[:, [0, 19, 20, 39]] = False
+    inner[[0, 19, 20, 39], :] = False
+    inner[:5, :5] = False
+    np.testing.assert_allclose(depth[inner], _expected_depth(facedata)[inner], atol=1e-6)
+    assert (depth[:5, :5] == NODATA).all()
+
+
+def _write_map(path, facedata, levels, times):
+    # Minimal D-Flow FM map file with the 2d cells and water levels
+    nodes, inverse = np.unique(
+        np.vstack([crds[:-1] for crds in facedata["crds"]]), axis=0, return_inverse=True
+    )
+    with netCDF4.Dataset(path, "w") as ds:
+        ds.createDimension("nmesh2d_node", len(nodes))
+        ds.createDimension("nmesh2d_face", len(facedata))
+        ds.createDimension("max_nmesh2d_face_nodes", 4)
+        ds.createDimension("time", None)
+        ds.createVariable("mesh2d_node_x", "f8", ("nmesh2d_node",))[:] = nodes[:, 0]
+        ds.createVariable("mesh2d_node_y", "f8", ("nmesh2d_node",))[:] = nodes[:, 1]
+        face_nodes = ds.createVariable(
+            "mesh2d_face_nodes",
+            "i4",
+            ("nmesh2d_face", "max_nmesh2d_face_nodes"),
+            fill_value=-999,
+        )
+        face_nodes.start_index = 1
+        face_nodes[:] = inverse.reshape((-1, 4)) + 1
+        ds.createVariable("mesh2d_face_x", "f8", ("nmesh2d_face",))[:] = facedata.facex
+        ds.createVariable("mesh2d_face_y", "f8", ("nmesh2d_face",))[:] = facedata.facey
+        ds.createVariable("time", "f8", ("time",))[:] = times
+        ds.createVariable("mesh2d_s1", "f8", ("time", "nmesh2d_face"))[:] = levels.T
+
+
+def _check_series(outdir, facedata, levels, times):
+    inner = np.ones((40, 40), dtype=bool)
+    inner[:, [0, 19, 20, 39]] = False
+    inner[[0, 19, 20, 39], :] = False
+    inner[:5, :5] = False
+
+    expected = []
+    for level in levels.T:
+        facedata["level"] = level
+        expected.append(_expected_depth(facedata))
+    expected = np.stack(expected)
+
+    with rasterio.open(outdir / "waterdepth.tif") as f:
+        assert f.count == len(times)
+        depth = f.read()
+    np.testing.assert_allclose(depth[:, inner], expected[:, inner], atol=1e-6)
+
+    with rasterio.open(outdir / "waterdepth_max.tif") as f:
+        np.testing.assert_allclose(
+            f.read(1)[inner], expected.max(axis=0)[inner], atol=1e-6
+        )
+
+    with rasterio.open(outdir / "time_of_inundation.tif") as f:
+        toi = f.read(1)
+    inundated = expected > 0
+    expected_toi = np.where(
+        inundated.any(axis=0), times[np.argmax(inundated, axis=0)], NODATA
+    )
+    np.testing.assert_allclose(toi[inner], expected_toi[inner])
+
+
+def test_waterdepth_timeseries(dempath, facedata, tmp_path):
+    levels = np.array([[0.0, 1.0, 2.0], [0.5, 1.5, 1.0], [1.0, 2.0, 3.0], [0.0, 0.0, 4.0]])
+    times = np.array([0.0, 3600.0, 7200.0])
+
+    rasterstats.waterdepth_timeseries(
+        dempath, facedata, levels, tmp_path, times=times, tilesize=16
+    )
+    _check_series(tmp_path, facedata, levels, times)
+
+
+def test_waterdepth_from_map(dempath, facedata, tmp_path):
+    levels = np.array([[0.0, 1.0], [0.5, 1.5], [1.0, 2.0], [0.0, 4.0]])
+    times = np.array([0.0, 3600.0])
+    mappath = tmp_path / "model_map.nc"
+    _write_map(mappath, facedata, levels, times)
+
+    outdir = tmp_path / "output"
+    rasterstats.waterdepth_from_map(dempath, mappath, outdir, tilesize=16)
+    _check_series(outdir, facedata, levels, times)
+
+
+def test_cell_label_cache(dempath, facedata, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    cache = rasterstats.CellLabelCache(cache_dir, dempath, facedata)
+    assert cache.path.exists()
+    assert list(cache_dir.glob("*.npy")) == [cache.path]
+
+    # Check the cell index away from the cell edges
+    labels = cache.read(rasterio.windows.Window(0, 0, 40, 40))
+    assert (labels[1:19, 1:19] == 2).all()
+    assert (labels[21:39, 21:39] == 3).all()
+
+    # A changed mesh gets a new key
+    moved = facedata.copy()
+    moved["crds"] = [crds + 1.0 for crds in moved["crds"]]
+    with rasterio.open(dempath) as f:
+        assert rasterstats.CellLabelCache.get_key(f, moved) != cache.key
+
+    # Later calls read the cell index from the cache instead of rasterizing
+    expected = rasterstats.raster_stats_fine_cells(dempath, facedata, stats=["mean"])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cells should not be rasterized")
+
+    monkeypatch.setattr(rasterstats, "rasterize_cells", fail)
+    df = rasterstats.raster_stats_fine_cells(
+        dempath, facedata, stats=["mean"], cache_dir=cache_dir
+    )
+    np.testing.assert_array_equal(df["mean"], expected["mean"])
+    np.testing.assert_array_equal(df["count"], expected["count"])
+
+    outpath = tmp_path / "depth.tif"
+    rasterstats.waterdepth_ahn(
+        dempath, facedata, outpath, "level", tilesize=16, cache_dir=cache_dir
+    )
+    with rasterio.open(outpath) as f:
+        depth = f.read(1)
+    np.testing.assert_allclose(depth[5:19, 5:19], _expected_depth(facedata)[5:19, 5:19], atol=1e-6)
+
+
+def test_raster_hypsometry_fine_cells(dempath, facedata):
+    stats = rasterstats.raster_stats_fine_cells(
+        dempath, facedata, stats=["min", "max", "sum"]
+    )
+
+    # Levels between the lowest and highest pixel of each cell
+    tables = rasterstats.raster_hypsometry_fine_cells(dempath, facedata, levels=5)
+    np.testing.assert_array_equal(tables.index, facedata.index)
+    assert (np.diff(tables.offsets) == 5).all()
+    for cell, row in stats.iterrows():
+        table = tables.get(cell)
+        assert np.isclose(table.level.iloc[0], row["min"])
+        assert np.isclose(table.level.iloc[-1], row["max"])
+        assert np.isclose(table.volume.iloc[0], 0.0)
+        assert np.isclose(table.area.iloc[-1], row["count"])
+        assert np.isclose(
+            table.volume.iloc[-1], row["count"] * row["max"] - row["sum"], rtol=1e-5
+        )
+        assert (np.diff(table.area) >= 0).all()
+        assert (np.diff(table.volume) >= 0).all()
+
+    # The same levels for all cells, only the range of each cell is kept
+    levels = np.arange(-1.0, 5.0, 0.25)
+    tables = rasterstats.raster_hypsometry_fine_cells(dempath, facedata, levels=levels)
+    df = tables.to_dataframe()
+    assert len(df) == tables.offsets[-1]
+    assert np.isin(df.level, levels).all()
+    for cell, row in stats.iterrows():
+        table = tables.get(cell)
+        assert table.level.iloc[0] < row["min"] and table.area.iloc[0] == 0.0
+        assert table.level.iloc[-1] >= row["max"]
+        assert table.level.iloc[-2] < row["max"]
+        assert np.isclose(table.area.iloc[-1], row["count"])
+
+    with pytest.raises(ValueError):
+        rasterstats.raster_hypsometry_fine_cells(dempath, facedata, levels=[1.0, 0.5])
+
+
+def test_cell_label_cache_multiple_parts(tmp_path):
+    # Raster that is read in several parts, with cells crossing the part borders
+    dem = np.random.default_rng(0).uniform(0, 10, (600, 600)).astype("float32")
+    dempath = tmp_path / "dem.tif"
+    with rasterio.open(
+        dempath,
+        "w",
+        driver="GTiff",
+        width=600,
+        height=600,
+        count=1,
+        dtype="float32",
+        nodata=NODATA,
+        transform=from_origin(0, 600, 1, 1),
+    ) as dst:
+        dst.write(dem, 1)
+
+    # Pairs of triangles, so the cells share diagonal edges
+    cells = []
+    for x, y in product(np.arange(3.3, 560, 36.7), repeat=2):
+        cells.append(Polygon([(x, y), (x + 36.7, y), (x + 36.7, y + 36.7)]))
+        cells.append(Polygon([(x, y), (x + 36.7, y + 36.7), (x, y + 36.7)]))
+    facedata = gpd.GeoDataFrame(
+        {"crds": [np.asarray(cell.exterior.coords) for cell in cells]},
+        geometry=cells,
+        index=np.arange(1, len(cells) + 1),
+    )
+
+    # The statistics are the same with and without the cell index cache
+    expected = rasterstats.raster_stats_fine_cells(dempath, facedata, stats=["mean"])
+    df = rasterstats.raster_stats_fine_cells(
+        dempath, facedata, stats=["mean"], cache_dir=tmp_path / "cache"
+    )
+    np.testing.assert_array_equal(df["mean"], expected["mean"])
+    np.testing.assert_array_equal(df["count"], expected["count"])
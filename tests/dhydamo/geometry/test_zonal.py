@@ -0,0 +1,167 @@
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterstats import zonal_stats
+from shapely.geometry import Polygon, box
+
+sys.path.append(".")
+from hydrolib.dhydamo.core.drr import DRRModel
+from hydrolib.dhydamo.geometry.zonal import ZoneIndex
+
+AFFINE = from_origin(0, 30, 1, 1)
+
+
+@pytest.fixture
+def zones():
+    return gpd.GeoDataFrame(
+        geometry=[
+            box(0.3, 0.3, 12.6, 14.2),
+            Polygon([(10, 10), (28, 12), (20, 29.5)]),
+            box(40, 40, 50, 50),
+        ]
+    )
+
+
+@pytest.fixture
+def raster():
+    rng = np.random.default_rng(1)
+    raster = rng.integers(1, 6, size=(30, 30)).astype(float)
+    raster[:4, :] = -999
+    raster[20:22, 5:15] = np.nan
+    return raster
+
+
+@pytest.mark.parametrize("all_touched", [False, True])
+def test_zonal_stats_as_rasterstats(zones, raster, all_touched):
+    index = ZoneIndex(zones, AFFINE, raster.shape, all_touched=all_touched)
+    stats = ["count", "sum", "mean", "min", "max", "median", "majority"]
+    result = index.zonal_stats(raster, stats=stats, categorical=True)
+    expected = zonal_stats(
+        zones,
+        raster,
+        affine=AFFINE,
+        stats=stats,
+        categorical=True,
+        all_touched=all_touched,
+        nodata=-999,
+    )
+    for res, exp in zip(result, expected):
+        assert res.keys() == exp.keys()
+        for key, value in exp.items():
+            if value is None:
+                assert res[key] is None
+            else:
+                assert np.isclose(res[key], value)
+
+    # Zone outside the raster
+    assert result[2]["count"] == 0 and result[2]["mean"] is None
+
+
+def test_zone_index_stack_and_fractional(zones, raster):
+    index = ZoneIndex(zones, AFFINE, raster.shape, all_touched=True)
+    stack = np.stack(
+        [raster, np.where(raster == -999, -999, raster * 2.0), np.full(raster.shape, np.nan)]
+    )
+    means = index.mean(stack, nodata=-999)
+    assert means.shape == (3, 3)
+    np.testing.assert_allclose(means[:, 1], 2 * means[:, 0])
+    assert np.isnan(means[:, 2]).all()
+    np.testing.assert_allclose(means[:, 0], index.mean(raster, nodata=-999))
+
+    # The fractional coverage approaches the area of the zones
+    fractional = ZoneIndex(zones, AFFINE, raster.shape, fractional=True)
+    area = fractional.count(np.ones(raster.shape))
+    np.testing.assert_allclose(area[:2], zones.area[:2], rtol=0.02)
+    assert area[2] == 0.0
+
+
+def test_drrmodel_zone_index_cache(zones, raster):
+    drrmodel = DRRModel()
+    index = drrmodel.zone_index(zones, AFFINE, raster.shape)
+    assert drrmodel.zone_index(zones.copy(), AFFINE, raster.shape) is index
+    assert drrmodel.zone_index(zones, AFFINE, raster.shape, all_touched=True) is not index
+    assert drrmodel.zone_index(zones, from_origin(1, 30, 1, 1), raster.shape) is not index
+
+    result = drrmodel.zonal_stats(zones, raster, AFFINE, stats="median")
+    assert [r["median"] for r in result] == [
+        r["median"] for r in index.zonal_stats(raster, stats="median")
+    ]
+
+
+def test_read_pixels_and_raster_counts(zones, raster, tmp_path):
+    path = tmp_path / "landuse.tif"
+    with rasterio.open(
+        path, "w", driver="GTiff", width=30, height=30, count=1, dtype="float64",
+        transform=AFFINE, tiled=True, blockxsize=16, blockysize=16,
+    ) as dst:
+        dst.write(raster, 1)
+
+    # Reading only the zone pixels in small windows gives the same statistics
+    index = ZoneIndex(zones, AFFINE, raster.shape, all_touched=True)
+    with rasterio.open(path) as dataset:
+        pixels = index.read_pixels(dataset, window_pixels=10)
+    np.testing.assert_array_equal(pixels, raster.ravel()[index.pixels])
+    for stat in ["count", "mean", "median", "majority"]:
+        np.testing.assert_array_equal(
+            getattr(index, stat)(pixels, nodata=-999), getattr(index, stat)(raster, nodata=-999)
+        )
+
+    # The class counts are computed once per zones and file
+    drrmodel = DRRModel()
+    counts = drrmodel.raster_counts(zones, path, [1, 3, 7], all_touched=True)
+    np.testing.assert_array_equal(counts, index.counts(raster, [1, 3, 7], nodata=-999))
+    assert len(drrmodel._category_counts) == 1
+    drrmodel.raster_majority(zones.copy(), path, all_touched=True)
+    assert len(drrmodel._category_counts) == 1
+    np.testing.assert_array_equal(
+        drrmodel.raster_majority(zones, path, all_touched=True), index.majority(raster, nodata=-999)
+    )
+
+    # Without a nodata argument, the nodata value of the file is ignored
+    with rasterio.open(path, "r+") as dataset:
+        dataset.nodata = 3
+    counts = drrmodel.raster_counts(zones, path, [1, 3], all_touched=True)
+    np.testing.assert_array_equal(counts, index.counts(raster, [1, 3], nodata=3))
+    assert (counts[:, 1] == 0).all()
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_raster_cache(raster, tmp_path, mmap):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"raster_{i}.tif")
+        with rasterio.open(
+            paths[-1], "w", driver="GTiff", width=30, height=30, count=1,
+            dtype="float64", transform=AFFINE,
+        ) as dst:
+            dst.write(raster + i, 1)
+
+    # Room for two rasters in memory
+    drrmodel = DRRModel(
+        raster_cache_size=2 * raster.nbytes,
+        raster_cache_dir=str(tmp_path / "cache") if mmap else None,
+    )
+    grid, affine = drrmodel.read_raster(paths[0], static=True)
+    assert affine == AFFINE and not grid.flags.writeable
+    np.testing.assert_array_equal(grid, raster)
+    assert drrmodel.read_raster(str(paths[0]), static=True)[0] is grid
+
+    drrmodel.read_raster(paths[1], static=True)
+    drrmodel.read_raster(paths[0], static=True)
+    drrmodel.read_raster(paths[2], static=True)
+    if mmap:
+        # Memory-mapped rasters do not count towards the limit
+        assert len(drrmodel.raster_cache) == 3 and drrmodel.raster_cache.nbytes == 0
+    else:
+        # The least recently used raster is evicted
+        assert len(drrmodel.raster_cache) == 2
+        assert drrmodel.raster_cache.nbytes == 2 * raster.nbytes
+        assert drrmodel.read_raster(paths[0], static=True)[0] is grid
+
+    # Uncached reads are writable copies
+    uncached = drrmodel.read_raster(paths[0], static=True, cache=False)[0]
+    assert uncached.flags.writeable and uncached is not grid
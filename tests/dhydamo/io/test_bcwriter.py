@@ -0,0 +1,88 @@
+import sys
+
+sys.path.insert(0, r".")
+import numpy as np
+
+from hydrolib.core.dflowfm.bc.models import ForcingModel
+from hydrolib.core.dflowfm.ext.models import ExtModel, Lateral
+
+from hydrolib.dhydamo.io.bcwriter import BCWriter, StreamingForcingModel
+
+
+def test_bcwriter_roundtrip(tmp_path):
+    writer = BCWriter(chunksize=2)
+    writer.add_constant("lat_c", "lateral_discharge", "m3/s", 3.0)
+    writer.add_timeseries_table(
+        ["lat_a", "lat_b"],
+        "lateral_discharge",
+        "m3/s",
+        np.arange(5) * 60.0,
+        np.arange(10.0).reshape(5, 2),
+        "minutes since 2016-06-01 00:00:00",
+    )
+    writer.write(tmp_path / "boundaryconditions.bc")
+
+    forcingmodel = ForcingModel(tmp_path / "boundaryconditions.bc")
+    assert [forcing.name for forcing in forcingmodel.forcing] == writer.names
+    assert forcingmodel.forcing[0].datablock == [[3.0]]
+    assert np.allclose(
+        forcingmodel.forcing[2].datablock, np.c_[np.arange(5) * 60.0, np.arange(1.0, 10.0, 2.0)]
+    )
+
+
+def test_streaming_forcingmodel_saved_with_ext(tmp_path):
+    writer = BCWriter()
+    writer.add_constant("lat_c", "lateral_discharge", "m3/s", 1.5)
+    forcingmodel = StreamingForcingModel()
+    forcingmodel.set_writer(writer)
+    forcingmodel.filepath = "boundaryconditions.bc"
+
+    extmodel = ExtModel()
+    extmodel.lateral = [
+        Lateral(
+            id="lat_c",
+            name="lat_c",
+            type="discharge",
+            locationtype="1d",
+            branchId="branch",
+            chainage=10.0,
+            discharge=forcingmodel,
+        )
+    ]
+    extmodel.save(filepath=tmp_path / "laterals.ext", recurse=True)
+
+    assert (tmp_path / "boundaryconditions.bc").exists()
+    assert ForcingModel(tmp_path / "boundaryconditions.bc").forcing[0].name == "lat_c"
+
+
+def test_laterals_registered_as_table():
+    import pandas as pd
+
+    from hydrolib.dhydamo.converters.df2hydrolibmodel import Df2HydrolibModel
+    from hydrolib.dhydamo.core.hydamo import HyDAMO
+
+    hydamo = HyDAMO()
+    index = pd.date_range("2016-01-01", periods=4, freq="H")
+    discharges = pd.DataFrame(
+        np.arange(12.0).reshape(4, 3), columns=["LAT_01", "LAT_02", "LAT_03"], index=index
+    )
+    hydamo.external_forcings.add_laterals(
+        ids=["LAT_01", "LAT_02", "LAT_03"],
+        branchids=["branch"] * 3,
+        chainages=["5.0", "10.0", "15.0"],
+        discharges=discharges,
+    )
+    hydamo.external_forcings.add_lateral(
+        id="LAT_C", branchid="branch", chainage="20.0", discharge=2.0
+    )
+
+    models = Df2HydrolibModel(hydamo, stream_forcings=True, lazy=True)
+    models.laterals_to_dhydro()
+
+    forcings = {forcing["name"]: forcing for forcing in models.bcwriter._forcings}
+    assert sorted(forcings) == ["LAT_01", "LAT_02", "LAT_03", "LAT_C"]
+    # The laterals share the table of add_laterals, which is not copied
+    table = hydamo.external_forcings.lateral_nodes["LAT_01"]["table"]
+    assert all(forcings[f"LAT_0{i}"]["values"] is table for i in range(1, 4))
+    assert forcings["LAT_02"]["column"] == 1
+    assert len(models.laterals_ext) == 4
@@ -9,6 +9,7 @@ from hydrolib.dhydamo.core.hydamo import HyDAMO
 from hydrolib.dhydamo.converters.df2hydrolibmodel import Df2HydrolibModel
 from hydrolib.dhydamo.io.common import ExtendedGeoDataFrame
 from hydrolib.core.dflowfm.mdu.models import FMModel
+from hydrolib.core.dflowfm.structure.models import StructureModel
 
 
 hydamo_data_path = (
@@ -472,3 +473,145 @@ def test_write_laterals():
         np.round(np.mean(hydamo.external_forcings.lateral_nodes["LAT_01"]["value"]))
         == 1
     )
+
+
+def test_write_laterals_bulk():
+    hydamo = HyDAMO()
+
+    index = [pd.Timestamp("2016-01-01 00:00:00") + pd.Timedelta(hours=i) for i in range(10)]
+    discharges = pd.DataFrame(
+        np.arange(30.0).reshape(10, 3), columns=["LAT_01", "LAT_02", "LAT_03"], index=index
+    )
+    hydamo.external_forcings.add_laterals(
+        ids=["LAT_01", "LAT_03"],
+        branchids=["W_242209_0", "W_242209_0"],
+        chainages=["5.0", "15.0"],
+        discharges=discharges,
+    )
+    hydamo.external_forcings.add_laterals(
+        ids=["LAT_RR"], branchids=["W_242209_0"], chainages=["25.0"], discharges="realtime"
+    )
+
+    laterals = hydamo.external_forcings.lateral_nodes
+    assert list(laterals.keys()) == ["LAT_01", "LAT_03", "LAT_RR"]
+    assert np.allclose(laterals["LAT_03"]["value"], discharges["LAT_03"].values)
+    assert laterals["LAT_03"]["time"][-1] == 540.0
+    assert laterals["LAT_RR"]["discharge"] == "realtime"
+
+
+def test_write_section_trusted(tmp_path):
+    hydamo = HyDAMO()
+    hydamo.structures.rweirs_df = pd.DataFrame(
+        {
+            "id": ["rw1", "rw2", "rw3"],
+            "name": ["rw1", "rw2", "rw3"],
+            "branchid": "W_1386_0",
+            "chainage": [2.0, 4.0, 6.0],
+            "crestlevel": [18.0, 18.5, 19.0],
+            "crestwidth": 3.0,
+            "corrcoeff": 1.0,
+            "usevelocityheight": "true",
+            "allowedflowdir": "both",
+        }
+    )
+
+    # Validated, eagerly converted objects
+    models = Df2HydrolibModel(hydamo)
+    StructureModel(structure=models.structures).save(tmp_path / "eager.ini")
+
+    # Lazy and trusted conversion, written directly to file
+    models = Df2HydrolibModel(hydamo, lazy=True, trusted=True)
+    assert models.structures == []
+    models.write_section("structures", tmp_path / "trusted.ini")
+
+    # Only the header comment differs
+    eager = (tmp_path / "eager.ini").read_text().splitlines()[1:]
+    trusted = (tmp_path / "trusted.ini").read_text().splitlines()[1:]
+    assert eager == trusted
+    assert [weir.crestlevel for weir in models.iter_structures()] == [18.0, 18.5, 19.0]
+
+
+
+def test_trusted_factory_validates_copies():
+    import pytest
+    from pydantic.v1 import ValidationError
+    from hydrolib.core.dflowfm.crosssection.models import YZCrsDef
+
+    from hydrolib.dhydamo.converters.df2hydrolibmodel import _ModelFactory
+
+    factory = _ModelFactory(trusted=True)
+    record = {
+        "id": "yz1",
+        "type": "yz",
+        "thalweg": 0.0,
+        "yzcount": 3,
+        "ycoordinates": [0.0, 1.0, 2.0],
+        "zcoordinates": [1.0, 0.0, 1.0],
+        "frictionpositions": [0.0, 2.0],
+        "frictionids": ["Main"],
+    }
+    first = factory(YZCrsDef, record)
+    second = factory(YZCrsDef, {**record, "id": "yz2", "yzcount": 4,
+                                "ycoordinates": [0.0, 1.0, 2.0, 3.0],
+                                "zcoordinates": [1.0, 0.0, 0.0, 1.0]})
+    assert second.id == "yz2" and second.yzcount == 4
+    # Mutable fields are not shared with the template
+    assert second.comments is not first.comments
+    assert second.frictionids is not first.frictionids
+
+    # The root validators are run for the copies as well
+    with pytest.raises(ValidationError):
+        factory(YZCrsDef, {**record, "id": "yz3", "yzcount": 5})
+
+
+def test_write_all_parallel():
+    hydamo = HyDAMO()
+    hydamo.structures.rweirs_df = pd.DataFrame(
+        {
+            "id": ["rw1", "rw2"],
+            "name": ["rw1", "rw2"],
+            "branchid": "W_1386_0",
+            "chainage": [2.0, 4.0],
+            "crestlevel": [18.0, 18.5],
+            "crestwidth": 3.0,
+            "corrcoeff": 1.0,
+        }
+    )
+    hydamo.crosssections.add_circle_definition(0.5, "Manning", 0.02, name="circ")
+
+    sequential = Df2HydrolibModel(hydamo)
+    parallel = Df2HydrolibModel(hydamo, lazy=True)
+    parallel.write_all(max_workers=2)
+
+    assert parallel.structures == sequential.structures
+    assert parallel.crossdefs == sequential.crossdefs
+    assert "regular_weirs" in parallel.timings
+
+def test_convert_laterals_keeps_order():
+    import geopandas as gpd
+
+    hydamo = HyDAMO()
+    codes = ["LAT_01", "LAT_RR1", "LAT_02", "LAT_RR2"]
+    locations = ExtendedGeoDataFrame(geotype=Point, required_columns=["code"])
+    locations.set_data(
+        gpd.GeoDataFrame(
+            {"code": codes, "branch_id": ["W_242209_0"] * 4, "branch_offset": [5.0, 10.0, 15.0, 20.0]},
+            geometry=gpd.points_from_xy([0.0, 1.0, 2.0, 3.0], [0.0, 0.0, 0.0, 0.0]),
+        )
+    )
+    index = pd.date_range("2016-01-01", periods=5, freq="H")
+    discharges = pd.DataFrame(
+        np.arange(10.0).reshape(5, 2), columns=["LAT_02", "LAT_01"], index=index
+    )
+    hydamo.external_forcings.convert.laterals(
+        locations, lateral_discharges=discharges, rr_boundaries={"LAT_RR1": 0, "LAT_RR2": 0}
+    )
+
+    laterals = hydamo.external_forcings.lateral_nodes
+    assert list(laterals.keys()) == codes
+    # The discharge of a time series lateral is a Series, like with add_lateral
+    assert isinstance(laterals["LAT_01"]["discharge"], pd.Series)
+    pd.testing.assert_series_equal(
+        laterals["LAT_01"]["discharge"], discharges["LAT_01"], check_freq=False
+    )
+    assert laterals["LAT_RR2"]["discharge"] == "realtime"
@@ -0,0 +1,50 @@
+import json
+import sys
+
+sys.path.insert(0, r".")
+from hydrolib.dhydamo.converters.df2hydrolibmodel import Df2HydrolibModel
+from hydrolib.dhydamo.core.hydamo import HyDAMO
+from hydrolib.dhydamo.core.profiling import Profiler, compare_reports, stage
+
+
+def test_profile_conversion(tmp_path):
+    hydamo = HyDAMO()
+    hydamo.crosssections.add_circle_definition(0.5, "Manning", 0.02, name="circ")
+
+    with Profiler(name="test") as profiler:
+        with stage("conversion") as record:
+            Df2HydrolibModel(hydamo)
+            record["items"] = 1
+
+    frame = profiler.to_frame()
+    assert frame.index.tolist() == ["conversion", "Df2HydrolibModel.write_all"]
+    assert frame.at["Df2HydrolibModel.write_all", "items"] == 2
+    assert frame.at["conversion", "peak_memory"] >= frame.at["Df2HydrolibModel.write_all", "peak_memory"]
+    assert "Df2HydrolibModel.write_all" in profiler.summary()
+
+    profiler.to_json(tmp_path / "profile.json")
+    with open(tmp_path / "profile.json") as f:
+        report = json.load(f)
+    assert report["name"] == "test"
+    assert compare_reports(report, tmp_path / "profile.json")["wall_time_ratio"].eq(1.0).all()
+
+    # Without an active profiler, nothing is recorded
+    Df2HydrolibModel(hydamo)
+    assert len(profiler.records) == 2
+
+
+def test_profile_without_reset_peak(monkeypatch):
+    # Python 3.8 has no tracemalloc.reset_peak
+    import tracemalloc
+
+    from hydrolib.dhydamo.core import profiling
+
+    monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)
+    monkeypatch.setattr(profiling, "_RESET_PEAK", False)
+
+    with Profiler() as profiler:
+        with stage("outer"):
+            with stage("inner"):
+                assert len(list(range(10000))) == 10000
+    frame = profiler.to_frame()
+    assert frame.at["outer", "peak_memory"] >= frame.at["inner", "peak_memory"] > 0
@@ -0,0 +1,150 @@
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+import xarray as xr
+from rasterio.transform import from_origin
+from rasterstats import zonal_stats
+from shapely.geometry import Polygon, box
+
+sys.path.append(".")
+from hydrolib.dhydamo.core.drr import DRRModel
+from hydrolib.dhydamo.io.common import ExtendedGeoDataFrame
+
+AFFINE = from_origin(0, 20, 1, 1)
+TIMES = pd.date_range("2016-06-01", periods=5, freq="H")
+
+
+@pytest.fixture
+def areas():
+    gdf = gpd.GeoDataFrame(
+        {"code": ["a", "b"]},
+        geometry=[box(0.5, 0.5, 9.7, 12.2), Polygon([(8, 8), (19, 9), (15, 19.5)])],
+    )
+    areas = ExtendedGeoDataFrame(geotype=Polygon, required_columns=["code"])
+    areas.set_data(gdf)
+    return areas
+
+
+@pytest.fixture
+def meteo_folder(tmp_path):
+    rng = np.random.default_rng(2)
+    frames = []
+    for time in TIMES:
+        frame = rng.random((20, 20)).astype("float32")
+        frame[:2, :] = -999
+        frames.append(frame)
+        with rasterio.open(
+            tmp_path / f"NSL_{time:%Y%m%d%H%M}.tif",
+            "w",
+            driver="GTiff",
+            width=20,
+            height=20,
+            count=1,
+            dtype="float32",
+            transform=AFFINE,
+        ) as dst:
+            dst.write(frame, 1)
+    return tmp_path, frames
+
+
+@pytest.mark.parametrize("chunksize,max_workers", [(1, 1), (2, 4), (64, None)])
+def test_precip_from_input(areas, meteo_folder, chunksize, max_workers):
+    folder, frames = meteo_folder
+    drrmodel = DRRModel()
+    drrmodel.external_forcings.io.precip_from_input(
+        areas, precip_folder=folder, chunksize=chunksize, max_workers=max_workers
+    )
+
+    # The time series are sorted by time, regardless of the directory order
+    series = drrmodel.external_forcings.precip["ms_a"]["precip"]
+    assert list(series.index) == list(TIMES)
+
+    # All time steps are aggregated with the same zone index
+    assert len(drrmodel._zone_indices) == 1
+    for time, frame in zip(TIMES, frames):
+        expected = zonal_stats(
+            areas, frame, affine=AFFINE, stats="mean", all_touched=True, nodata=-999
+        )
+        for code, stats in zip(areas.code, expected):
+            assert np.isclose(
+                drrmodel.external_forcings.precip["ms_" + code]["precip"][time], stats["mean"]
+            )
+
+
+def test_precip_from_cube(areas, meteo_folder, tmp_path):
+    folder, frames = meteo_folder
+    drrmodel = DRRModel()
+    drrmodel.external_forcings.io.precip_from_input(areas, precip_folder=folder)
+    expected = drrmodel.external_forcings.precip
+
+    # Cube with the same frames, with the cell centers as coordinates
+    cube = xr.Dataset(
+        {"precipitation": (("time", "y", "x"), np.where(np.stack(frames) == -999, np.nan, frames))},
+        coords={"time": TIMES, "y": np.arange(19.5, 0, -1.0), "x": np.arange(0.5, 20, 1.0)},
+    )
+    cubepath = tmp_path / "radar.nc"
+    cube.to_netcdf(cubepath)
+
+    drrmodel = DRRModel()
+    drrmodel.external_forcings.io.precip_from_input(
+        areas, precip_cube=cubepath, chunksize=2, time_window=(TIMES[1], TIMES[3])
+    )
+    for code in areas.code:
+        series = drrmodel.external_forcings.precip["ms_" + code]["precip"]
+        assert list(series.index) == list(TIMES[1:4])
+        np.testing.assert_allclose(
+            series.values, expected["ms_" + code]["precip"][TIMES[1:4]].values, rtol=1e-6
+        )
+
+
+def test_meteo_area_codes(areas):
+    catchments = gpd.GeoDataFrame(
+        {"code": ["c1", "c2", "c3", "c4"]},
+        geometry=[box(1, 1, 3, 3), box(14, 12, 16, 14), box(9, 9, 10, 10), box(30, 30, 31, 31)],
+    )
+    drrmodel = DRRModel()
+    codes = drrmodel.meteo_area_codes(catchments, areas)
+    # The first containing area for overlaps, the first area for centroids outside all areas
+    assert list(codes) == ["a", "b", "a", "a"]
+    assert drrmodel.meteo_area_codes(catchments.copy(), areas) is codes
+
+    # Other codes for the same meteo areas are not taken from the cache
+    renamed = areas.copy()
+    renamed["code"] = ["x", "y"]
+    assert list(drrmodel.meteo_area_codes(catchments, renamed)) == ["x", "y", "x", "x"]
+
+
+def test_write_meteo(tmp_path):
+    from hydrolib.dhydamo.io.drrwriter import DRRWriter
+
+    drrmodel = DRRModel()
+    times = pd.date_range("2016-06-01 01:05", periods=4, freq="5min")
+    drrmodel.external_forcings.add_precip("ms_a", pd.Series([0.0, 1.25, np.nan, 3.0], index=times))
+    drrmodel.external_forcings.add_precip("ms_b", pd.Series([2.0, 0.5, 0.1, 0.0], index=times))
+    days = pd.date_range("2016-06-02", periods=2, freq="D")
+    drrmodel.external_forcings.add_evap("ms_a", pd.Series([0.6, 0.5], index=days[::-1]))
+
+    writer = DRRWriter(drrmodel, output_dir=tmp_path, name="test")
+    os.makedirs(writer.output_dir)
+    writer.write_meteo(chunksize=3)
+
+    with open(os.path.join(writer.output_dir, "DEFAULT.BUI")) as f:
+        lines = f.read().splitlines()
+    assert lines[4:8] == ["2", "*Namen van stations", "'ms_a'", "'ms_b'"]
+    assert lines[10] == "1 300"
+    assert lines[-5:] == [
+        "2016 6 1 1 5 0 0 0 15 0",
+        "0.000 2.000",
+        "1.250 0.500",
+        "0.000 0.100",
+        "3.000 0.000",
+    ]
+
+    with open(os.path.join(writer.output_dir, "DEFAULT.EVP")) as f:
+        lines = f.read().splitlines()
+    assert lines[-2:] == ["2016 6 2 0.500", "2016 6 3 0.600"]
@@ -0,0 +1,194 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(".")
+from hydrolib.dhydamo.core.drr import DRRModel
+
+
+def test_unpaved_node_table():
+    drrmodel = DRRModel()
+    unpaved = drrmodel.unpaved
+    lu_areas = " ".join(["100"] + ["0"] * 14 + ["250"])
+    unpaved.add_unpaved(
+        id="cat1",
+        total_area="400",
+        lu_areas=lu_areas,
+        surface_level="1.234",
+        soiltype="101",
+        surface_storage="10",
+        infiltration_capacity="100",
+        initial_gwd="1.2",
+        meteo_area="cat1",
+        px="10.4",
+        py="20.6",
+        boundary_node="lat1",
+    )
+
+    # The table is typed, with a land use area matrix
+    assert unpaved.nodes.dtypes["surface_level"] == np.float64
+    np.testing.assert_array_equal(unpaved.lu_areas, [[100.0] + [0.0] * 14 + [250.0]])
+
+    # The legacy view contains the formatted strings
+    node = unpaved.unp_nodes["cat1"]
+    assert node["ar"] == lu_areas
+    assert node["lv"] == "1.23"
+    assert node["sd"] == "10.000"
+    assert node["ms"] == "ms_cat1"
+    assert (node["px"], node["py"]) == ("10", "21")
+
+    # Nodes with the same id are replaced, nodes without area are not active
+    nodes = pd.DataFrame(
+        {column: [0.0, 0.0] for column in unpaved.columns}, index=["cat1", "cat2"]
+    )
+    nodes["meteo_area"] = "m"
+    nodes["boundary_node"] = ["lat1", "lat2"]
+    nodes.loc["cat2", "lu_area_1"] = 50.0
+    unpaved.add_nodes(nodes)
+    assert list(unpaved.nodes.index) == ["cat1", "cat2"]
+    assert list(unpaved.active_nodes().index) == ["cat2"]
+
+    # The legacy view is read only, changes are not silently lost
+    with pytest.raises(TypeError):
+        unpaved.unp_nodes["cat1"]["lv"] = "2.00"
+    with pytest.raises(TypeError):
+        unpaved.unp_nodes["cat3"] = {}
+
+
+def test_add_single_nodes():
+    drrmodel = DRRModel()
+    openwater = drrmodel.openwater
+    for i in range(5):
+        openwater.add_openwater(
+            id=f"c{i % 3}", area=str(i), meteo_area="m", px="0", py="0", boundary_node="lat"
+        )
+
+    # The added nodes are combined when the table is read, the last node of an id is kept
+    assert list(openwater.nodes.index) == ["c2", "c0", "c1"]
+    assert list(openwater.nodes["area"]) == [2.0, 3.0, 4.0]
+    assert openwater.nodes is openwater.nodes
+
+
+def test_ernst_and_paved_tables():
+    drrmodel = DRRModel()
+    drrmodel.unpaved.add_ernst_def(id="cat1", cvo="30 200", lv="0.0 1.0", cvi="300", cvs="1")
+    ernst = drrmodel.unpaved.ernst_defs["cat1"]
+    assert ernst == {
+        "id": "ernst_cat1",
+        "cvi": "300.00",
+        "cvs": "1.00",
+        "cvo": "30 200",
+        "lv": "0.0 1.0",
+    }
+
+    drrmodel.paved.add_paved(
+        id="cat1",
+        area="1234.5",
+        surface_level="1.0",
+        street_storage="10",
+        sewer_storage="10",
+        pump_capacity="0.00012345678",
+        meteo_area="m",
+        px="0",
+        py="0",
+        boundary_node="lat1",
+    )
+    node = drrmodel.paved.pav_nodes["cat1"]
+    assert node["ar"] == "1234.5"
+    assert node["qc"] == "0.00012346"
+    assert len(drrmodel.paved.active_nodes()) == 1
+
+
+def _small_model():
+    drrmodel = DRRModel()
+    for i, area in enumerate(["100 " + "0 " * 14 + "50", "0 " * 16], start=1):
+        drrmodel.unpaved.add_unpaved(
+            id=f"c{i}",
+            total_area="400",
+            lu_areas=area.strip(),
+            surface_level="1.5",
+            soiltype="101",
+            surface_storage="10",
+            infiltration_capacity="100",
+            initial_gwd="1.2",
+            meteo_area="m1",
+            px="10",
+            py="20",
+            boundary_node=f"lat{i}",
+        )
+        drrmodel.unpaved.add_ernst_def(id=f"c{i}", cvo="30 200", lv="1.0 2.0", cvi="300", cvs="1")
+    drrmodel.paved.add_paved(
+        id="c1",
+        area="1234.5",
+        surface_level="1.0",
+        street_storage="10",
+        sewer_storage="5",
+        pump_capacity="0.001",
+        meteo_area="m1",
+        px="30",
+        py="20",
+        boundary_node="lat1",
+    )
+    drrmodel.openwater.add_openwater(id="c1", area="12.0", meteo_area="m1", px="0", py="20", boundary_node="lat1")
+    drrmodel.external_forcings.add_boundary_node(id="lat1", px="1.0", py="2.0")
+    index = pd.date_range("2016-06-01", periods=2, freq="D")
+    drrmodel.external_forcings.add_seepage("sep_c1", pd.Series([0.1, 0.2], index=index))
+    return drrmodel
+
+
+def test_drrwriter_tables(tmp_path):
+    from hydrolib.dhydamo.io.drrwriter import DRRWriter
+
+    writer = DRRWriter(_small_model(), output_dir=tmp_path, name="test")
+    os.makedirs(writer.output_dir)
+    writer.write_topology()
+    writer.write_unpaved()
+    writer.write_paved()
+    writer.write_openwater()
+
+    def read(name):
+        with open(os.path.join(writer.output_dir, name)) as f:
+            return f.read().splitlines()
+
+    assert read("3B_NOD.TP") == [
+        "NODE id 'unp_c1' nm 'unp_c1' ri '-1' mt 1 '2' nt 44 ObID '3B_UNPAVED' px 10 py 20 node",
+        "NODE id 'pav_c1' nm 'pav_c1' ri '-1' mt 1 '1' nt 43 ObID '3B_PAVED' px 30 py 20 node",
+        "NODE id 'WWTP' nm 'WWTP' ri '-1' mt 1 '14' nt 56 ObID '3B_WWTP' px 100000.0 py 500000.0 node",
+        "NODE id 'WWTP_BND' nm 'WWTP_BND' ri '-1' mt 1 '6' nt 47 ObID '3B_BOUNDARY' px 100050.0 py 500050.0 node",
+        "NODE id 'ow_c1' nm 'ow_c1' ri '-1' mt 1 '21' nt 46 ObID 'OW_PRECIP' px 0 py 20 node",
+        "NODE id 'lat1' nm 'lat1' ri '-1' mt 1 '6' nt 78 ObID 'SBK_SBK-3B-NODE' px 1.0 py 2.0 node",
+    ]
+    assert read("3B_LINK.TP") == [
+        "BRCH id 'link_1' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn 'unp_c1' en 'lat1' brch",
+        "BRCH id 'link_2' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn 'pav_c1' en 'lat1' brch",
+        "BRCH id 'link_3' ri '-1' mt 1 '1' bt 18 ObID '3B_LINK_RWZI' bn 'pav_c1' en 'WWTP' brch",
+        "BRCH id 'link_4' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn 'WWTP' en 'WWTP_BND' brch",
+        "BRCH id 'link_5' ri '-1' mt 1 '0' bt 17 ObID '3B_LINK' bn 'ow_c1' en 'lat1' brch",
+    ]
+    assert read("UNPAVED.3B") == [
+        "UNPV id 'unp_c1' na 16 ga 400 ar 100 " + "0 " * 14 + "50 lv 1.50 co 3 su 0 "
+        "sd 'sto_unp_c1' ic 'inf_unp_c1' bt 101 ed 'ernst_c1' sp 'sep_c1' ig 0 1.20 "
+        "mg 1.50 gl 1.5 is 0 ms 'ms_m1' unpv"
+    ]
+    assert read("UNPAVED.ALF") == [
+        "ERNS id 'ernst_c1' nm 'ernst_c1' cvi 300.00 cvo 0 30 200 cvs 1.00 lv 1.0 2.0 erns"
+    ]
+    assert read("UNPAVED.SEP") == [
+        "SEEP id 'sep_c1' nm 'sep_c1' co 4 PDIN 0 0 pdin ss 0",
+        "TBLE",
+        "'2016/06/01;00:00:00' 0.10000 <",
+        "'2016/06/02;00:00:00' 0.20000 <",
+        "tble",
+        "seep",
+    ]
+    assert read("PAVED.3B") == [
+        "PAVE id 'pav_c1' ar 1234.5 lv 1.00 sd 'sto_pav_c1' ss 0 qc 0 0.00100000 0 qo 2 2 "
+        "ms 'ms_m1' is 0 np 0 dw 'Def_DWA' ro 0 ru 0 qh '' pave"
+    ]
+    assert read("PAVED.STO") == [
+        "STDF id 'sto_pav_c1' nm 'sto_pav_c1' ms 10.00 is 0 mr 5.00 0.0 ir 0.0 0.0 stdf"
+    ]
+    assert read("OPENWATE.3B") == ["OWRR id 'ow_c1' ar 12.0 ms 'ms_m1' owrr"]